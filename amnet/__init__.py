@@ -2,7 +2,10 @@ from amnet.amn import *
 import amnet.atoms
 import amnet.util
 import amnet.tree
+import amnet.tape
+import amnet.bounds
 import amnet.smt
+import amnet.verify
 import amnet.lyap
 #import amnet.vis
 
@@ -1,4 +1,42 @@
 import numpy as np
+import amnet
+
+
+################################################################################
+# evaluation helpers
+################################################################################
+
+def _memoized(eval_fn):
+    """
+    Wraps the eval method of an Amn node so that each node
+    is evaluated at most once per top-level call to eval.
+
+    Results are cached in the dictionary memo, keyed on node identity,
+    which is threaded through the recursive calls. Without memoization,
+    nodes with several parents (e.g., the operands of atoms.max2_1)
+    are recomputed along every path, which is exponential in the depth
+    of the DAG; with it, eval is linear in the number of nodes.
+
+    A top-level call first evaluates the descendants of the node in
+    topological order (amnet.tree.postorder), so every nested call to
+    eval finds its children in memo and the recursion is one level deep,
+    however deep the DAG is.
+    """
+    def eval_memo(self, inp, memo=None):
+        if memo is None:
+            memo = dict()
+            for node in amnet.tree.postorder(self)[:-1]:
+                node.eval(inp, memo)
+
+        key = id(self)
+        if key not in memo:
+            memo[key] = eval_fn(self, inp, memo)
+
+        return memo[key]
+
+    eval_memo.__name__ = eval_fn.__name__
+    eval_memo.__doc__ = eval_fn.__doc__
+    return eval_memo
 
 
 ################################################################################
@@ -13,7 +51,7 @@ class Amn(object):
         self.outdim = outdim
         self.indim = indim
 
-    def eval(self, inp):
+    def eval(self, inp, memo=None):
         return NotImplemented
 
 
@@ -31,7 +69,7 @@ class Variable(Amn):
     def __str__(self):
         return '%s(%d)' % (self.name, self.outdim)
 
-    def eval(self, inp):
+    def eval(self, inp, memo=None):
         assert self.indim == self.outdim
         assert len(inp) == self.indim
         return inp
@@ -61,9 +99,10 @@ class Affine(Amn):
         return 'Affine(w=%s, x=%s, b=%s)' % \
                (str(self.w.tolist()), str(self.x), str(self.b.tolist()))
 
-    def eval(self, inp):
+    @_memoized
+    def eval(self, inp, memo=None):
         assert len(inp) == self.indim
-        xv = self.x.eval(inp)
+        xv = self.x.eval(inp, memo)
         return np.dot(self.w, xv) + self.b
 
 
@@ -71,6 +110,10 @@ class Mu(Amn):
     """
     Mu encodes a multiplexing (or if-then-else) node, and
     evaluates to mu.eval(inp) = if z(inp) <= 0 then x(inp) else y(inp).
+
+    If z has the same outdim as x and y, the selection is elementwise:
+    the ith component of mu.eval(inp) is x_i(inp) if z_i(inp) <= 0,
+    and y_i(inp) otherwise.
     
     x: (select-true) a pointer to an AMN
     y: (select-false) a pointer to an AMN  
@@ -79,11 +122,11 @@ class Mu(Amn):
     The dimension rules are:
     1) x, y, and z must all have the same indim.
     2) x and y must have the same outdim.
-    3) z has outdim 1.
+    3) z has outdim 1, or the same outdim as x and y.
     """
     def __init__(self, x, y, z):
         assert x.outdim == y.outdim
-        assert z.outdim == 1
+        assert z.outdim == 1 or z.outdim == x.outdim
         assert x.indim == y.indim and y.indim == z.indim
 
         super(Mu, self).__init__(outdim=x.outdim, indim=x.indim)
@@ -96,14 +139,20 @@ class Mu(Amn):
         return 'Mu(%s, %s, %s)' % \
                (str(self.x), str(self.y), str(self.z))
 
-    def eval(self, inp):
+    @_memoized
+    def eval(self, inp, memo=None):
         assert len(inp) == self.indim
-        zv = self.z.eval(inp)
-        assert len(zv) == 1
-        if zv <= 0:
-            return self.x.eval(inp)
+        zv = self.z.eval(inp, memo)
+        if len(zv) == 1:
+            if zv <= 0:
+                return self.x.eval(inp, memo)
+            else:
+                return self.y.eval(inp, memo)
         else:
-            return self.y.eval(inp)
+            assert len(zv) == self.outdim
+            return np.where(zv <= 0,
+                            self.x.eval(inp, memo),
+                            self.y.eval(inp, memo))
 
 
 class Stack(Amn):
@@ -132,16 +181,67 @@ class Stack(Amn):
     def __str__(self):
         return 'Stack(%s, %s)' % (str(self.x), str(self.y))
 
-    def eval(self, inp):
+    @_memoized
+    def eval(self, inp, memo=None):
         assert len(inp) == self.indim
-        xv = self.x.eval(inp)
-        yv = self.y.eval(inp)
+        xv = self.x.eval(inp, memo)
+        yv = self.y.eval(inp, memo)
 
         assert len(xv) + len(yv) == self.outdim
         outv = np.concatenate((xv, yv), axis=0)
         return outv
 
 
+class Max(Amn):
+    """
+    Max encodes an n-ary maximum (reduction) node, and
+    evaluates to max.eval(inp) = max_i x(inp)_i.
+
+    x: a pointer to an AMN with outdim >= 1
+
+    The output has dimension 1.
+    """
+    def __init__(self, x):
+        assert x.outdim >= 1
+        super(Max, self).__init__(outdim=1, indim=x.indim)
+
+        self.x = x
+
+    def __str__(self):
+        return 'Max(%s)' % str(self.x)
+
+    @_memoized
+    def eval(self, inp, memo=None):
+        assert len(inp) == self.indim
+        xv = self.x.eval(inp, memo)
+        return np.array([np.max(xv)])
+
+
+class Min(Amn):
+    """
+    Min encodes an n-ary minimum (reduction) node, and
+    evaluates to min.eval(inp) = min_i x(inp)_i.
+
+    x: a pointer to an AMN with outdim >= 1
+
+    The output has dimension 1.
+    """
+    def __init__(self, x):
+        assert x.outdim >= 1
+        super(Min, self).__init__(outdim=1, indim=x.indim)
+
+        self.x = x
+
+    def __str__(self):
+        return 'Min(%s)' % str(self.x)
+
+    @_memoized
+    def eval(self, inp, memo=None):
+        assert len(inp) == self.indim
+        xv = self.x.eval(inp, memo)
+        return np.array([np.min(xv)])
+
+
 ################################################################################
 # Convenience classes
 ################################################################################
@@ -158,7 +258,7 @@ class Constant(Affine):
     def __str__(self):
         return 'Constant(x=%s, b=%s)' % (str(self.x), str(self.b.tolist()))
 
-    def eval(self, inp):
+    def eval(self, inp, memo=None):
         # short-circuit evaluation
         return self.b
 
@@ -29,13 +29,16 @@ def to_list(phi):
 
 
 def from_list(phi_list):
-    """returns Stack(...Stack(phi_list[0], phi_list[1]), ... phi_list[-1]) """
+    """
+    returns the concatenation of the outputs of phi_list, as a
+    balanced tree of Stack nodes of depth ceil(log2(len(phi_list)))
+    """
     assert _valid_nonempty_Amn_list(phi_list)
 
     def stack2(x, y):
         return amnet.Stack(x, y)
 
-    return amnet.util.foldl(stack2, phi_list[0], phi_list[1:])
+    return amnet.util.foldt(stack2, phi_list)
 
 # alternative implementation of from_list
 # (previously make_stack(phi_list))
@@ -133,9 +136,12 @@ def add2(x, y):
 
 
 def add_list(phi_list):
-    """returns (...(phi_list[0] + phi_list[1]) + ...) + phi_list[len(phi_list)]"""
+    """
+    returns phi_list[0] + phi_list[1] + ... + phi_list[-1],
+    summed pairwise as a balanced tree of add2 nodes
+    """
     assert _valid_nonempty_Amn_list(phi_list)
-    return amnet.util.foldl(add2, phi_list[0], phi_list[1:])
+    return amnet.util.foldt(add2, phi_list)
 
 
 def add_all(phi):
@@ -171,10 +177,11 @@ def max2(x, y):
     assert x.outdim == y.outdim
     assert x.outdim >= 1
 
-    return thread_over(
-        max2_1,
+    # a single elementwise Mu
+    return amnet.Mu(
         x,
-        y
+        y,
+        sub2(y, x)
     )
 
 
@@ -187,7 +194,12 @@ def max_list(phi_list):
         then max_list(phi_list) evaluates to [4, 2, 6]
     """
     assert _valid_nonempty_Amn_list(phi_list)
-    return amnet.util.foldl(max2, phi_list[0], phi_list[1:])
+    assert amnet.util.allsame([phi.outdim for phi in phi_list])
+
+    def max_1(*xs):
+        return max_all(from_list(list(xs)))
+
+    return thread_over(max_1, *phi_list)
 
 
 def max_all(phi):
@@ -199,7 +211,12 @@ def max_all(phi):
         then max_all(phi) evaluates to 3
     """
     assert phi.outdim >= 1
-    return max_list(to_list(phi))
+
+    # optimization: the maximum of one element is itself
+    if phi.outdim == 1:
+        return phi
+
+    return amnet.Max(phi)
 
 
 def relu(phi):
@@ -209,10 +226,11 @@ def relu(phi):
     zero = amnet.Constant(phi, np.zeros(phi.outdim))
     assert zero.outdim == phi.outdim
 
-    return thread_over(
-        max2_1,
+    # a single elementwise Mu, selecting phi_i wherever -phi_i <= 0
+    return amnet.Mu(
         phi,
-        zero
+        zero,
+        neg(phi)
     )
 
 
@@ -231,21 +249,32 @@ def min2(x, y):
     assert x.outdim == y.outdim
     assert x.outdim >= 1
 
-    return thread_over(
-        min2_1,
+    # a single elementwise Mu
+    return amnet.Mu(
+        y,
         x,
-        y
+        sub2(y, x)
     )
 
 
 def min_list(phi_list):
     assert _valid_nonempty_Amn_list(phi_list)
-    return amnet.util.foldl(min2, phi_list[0], phi_list[1:])
+    assert amnet.util.allsame([phi.outdim for phi in phi_list])
+
+    def min_1(*xs):
+        return min_all(from_list(list(xs)))
+
+    return thread_over(min_1, *phi_list)
 
 
 def min_all(phi):
     assert phi.outdim >= 1
-    return min_list(to_list(phi))
+
+    # optimization: the minimum of one element is itself
+    if phi.outdim == 1:
+        return phi
+
+    return amnet.Min(phi)
 
 
 def max_aff(A, b, phi):
@@ -256,29 +285,14 @@ def max_aff(A, b, phi):
     assert phi.outdim == n
     assert m >= 1 and n >= 1
 
-    # OLD: inefficient
-    #phi_aff = amnet.Affine(
-    #    A,
-    #    phi,
-    #    b
-    #)
-    #return max_all(phi_aff)
-
-    outlist = []
-    for i in range(m):
-        if b[i] == 0:
-            outlist.append(amnet.Linear(
-                A[i, :].reshape((1, n)),
-                phi
-            ))
-        else:
-            outlist.append(amnet.Affine(
-                A[i, :].reshape((1, n)),
-                phi,
-                b[i].reshape((1,))
-            ))
-    assert len(outlist) == m
-    return max_list(outlist)
+    # a single Max node over all the rows
+    # (previously, a fold of Mu nodes over one Affine per row)
+    phi_aff = amnet.Affine(
+        A,
+        phi,
+        b
+    )
+    return max_all(phi_aff)
 
 
 def triplexer(phi, a, b, c, d, e, f):
@@ -0,0 +1,220 @@
+import numpy as np
+import amnet
+from amnet.bounds import halfspace_bounds, linear_bounds
+
+import multiprocessing
+import time
+
+try:
+    from Queue import Empty  # python 2
+except ImportError:
+    from queue import Empty
+
+"""
+Verifies properties A * phi(x) <= b over large input boxes by
+branch-and-bound on the input space: every box is first checked
+with bound propagation and by evaluating phi at a few points,
+split if that is inconclusive,
+and handed to an SMT solver only once it is small enough.
+Boxes are processed by a pool of worker processes.
+"""
+
+# status of a box
+VERIFIED = 'verified'
+COUNTEREXAMPLE = 'counterexample'
+SPLIT = 'split'
+UNKNOWN = 'unknown'
+
+# how often (seconds) the coordinator checks that its workers are alive
+POLL_SECONDS = 0.1
+
+
+def _split_dim(row_au, open_rows, lo, hi):
+    """
+    Returns the input dimension whose width contributes most
+    to the linear upper bounds of the rows that are not yet verified
+    """
+    width = hi - lo
+    score = np.sum(np.abs(row_au[open_rows]), axis=0) * width
+    if np.max(score) <= 0:
+        return int(np.argmax(width))
+    return int(np.argmax(score))
+
+
+def _process_box(phi, A, b, lo, hi, depth, max_depth, tape=None):
+    """
+    Processes one box of the branch-and-bound, and returns
+    (status, payload, solved), where solved tells whether the
+    SMT solver was called, and (status, payload) is one of:
+    (VERIFIED, None)         A * phi(x) <= b on the whole box
+    (COUNTEREXAMPLE, x)      A * phi(x) > b in some row at x
+    (SPLIT, [box1, box2])    the two halves of the box, as (lo, hi) pairs
+
+    Boxes at depth max_depth are never split, but handed to amnet.verify.
+    """
+    if tape is None:
+        tape = amnet.tape.compile(phi)
+
+    linear = linear_bounds(phi, lo, hi)
+    ub, row_au = halfspace_bounds(phi, A, lo, hi, linear=linear)
+    open_rows = (ub > b)
+    if not np.any(open_rows):
+        return VERIFIED, None, False
+
+    # look for a counterexample at the center of the box, and at the
+    # vertices maximizing the linear upper bounds of the open rows
+    cands = [0.5 * (lo + hi)] + \
+            [np.where(row_au[k] > 0, hi, lo) for k in np.flatnonzero(open_rows)]
+    Y = tape.eval(np.array(cands))
+    viol = np.any(np.dot(Y, np.transpose(A)) > b, axis=1)
+    if np.any(viol):
+        return COUNTEREXAMPLE, cands[int(np.argmax(viol))], False
+
+    if depth >= max_depth:
+        sess = amnet.verify.Session(phi, domain=(lo, hi), bounds=linear[0])
+        xc = sess.check_output_halfspaces(A[open_rows], b[open_rows])
+        if xc is None:
+            return VERIFIED, None, True
+        return COUNTEREXAMPLE, xc, True
+
+    # bisect the most sensitive dimension
+    i = _split_dim(row_au, open_rows, lo, hi)
+    mid = 0.5 * (lo[i] + hi[i])
+    hi1, lo2 = np.copy(hi), np.copy(lo)
+    hi1[i] = lo2[i] = mid
+    return SPLIT, [(lo, hi1), (lo2, hi)], False
+
+
+def _worker(phi, A, b, max_depth, tasks, results):
+    """ processes boxes from the shared task queue until it receives None """
+    tape = amnet.tape.compile(phi)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        lo, hi, depth = task
+        try:
+            status, payload, solved = _process_box(phi, A, b, lo, hi, depth,
+                                                   max_depth, tape=tape)
+        except Exception as e:
+            status, payload, solved = 'error', str(e), False
+        results.put((depth, status, payload, solved))
+
+
+class BabResult(object):
+    """
+    Outcome of a branch-and-bound run:
+    status          VERIFIED, COUNTEREXAMPLE, or UNKNOWN
+                    (timeout, or a worker died)
+    counterexample  an input x violating the property (or None)
+    coverage        fraction of the input volume verified
+    nboxes          number of boxes processed
+    nsolver         number of boxes handed to the SMT solver
+    elapsed         wall-clock seconds
+    """
+    def __init__(self, status, counterexample, coverage, nboxes, nsolver, elapsed):
+        self.status = status
+        self.counterexample = counterexample
+        self.coverage = coverage
+        self.nboxes = nboxes
+        self.nsolver = nsolver
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return '%s (coverage %.4f, %d boxes, %d solver calls, %.3fs)' % \
+               (self.status, self.coverage, self.nboxes, self.nsolver, self.elapsed)
+
+
+def print_progress(res):
+    """ default progress callback """
+    print 'bab: %s' % str(res)
+
+
+def verify(phi, lo, hi, A, b, nprocs=None, max_depth=10, timeout=None, progress=None):
+    """
+    Checks the property A * phi(x) <= b for all x in the box lo <= x <= hi
+    by branch-and-bound on the input box, with nprocs worker processes
+    (one per cpu by default) sharing a queue of boxes.
+
+    Returns a BabResult as soon as any worker finds a counterexample,
+    once every box is verified, or when timeout (seconds) runs out.
+    A worker that dies takes its box with it, so the run then stops
+    with status UNKNOWN.
+    If progress is a function, it is called with the intermediate
+    BabResult (status UNKNOWN) after every processed box.
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    assert A.shape == (len(b), phi.outdim)
+    lo = np.array(lo, dtype=float).flatten()
+    hi = np.array(hi, dtype=float).flatten()
+    assert len(lo) == phi.indim and len(hi) == phi.indim
+    assert np.all(lo <= hi), 'empty input box'
+
+    if nprocs is None:
+        nprocs = multiprocessing.cpu_count()
+    assert nprocs >= 1
+
+    t0 = time.time()
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_worker,
+                                       args=(phi, A, b, max_depth, tasks, results))
+               for _ in range(nprocs)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+
+    status, xc = UNKNOWN, None
+    coverage, nboxes, nsolver = 0.0, 0, 0
+    tasks.put((lo, hi, 0))
+    pending = 1
+    died = False
+    try:
+        while pending > 0:
+            wait = POLL_SECONDS
+            if timeout is not None:
+                left = timeout - (time.time() - t0)
+                if left <= 0:
+                    break
+                wait = min(wait, left)
+            try:
+                depth, st, payload, solved = results.get(timeout=wait)
+            except Empty:
+                # the box of a dead worker is never answered: give up
+                # (one more poll drains results posted just before dying)
+                if died:
+                    break
+                died = not all(w.is_alive() for w in workers)
+                continue
+
+            pending -= 1
+            nboxes += 1
+            nsolver += int(solved)
+
+            assert st != 'error', 'worker failed: %s' % payload
+            if st == VERIFIED:
+                # every split halves the volume
+                coverage += 0.5 ** depth
+            elif st == COUNTEREXAMPLE:
+                status, xc = COUNTEREXAMPLE, payload
+                break
+            else:
+                for clo, chi in payload:
+                    tasks.put((clo, chi, depth + 1))
+                    pending += 1
+
+            if progress is not None:
+                progress(BabResult(UNKNOWN, None, coverage, nboxes, nsolver,
+                                   time.time() - t0))
+
+        if status == UNKNOWN and pending == 0:
+            status = VERIFIED
+    finally:
+        # cancel the boxes still in flight
+        for w in workers:
+            if w.is_alive():
+                w.terminate()
+            w.join()
+
+    return BabResult(status, xc, coverage, nboxes, nsolver, time.time() - t0)
@@ -0,0 +1,487 @@
+import numpy as np
+import amnet
+from amnet.tree import children, postorder
+
+"""
+Contains routines for computing bounds on the outputs of every
+node of an Amn, given a box of possible inputs to its Variable
+"""
+
+
+def _check_box(phi, lo, hi):
+    lo = np.array(lo, dtype=float).flatten()
+    hi = np.array(hi, dtype=float).flatten()
+    assert len(lo) == phi.indim and len(hi) == phi.indim
+    assert np.all(lo <= hi), 'empty input box'
+    return lo, hi
+
+
+def _affine_interval(w, b, xlo, xhi):
+    """ bounds of w*x + b over the box xlo <= x <= xhi """
+    wpos = np.maximum(w, 0)
+    wneg = np.minimum(w, 0)
+    lo = np.dot(wpos, xlo) + np.dot(wneg, xhi) + b
+    hi = np.dot(wpos, xhi) + np.dot(wneg, xlo) + b
+    return lo, hi
+
+
+def selector_signs(mu, bounds):
+    """
+    Returns an array with the sign of the enable input z of Mu node mu
+    for each output component of mu, over the domain that produced bounds:
+    -1 where z <= 0 everywhere (mu always selects x),
+    +1 where z > 0 everywhere (mu always selects y),
+     0 where the sign of z is undetermined
+
+    A scalar enable input gives the same sign for every component.
+    """
+    assert isinstance(mu, amnet.Mu)
+    zlo, zhi = bounds[mu.z]
+
+    signs = np.zeros(mu.z.outdim, dtype=int)
+    signs[zhi <= 0] = -1
+    signs[zlo > 0] = 1
+
+    return np.broadcast_to(signs, (mu.outdim,))
+
+
+def selector_sign(mu, bounds):
+    """
+    Returns the sign of the enable input z of Mu node mu,
+    over the domain that produced bounds:
+    -1 if z <= 0 everywhere (mu always selects x),
+    +1 if z > 0 everywhere (mu always selects y),
+     0 if the sign of z is undetermined
+
+    For an elementwise Mu, the sign is nonzero only if
+    it is the same for every component.
+    """
+    signs = selector_signs(mu, bounds)
+
+    if np.all(signs < 0):
+        return -1
+    elif np.all(signs > 0):
+        return 1
+    else:
+        return 0
+
+
+def reduction_candidates(node, bounds):
+    """
+    Returns the indices of the inputs of Max or Min node node
+    that can attain its extremum over the domain that produced bounds:
+    an input whose upper bound (lower bound, for Min) lies below
+    the largest lower bound (above the smallest upper bound)
+    never does. Without bounds on node.x, every index is returned.
+    """
+    assert isinstance(node, (amnet.Max, amnet.Min))
+    if bounds is None or node.x not in bounds:
+        return list(range(node.x.outdim))
+
+    xlo, xhi = bounds[node.x]
+    if isinstance(node, amnet.Max):
+        keep = xhi >= np.max(xlo)
+    else:
+        keep = xlo <= np.min(xhi)
+    return [int(i) for i in np.flatnonzero(keep)]
+
+
+def _interval_node(node, bounds, lo, hi):
+    """
+    Returns interval bounds on the output of node,
+    given the bounds of its children
+    """
+    # the checking order should go *up* the class hierarchy
+    if isinstance(node, amnet.Variable):
+        return lo, hi
+    elif isinstance(node, amnet.Constant):
+        return node.b, node.b
+    elif isinstance(node, amnet.Affine):
+        xlo, xhi = bounds[node.x]
+        return _affine_interval(node.w, node.b, xlo, xhi)
+    elif isinstance(node, amnet.Mu):
+        signs = selector_signs(node, bounds)
+        xlo, xhi = bounds[node.x]
+        ylo, yhi = bounds[node.y]
+        lo = np.where(signs < 0, xlo,
+                      np.where(signs > 0, ylo, np.minimum(xlo, ylo)))
+        hi = np.where(signs < 0, xhi,
+                      np.where(signs > 0, yhi, np.maximum(xhi, yhi)))
+        return lo, hi
+    elif isinstance(node, amnet.Stack):
+        xlo, xhi = bounds[node.x]
+        ylo, yhi = bounds[node.y]
+        return (np.concatenate((xlo, ylo), axis=0),
+                np.concatenate((xhi, yhi), axis=0))
+    elif isinstance(node, amnet.Max):
+        xlo, xhi = bounds[node.x]
+        return np.array([np.max(xlo)]), np.array([np.max(xhi)])
+    elif isinstance(node, amnet.Min):
+        xlo, xhi = bounds[node.x]
+        return np.array([np.min(xlo)]), np.array([np.min(xhi)])
+    else:
+        assert False, 'Failure: do not know how to bound %s' % str(node)
+
+
+def interval_bounds(phi, lo, hi):
+    """
+    Propagates the input box lo <= x <= hi through phi using
+    interval arithmetic, and returns a dictionary
+    node -> (lower bound, upper bound)
+    containing sound bounds on the output of every node of phi.
+
+    Affine nodes split their weights into positive and negative parts,
+    Max and Min nodes reduce the bounds of their input,
+    and Mu nodes use case analysis on the bounds of their enable input:
+    each component whose z-sign is fixed on the box takes the bounds of the
+    selected branch, and the other components the hull of both branches.
+
+    The bounds are computed in floating point, and are not
+    rounded outward.
+    """
+    lo, hi = _check_box(phi, lo, hi)
+
+    bounds = dict()
+    for node in postorder(phi):
+        bounds[node] = _interval_node(node, bounds, lo, hi)
+
+    return bounds
+
+
+################################################################################
+# symbolic (linear relaxation) bounds
+################################################################################
+
+def _affine_form(node, forms):
+    """
+    Returns the exact affine form (terms, c) of node, where
+    terms maps id(atom) -> (atom, W), so that node = sum(W * atom) + c.
+
+    Atoms are the nodes that are not Affine or Stack (e.g., Variable, Mu).
+    The forms of the children of node must already be in forms
+    (see _form, which computes them on demand).
+    """
+    if isinstance(node, amnet.Constant):
+        return dict(), node.b
+    elif isinstance(node, amnet.Affine):
+        xterms, xc = forms[id(node.x)]
+        terms = dict((k, (atom, np.dot(node.w, w)))
+                     for k, (atom, w) in xterms.items())
+        return terms, np.dot(node.w, xc) + node.b
+    elif isinstance(node, amnet.Stack):
+        m, n = node.x.outdim, node.y.outdim
+        terms = dict()
+        for child, top, bot in [(node.x, 0, n), (node.y, m, 0)]:
+            cterms, _ = forms[id(child)]
+            for k, (atom, w) in cterms.items():
+                wpad = np.pad(w, ((top, bot), (0, 0)), mode='constant')
+                if k in terms:
+                    wpad = wpad + terms[k][1]
+                terms[k] = (atom, wpad)
+        c = np.concatenate((forms[id(node.x)][1], forms[id(node.y)][1]), axis=0)
+        return terms, c
+    else:
+        return {id(node): (node, np.eye(node.outdim))}, np.zeros(node.outdim)
+
+
+def _form(phi, forms):
+    """
+    Returns the affine form of phi, computing (and caching in forms)
+    the forms of the Affine and Stack nodes below it
+    """
+    def form_children(node):
+        if isinstance(node, amnet.Constant):
+            return []
+        elif isinstance(node, amnet.Affine) or isinstance(node, amnet.Stack):
+            return children(node)
+        else:
+            return []
+
+    pending = [phi]
+    while pending:
+        node = pending[-1]
+        if id(node) in forms:
+            pending.pop()
+            continue
+
+        missing = [c for c in form_children(node) if id(c) not in forms]
+        if missing:
+            pending.extend(missing)
+        else:
+            forms[id(node)] = _affine_form(node, forms)
+            pending.pop()
+
+    return forms[id(phi)]
+
+
+def _forms_equal(f1, f2, tol=1e-9):
+    """ True if the affine forms f1 and f2 agree (up to tol) """
+    terms1, c1 = f1
+    terms2, c2 = f2
+    keys = set(terms1.keys()) | set(terms2.keys())
+    for k in keys:
+        w1 = terms1[k][1] if k in terms1 else 0
+        w2 = terms2[k][1] if k in terms2 else 0
+        if np.any(np.abs(w1 - w2) > tol):
+            return False
+    return np.all(np.abs(c1 - c2) <= tol)
+
+
+def _form_diff(f1, f2):
+    """ returns the affine form f1 - f2 """
+    terms1, c1 = f1
+    terms2, c2 = f2
+    terms = dict(terms1)
+    for k, (atom, w) in terms2.items():
+        terms[k] = (atom, terms[k][1] - w) if k in terms else (atom, -w)
+    return terms, c1 - c2
+
+
+def _mu_kind(mu, forms):
+    """
+    Returns 'max' if the Mu node mu computes max(x, y) (i.e., z = y - x),
+    'min' if it computes min(x, y) (i.e., z = x - y),
+    and None otherwise
+    """
+    if mu.z.outdim != mu.x.outdim:
+        return None
+
+    fx, fy, fz = [_form(c, forms) for c in (mu.x, mu.y, mu.z)]
+    if _forms_equal(fz, _form_diff(fy, fx)):
+        return 'max'
+    elif _forms_equal(fz, _form_diff(fx, fy)):
+        return 'min'
+    else:
+        return None
+
+
+def _concretize(a, c, lo, hi):
+    """ bounds of a*x + c over the box lo <= x <= hi """
+    return _affine_interval(a, c, lo, hi)
+
+
+def _mu_linear(mu, linear, bounds, forms, lo, hi):
+    """
+    Returns linear bounds (al, cl, au, cu) on the output of Mu node mu,
+    using the linear bounds of its children and the concrete bounds
+    of its enable input to relax the unstable components
+    """
+    n = mu.outdim
+    zi = np.arange(n) if mu.z.outdim == n else np.zeros(n, dtype=int)
+
+    alx, clx, aux, cux = linear[mu.x]
+    aly, cly, auy, cuy = linear[mu.y]
+    alz, clz, auz, cuz = [v[zi] for v in linear[mu.z]]
+    zlo, zhi = [v[zi] for v in bounds[mu.z]]
+
+    # stable components take the bounds of the selected branch
+    sel_y = (zlo > 0)
+    al = np.where(sel_y[:, None], aly, alx)
+    cl = np.where(sel_y, cly, clx)
+    au = np.where(sel_y[:, None], auy, aux)
+    cu = np.where(sel_y, cuy, cux)
+
+    unstable = (zlo <= 0) & (zhi > 0)
+    if not np.any(unstable):
+        return al, cl, au, cu
+
+    kind = _mu_kind(mu, forms)
+
+    def pick_lower(cands):
+        # keep, per component, the candidate with the largest concrete bound
+        best = [_concretize(a, c, lo, hi)[0] for (a, c) in cands]
+        k = np.argmax(best, axis=0)
+        return (np.choose(k[:, None], [a for (a, _) in cands]),
+                np.choose(k, [c for (_, c) in cands]))
+
+    def pick_upper(cands):
+        # keep, per component, the candidate with the smallest concrete bound
+        best = [_concretize(a, c, lo, hi)[1] for (a, c) in cands]
+        k = np.argmin(best, axis=0)
+        return (np.choose(k[:, None], [a for (a, _) in cands]),
+                np.choose(k, [c for (_, c) in cands]))
+
+    # slopes of the relu triangle relaxations of z and -z
+    # (only meaningful on the unstable components)
+    width = np.where(unstable, zhi - zlo, 1.)
+    s = np.where(unstable, zhi / width, 0.)
+    s2 = np.where(unstable, -zlo / width, 0.)
+
+    if kind == 'max':
+        # w = max(x, y) >= x, y
+        ul = pick_lower([(alx, clx), (aly, cly)])
+        # w = x + relu(z) = y + relu(-z)
+        uu = pick_upper([
+            (aux + s[:, None] * auz, cux + s * (cuz - zlo)),
+            (auy - s2[:, None] * alz, cuy + s2 * (zhi - clz))
+        ])
+    elif kind == 'min':
+        # w = x - relu(z) = y - relu(-z)
+        ul = pick_lower([
+            (alx - s[:, None] * auz, clx - s * (cuz - zlo)),
+            (aly + s2[:, None] * alz, cly + s2 * (clz - zhi))
+        ])
+        # w = min(x, y) <= x, y
+        uu = pick_upper([(aux, cux), (auy, cuy)])
+    else:
+        # w is either x or y: shift the bounds of one branch so that
+        # they also bound the other branch over the box
+        _, dl_xy = _concretize(alx - aly, clx - cly, lo, hi)
+        _, dl_yx = _concretize(aly - alx, cly - clx, lo, hi)
+        ul = pick_lower([
+            (alx, clx - np.maximum(dl_xy, 0)),
+            (aly, cly - np.maximum(dl_yx, 0))
+        ])
+        _, du_yx = _concretize(auy - aux, cuy - cux, lo, hi)
+        _, du_xy = _concretize(aux - auy, cux - cuy, lo, hi)
+        uu = pick_upper([
+            (aux, cux + np.maximum(du_yx, 0)),
+            (auy, cuy + np.maximum(du_xy, 0))
+        ])
+
+    al[unstable], cl[unstable] = ul[0][unstable], ul[1][unstable]
+    au[unstable], cu[unstable] = uu[0][unstable], uu[1][unstable]
+    return al, cl, au, cu
+
+
+def _max_linear(xlinear, xbounds, lo, hi):
+    """
+    Returns linear bounds (al, cl, au, cu) on max_i x_i, given
+    linear bounds xlinear and concrete bounds xbounds on x
+    """
+    alx, clx, aux, cux = xlinear
+    xlo, xhi = xbounds
+
+    # max_i x_i >= x_k, for the component k with the best lower bound
+    k = np.argmax(xlo)
+    al, cl = alx[k:k+1], clx[k:k+1]
+
+    # max_i x_i <= x_k + max_i sup(x_i - x_k), for the component k
+    # with the largest upper bound, unless a constant bound is tighter
+    k = np.argmax(xhi)
+    _, shift = _concretize(aux - aux[k], cux - cux[k], lo, hi)
+    au, cu = aux[k:k+1], cux[k:k+1] + max(np.max(shift), 0)
+    if _concretize(au, cu, lo, hi)[1][0] > np.max(xhi):
+        au, cu = np.zeros_like(au), np.array([np.max(xhi)])
+
+    return al, cl, au, cu
+
+
+def _linear_node(node, linear, bounds, forms, lo, hi):
+    """
+    Returns linear bounds (al, cl, au, cu) on the output of node,
+    in terms of the input variable, given those of its children
+    """
+    # the checking order should go *up* the class hierarchy
+    if isinstance(node, amnet.Variable):
+        eye = np.eye(node.outdim)
+        zero = np.zeros(node.outdim)
+        return eye, zero, eye, zero
+    elif isinstance(node, amnet.Constant):
+        zero = np.zeros((node.outdim, node.indim))
+        return zero, node.b, zero, node.b
+    elif isinstance(node, amnet.Affine):
+        # substitute the bounds of the child
+        alx, clx, aux, cux = linear[node.x]
+        wpos = np.maximum(node.w, 0)
+        wneg = np.minimum(node.w, 0)
+        return (np.dot(wpos, alx) + np.dot(wneg, aux),
+                np.dot(wpos, clx) + np.dot(wneg, cux) + node.b,
+                np.dot(wpos, aux) + np.dot(wneg, alx),
+                np.dot(wpos, cux) + np.dot(wneg, clx) + node.b)
+    elif isinstance(node, amnet.Mu):
+        return _mu_linear(node, linear, bounds, forms, lo, hi)
+    elif isinstance(node, amnet.Stack):
+        return tuple(np.concatenate((vx, vy), axis=0)
+                     for vx, vy in zip(linear[node.x], linear[node.y]))
+    elif isinstance(node, amnet.Max):
+        return _max_linear(linear[node.x], bounds[node.x], lo, hi)
+    elif isinstance(node, amnet.Min):
+        # min_i x_i = -max_i (-x_i)
+        alx, clx, aux, cux = linear[node.x]
+        xlo, xhi = bounds[node.x]
+        al, cl, au, cu = _max_linear((-aux, -cux, -alx, -clx), (-xhi, -xlo), lo, hi)
+        return -au, -cu, -al, -cl
+    else:
+        assert False, 'Failure: do not know how to bound %s' % str(node)
+
+
+def linear_bounds(phi, lo, hi):
+    """
+    Propagates the input box lo <= x <= hi through phi, where every node
+    carries linear lower and upper bounds in terms of the input x:
+        al * x + cl <= node(x) <= au * x + cu,  for lo <= x <= hi
+
+    Affine and Stack nodes substitute the linear bounds of their children,
+    and Max (Min) nodes keep the best lower (upper) bound of a component.
+    Unstable Mu nodes are relaxed: if the Mu computes max(x, y) or
+    min(x, y) (as those built by atoms.max2_1, atoms.min2_1, and
+    atoms.relu), the relaxation is the triangle relaxation of the
+    underlying relu; otherwise, the bounds of one branch are shifted
+    to cover the other branch.
+
+    Returns a pair (bounds, linear) of dictionaries, where
+    bounds maps node -> (lower bound, upper bound), and
+    linear maps node -> (al, cl, au, cu).
+    The concrete bounds are intersected with those of interval arithmetic,
+    so they are never looser than the output of interval_bounds.
+    """
+    lo, hi = _check_box(phi, lo, hi)
+
+    bounds = dict()
+    linear = dict()
+    forms = dict()
+
+    for node in postorder(phi):
+        linear[node] = _linear_node(node, linear, bounds, forms, lo, hi)
+
+        # intersect with interval arithmetic on the (tightened) children
+        ilo, ihi = _interval_node(node, bounds, lo, hi)
+        slo, _ = _concretize(linear[node][0], linear[node][1], lo, hi)
+        _, shi = _concretize(linear[node][2], linear[node][3], lo, hi)
+        bounds[node] = (np.maximum(ilo, slo), np.minimum(ihi, shi))
+
+    return bounds, linear
+
+
+def symbolic_bounds(phi, lo, hi):
+    """
+    Returns a dictionary node -> (lower bound, upper bound)
+    containing sound bounds on the output of every node of phi
+    over the input box lo <= x <= hi, computed by linear_bounds.
+
+    These are usually much tighter than interval_bounds on deep networks,
+    and can be used anywhere interval bounds are.
+    """
+    bounds, _ = linear_bounds(phi, lo, hi)
+    return bounds
+
+
+def halfspace_bounds(phi, A, lo, hi, linear=None):
+    """
+    Returns (ub, au), where ub is an upper bound on each row of
+    A * phi(x) over the box lo <= x <= hi, and au holds the input
+    coefficients of the linear upper bounds au * x + cu of the rows
+    (from linear_bounds) that ub is derived from.
+
+    linear is the output of linear_bounds(phi, lo, hi),
+    which is computed if not provided.
+    """
+    lo, hi = _check_box(phi, lo, hi)
+    A = np.atleast_2d(A)
+    assert A.shape[1] == phi.outdim
+
+    if linear is None:
+        linear = linear_bounds(phi, lo, hi)
+    bounds, linear = linear
+    al, cl, au, cu = linear[phi]
+    ylo, yhi = bounds[phi]
+
+    Apos, Aneg = np.maximum(A, 0), np.minimum(A, 0)
+    row_au = np.dot(Apos, au) + np.dot(Aneg, al)
+    row_cu = np.dot(Apos, cu) + np.dot(Aneg, cl)
+
+    # the better of the linear and the interval bound of each row
+    _, ub_lin = _concretize(row_au, row_cu, lo, hi)
+    _, ub_int = _affine_interval(A, np.zeros(len(A)), ylo, yhi)
+    return np.minimum(ub_lin, ub_int), row_au
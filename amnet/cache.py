@@ -0,0 +1,198 @@
+import numpy as np
+import amnet
+import amnet.smtlib
+from amnet.tree import fingerprint
+from amnet.util import model_values
+
+import z3
+import os
+import json
+import hashlib
+import tempfile
+
+"""
+A persistent, content-addressed cache of SMT-LIB2 encodings
+and verification verdicts, keyed by amnet.tree.fingerprint
+"""
+
+# size bound of a cache directory, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# version of the format of the entries (and of the encodings they hold);
+# bump it whenever SmtEncoder or amnet.smtlib change what they write,
+# so that stale entries are never served
+FORMAT_VERSION = 1
+
+_VERSION_FILE = 'VERSION'
+_TMP_SUFFIX = '.tmp'
+
+
+def _key(*parts):
+    """ returns a hash of fingerprints and (arrays of) numbers """
+    h = hashlib.sha1()
+    h.update(('format %d' % FORMAT_VERSION).encode())
+    for p in parts:
+        if isinstance(p, str):
+            h.update(p.encode())
+        else:
+            h.update(np.ascontiguousarray(p, dtype=float).tobytes())
+            h.update(str(np.shape(p)).encode())
+    return h.hexdigest()
+
+
+class Cache(object):
+    """
+    Cache stores SMT-LIB2 encodings (with the names of their input
+    and output variables) and verdicts in the directory path, one
+    file per entry, named by a hash of the fingerprint of the network
+    and of the query parameters.
+
+    Entries are evicted in least-recently-used order (by file
+    modification time, which every hit refreshes) once the directory
+    exceeds max_bytes. The whole cache is cleared if it was written
+    by a different version of amnet (or a different version string),
+    and entries written in another FORMAT_VERSION are never read.
+    Several processes can share a cache directory.
+
+    Example:
+        cache = amnet.cache.Cache('~/.amnet_cache')
+        xc = cache.check_output_halfspaces(phi, lo, hi, A, b)
+    """
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, version=None):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.version = amnet.__version__ if version is None else version
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        vfile = os.path.join(self.path, _VERSION_FILE)
+        stored = None
+        if os.path.exists(vfile):
+            with open(vfile) as f:
+                stored = f.read().strip()
+        if stored != self.version:
+            self.clear()
+            with open(vfile, 'w') as f:
+                f.write(self.version)
+
+    def _entries(self):
+        # temporary files are being written by put (in some process)
+        return [os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name != _VERSION_FILE and not name.endswith(_TMP_SUFFIX)]
+
+    def clear(self):
+        """ removes every entry (and leftover temporary files) """
+        for name in os.listdir(self.path):
+            if name != _VERSION_FILE:
+                os.remove(os.path.join(self.path, name))
+
+    def size(self):
+        """ returns the total size of the entries, in bytes """
+        return sum(os.path.getsize(fname) for fname in self._entries())
+
+    def get(self, key):
+        """ returns the entry stored under key (as a dict), or None """
+        fname = os.path.join(self.path, key)
+        try:
+            with open(fname) as f:
+                entry = json.load(f)
+            os.utime(fname, None)  # mark as recently used
+        except (IOError, OSError):
+            # missing, or evicted by another process
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """ stores entry (a json-serializable dict) under key """
+        # write to a private temporary file, then atomically move it in place
+        fd, tmp = tempfile.mkstemp(suffix=_TMP_SUFFIX, dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp, os.path.join(self.path, key))
+        self.evict()
+
+    def evict(self):
+        """ removes the least recently used entries until the cache fits in max_bytes """
+        entries = []
+        for fname in self._entries():
+            try:
+                entries.append((os.path.getmtime(fname), os.path.getsize(fname), fname))
+            except OSError:
+                pass  # evicted by another process
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, fname in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+            total -= size
+
+    ############################################################################
+    # queries
+    ############################################################################
+
+    def encoding(self, phi, lo=None, hi=None):
+        """
+        Returns the SMT-LIB2 encoding of phi (over the box lo <= x <= hi,
+        if given) written by amnet.smtlib.write_smt2, as a dict with
+        keys 'smt2', 'inputs', and 'outputs' (the variable names)
+        """
+        domain = None if lo is None else (np.asarray(lo, dtype=float),
+                                          np.asarray(hi, dtype=float))
+        parts = [fingerprint(phi), 'encoding']
+        if domain is not None:
+            parts.extend(domain)
+        key = _key(*parts)
+
+        entry = self.get(key)
+        if entry is None:
+            ctx = amnet.smt.NamingContext(phi)
+            smt2 = amnet.smtlib.to_smt2(phi, ctx=ctx, domain=domain, check_sat=False)
+            xvar = ctx.symbols[ctx.name_of_input()]
+            entry = {'smt2': smt2,
+                     'inputs': amnet.smtlib.var_names(ctx, xvar),
+                     'outputs': amnet.smtlib.var_names(ctx, phi)}
+            self.put(key, entry)
+
+        return entry
+
+    def check_output_halfspaces(self, phi, lo, hi, A, b):
+        """
+        Checks A * phi(x) <= b for all x in the box lo <= x <= hi,
+        with the cached verdict if there is one, or else by solving
+        the cached encoding with z3.
+
+        Returns None if the property holds, and otherwise
+        a counterexample input as a numpy array.
+        """
+        A = np.atleast_2d(np.asarray(A, dtype=float))
+        b = np.atleast_1d(np.asarray(b, dtype=float))
+        key = _key(fingerprint(phi), 'halfspaces', lo, hi, A, b)
+
+        entry = self.get(key)
+        if entry is None:
+            enc = self.encoding(phi, lo, hi)
+            solver = z3.Solver()
+            solver.from_string(enc['smt2'] +
+                               amnet.smtlib.halfspaces_assertion(A, b, enc['outputs']))
+            result = solver.check()
+            assert result in [z3.sat, z3.unsat], 'solver returned %s' % result
+
+            xc = None
+            if result == z3.sat:
+                model = solver.model()
+                xc = model_values(model, [z3.Real(v) for v in enc['inputs']]).tolist()
+            entry = {'verdict': str(result), 'counterexample': xc}
+            self.put(key, entry)
+
+        if entry['counterexample'] is None:
+            return None
+        return np.array(entry['counterexample'])
@@ -1,6 +1,6 @@
 import numpy as np
 import amnet
-from amnet.util import foldl, r2f, mfp
+from amnet.util import foldt, model_values
 
 import z3
 import cvxpy
@@ -15,7 +15,7 @@ def _max2_z3(x, y):
 
 def _maxN_z3(xs):
     assert len(xs) >= 1
-    return foldl(_max2_z3, xs[0], xs[1:])
+    return foldt(_max2_z3, xs)
 
 def _abs_z3(x):
     return _max2_z3(x, -x)
@@ -61,7 +61,6 @@ def stability_search1(phi, xsys, m):
     fsolver = z3.SolverFor('QF_LRA')
 
     enc = amnet.smt.SmtEncoder(phi, solver=fsolver)
-    enc.init_tree()
 
     print enc
 
@@ -129,12 +128,8 @@ def stability_search1(phi, xsys, m):
             print 'iter=%s: Found new Lyapunov Function' % iter
             #print 'esolver=%s' % esolver
             model = esolver.model()
-            A_cand = np.array(
-                [[mfp(model, Avar[i][j]) for j in range(n)] for i in range(m)]
-            )
-            b_cand = np.array(
-                [mfp(model, bvar[i]) for i in range(m)]
-            )
+            A_cand = model_values(model, Avar)
+            b_cand = model_values(model, bvar)
             print "V(x)=max(Ax+b):"
             print "A=" + str(A_cand)
             print "b=" + str(b_cand)
@@ -152,7 +147,7 @@ def stability_search1(phi, xsys, m):
         fsolver.push()
 
         # z3 symbol for input to phi
-        x = enc.get_symbol(xsys)
+        x = enc.var_of_input()
 
         # encode Vx
         Vx_terms = [z3.Sum([A_cand[i][j] * x[j] for j in range(n)]) + b_cand[i] for i in range(m)]
@@ -161,7 +156,7 @@ def stability_search1(phi, xsys, m):
         fsolver.add(Vx == Vx_expr)
 
         # z3 symbol for phi(x)
-        x_next = enc.get_symbol(phi)
+        x_next = enc.var_of(phi)
 
         # encode Vx_next
         Vx_next_terms = [z3.Sum([A_cand[i][j] * x_next[j] for j in range(n)]) + b_cand[i] for i in range(m)]
@@ -192,7 +187,7 @@ def stability_search1(phi, xsys, m):
             print 'iter=%s: Found new Counterexample' % iter
             #print 'fsolver=%s' % fsolver
             fmodel = fsolver.model()
-            xc = np.array([mfp(fmodel, x[j]) for j in range(n)])
+            xc = model_values(fmodel, x)
             Xc.append(xc)
         else:
             print 'iter=%s: No Counterexample found' % iter
@@ -217,7 +212,7 @@ def stability_search1(phi, xsys, m):
 ################################################################################
 
 
-def find_local_counterexample(phi, xsys, A, b):
+def find_local_counterexample(phi, xsys, A, b, session=None):
     """
     Returns None if V(x) = max(Ax+b) is a local 
     Lyapunov function for the autonomous system
@@ -225,6 +220,9 @@ def find_local_counterexample(phi, xsys, A, b):
     
     Otherwise, returns a counter example xc
     e.g. at which !(V(phi(xc)) <= 0.99 V(xc))
+
+    Pass an amnet.verify.Session of phi to reuse
+    its encoding across candidate (A, b) pairs.
     """
     (m, n) = A.shape
     assert len(b) == m
@@ -233,26 +231,10 @@ def find_local_counterexample(phi, xsys, A, b):
     assert n >= 1
     assert m >= 1
 
-    # encode the dynamics network
-    fsolver = z3.Solver()
-    enc = amnet.smt.SmtEncoder(phi, solver=fsolver)
-    enc.init_tree()
-
-    # references to z3 input and output variables
-    xc0 = enc.get_symbol(xsys)
-    xc1 = enc.get_symbol(phi)
-
-    # encode V(xc0) and V(xc1)
-    Vc0 = z3.Real('vc0')
-    Vc1 = z3.Real('vc1')
-    Vc0_expr = _maxN_z3(
-        [z3.Sum([A[i][j] * xc0[j] for j in range(n)]) + b[i] for i in range(m)]
-    )
-    Vc1_expr = _maxN_z3(
-        [z3.Sum([A[i][j] * xc1[j] for j in range(n)]) + b[i] for i in range(m)]
-    )
-    fsolver.add(Vc0 == Vc0_expr)
-    fsolver.add(Vc1 == Vc1_expr)
+    # encode the dynamics network once, or reuse the session
+    if session is None:
+        session = amnet.verify.Session(phi)
+    assert session.phi is phi
 
     # V is a local Lyapunov function if, for all x in S
     # 1) V(0) == 0
@@ -268,48 +250,19 @@ def find_local_counterexample(phi, xsys, A, b):
 
     # condition 4 (<-> reformulate to just on the boundary)
     #             (therefore, includes condition 2)
-    fsolver.push()
-    fsolver.add(_normL1_z3(xc0) == 1)
-    fsolver.add(z3.Not(Vc0 > 0))
-
-    if fsolver.check() == z3.sat:
-        model = fsolver.model()
-        xc  = np.array([mfp(model, xc0[j]) for j in range(n)])
-        xcn = np.array([mfp(model, xc1[j]) for j in range(n)])
+    xc = session.check_lyapunov_positive(A, b, radius=1)
+    if xc is not None:
         print 'Not Lyapunov (radially unbound)'
-        print '(xc, xn) = (%s, %s)' % (str(xc), str(xcn))
+        print '(xc, xn) = (%s, %s)' % (str(xc), str(phi.eval(xc)))
         return xc
 
-    fsolver.pop()
-
-    # condition 2
-    # fsolver.push()
-    # fsolver.add(z3.Not(xc0 == 0))
-    # fsolver.add(z3.Not(Vc0 > 0))
-    #
-    # if fsolver.check() == z3.sat:
-    #     model = fsolver.model()
-    #     print 'Not Lyapunov (>0)'
-    #     xc = np.array([mfp(model, xc0[j]) for j in range(n)])
-    #     return xc
-    #
-    # fsolver.pop()
-
     # condition 3
-    fsolver.push()
-    fsolver.add(_normL1_z3(xc0) <= 1)
-    fsolver.add(z3.Not(Vc1 <= 0.99*Vc0))
-
-    if fsolver.check() == z3.sat:
-        model = fsolver.model()
-        xc  = np.array([mfp(model, xc0[j]) for j in range(n)])
-        xcn = np.array([mfp(model, xc1[j]) for j in range(n)])
+    xc = session.check_lyapunov_decrease(A, b, rate=0.99, radius=1)
+    if xc is not None:
         print 'Not Lyapunov (decrement)'
-        print '(xc, xn) = (%s, %s)' % (str(xc), str(xcn))
+        print '(xc, xn) = (%s, %s)' % (str(xc), str(phi.eval(xc)))
         return xc
 
-    fsolver.pop()
-
     # all conditions have been met, this is a Lyapunov function
     return None
 
@@ -0,0 +1,424 @@
+import numpy as np
+import amnet
+from amnet.tree import postorder
+
+import scipy.sparse
+from scipy.optimize import linprog
+
+try:
+    # scipy >= 1.9 (HiGHS)
+    from scipy.optimize import milp as _scipy_milp
+    from scipy.optimize import LinearConstraint, Bounds
+except ImportError:
+    _scipy_milp = None
+
+"""
+Encodes an Amn over an input box as the constraints of a
+mixed-integer linear program (MILP), as an alternative to amnet.smt.
+
+Every node output is a list of columns of the program. Unstable Mu
+components, and Max/Min nodes with more than one candidate, are
+encoded with binary columns and big-M constraints, where each M comes
+from the bounds of the nodes (amnet.bounds.symbolic_bounds by default).
+
+The program is solved with scipy.optimize.milp if it is available,
+and otherwise by a branch-and-bound over scipy.optimize.linprog.
+"""
+
+INT_TOL = 1e-6
+
+# feasibility tolerance of the branch-and-bound fallback
+LP_TOL = 1e-9
+
+# methods (and options) of scipy.optimize.linprog for the
+# branch-and-bound fallback, tried in order until one succeeds
+LP_METHODS = [
+    ('simplex', {'tol': LP_TOL}),
+    ('interior-point', {}),
+]
+
+# slack added to the node bounds used as column bounds,
+# so that floating point rounding cannot cut off feasible points
+BOUND_TOL = 1e-6
+
+
+class MilpEncoder(object):
+    """
+    MilpEncoder builds the columns and constraints of a MILP whose
+    feasible set is {(x, nodes(x)) : lo <= x <= hi}.
+
+    The constraints are stored as rows rlo <= A * v <= rhi,
+    where v is the vector of all columns. Column bounds are
+    collbs <= v <= colubs, and the columns listed in binaries
+    are restricted to {0, 1}.
+
+    Note that the selector z of a Mu is only constrained to
+    z <= 0 (select x) or z >= 0 (select y), so the program may
+    pick either branch at z = 0. This matters only for Mu nodes
+    whose branches differ at z = 0 (not for max, min, or relu).
+    """
+    def __init__(self, phi, lo, hi, bounds=None):
+        self.phi = phi
+        self.lo = np.array(lo, dtype=float)
+        self.hi = np.array(hi, dtype=float)
+        assert len(self.lo) == phi.indim and len(self.hi) == phi.indim
+
+        if bounds is None:
+            bounds = amnet.bounds.symbolic_bounds(phi, self.lo, self.hi)
+        self.bounds = bounds
+
+        self.collbs = []
+        self.colubs = []
+        self.binaries = []
+        self.rows = []  # (cols, coeffs, rlo, rhi)
+        self.cols = dict()  # id(node) -> array of columns
+
+        for node in postorder(phi):
+            self.cols[id(node)] = self._encode_node(node)
+
+    def var_of(self, phi):
+        """
+        Returns the columns (as an array) of the output of phi
+        """
+        return self.cols[id(phi)]
+
+    def var_of_input(self):
+        """
+        Returns the columns (as an array) of the input variable
+        """
+        return self.cols[id(self.input)]
+
+    @property
+    def ncols(self):
+        return len(self.collbs)
+
+    def _new_cols(self, lb, ub, binary=False):
+        start = self.ncols
+        self.collbs.extend(lb)
+        self.colubs.extend(ub)
+        cols = np.arange(start, self.ncols)
+        if binary:
+            self.binaries.extend(cols)
+        return cols
+
+    def add_constraint(self, cols, coeffs, rlo=-np.inf, rhi=np.inf):
+        """
+        Adds the row rlo <= sum_k coeffs[k] * v[cols[k]] <= rhi
+        """
+        assert len(cols) == len(coeffs)
+        self.rows.append((list(cols), list(coeffs), rlo, rhi))
+
+    def _node_bounds(self, node):
+        lb, ub = self.bounds[node]
+        return lb - BOUND_TOL * (1 + np.abs(lb)), ub + BOUND_TOL * (1 + np.abs(ub))
+
+    def _encode_node(self, node):
+        lb, ub = self._node_bounds(node)
+
+        # the checking order should go *up* the class hierarchy
+        if isinstance(node, amnet.Variable):
+            self.input = node
+            return self._new_cols(self.lo, self.hi)
+        elif isinstance(node, amnet.Constant):
+            return self._new_cols(node.b, node.b)
+        elif isinstance(node, amnet.Affine):
+            xc = self.var_of(node.x)
+            yc = self._new_cols(lb, ub)
+            for i in range(node.outdim):
+                nz = np.nonzero(node.w[i, :])[0]
+                # y_i - w_i * x = b_i
+                self.add_constraint(
+                    [yc[i]] + list(xc[nz]),
+                    [1.0] + list(-node.w[i, nz]),
+                    node.b[i], node.b[i]
+                )
+            return yc
+        elif isinstance(node, amnet.Mu):
+            return self._encode_mu(node)
+        elif isinstance(node, amnet.Stack):
+            return np.concatenate((self.var_of(node.x), self.var_of(node.y)))
+        elif isinstance(node, amnet.Max):
+            return self._encode_reduction(node, is_max=True)
+        elif isinstance(node, amnet.Min):
+            return self._encode_reduction(node, is_max=False)
+        else:
+            assert False, 'Failure: do not know how to encode %s' % str(node)
+
+    def _encode_mu(self, node):
+        xc, yc, zc = [self.var_of(c) for c in (node.x, node.y, node.z)]
+        xlo, xhi = self._node_bounds(node.x)
+        ylo, yhi = self._node_bounds(node.y)
+        zlo, zhi = self._node_bounds(node.z)
+        lb, ub = self._node_bounds(node)
+
+        n = node.outdim
+        zi = range(n) if node.z.outdim == n else [0] * n
+        signs = amnet.bounds.selector_signs(node, self.bounds)
+
+        wc = np.zeros(n, dtype=int)
+        for i in range(n):
+            # stable components are aliases of their selected branch
+            if signs[i] < 0:
+                wc[i] = xc[i]
+                continue
+            elif signs[i] > 0:
+                wc[i] = yc[i]
+                continue
+
+            w = self._new_cols([lb[i]], [ub[i]])[0]
+            d = self._new_cols([0], [1], binary=True)[0]  # d = 1 selects y
+            z, zl, zu = zc[zi[i]], zlo[zi[i]], zhi[zi[i]]
+
+            # d = 0 -> z <= 0, and d = 1 -> z >= 0
+            self.add_constraint([z, d], [1, -zu], rhi=0)
+            self.add_constraint([z, d], [1, zl], rlo=zl)
+
+            # d = 0 -> w = x, and d = 1 -> w = y
+            M = max(0, yhi[i] - xlo[i], xhi[i] - ylo[i])
+            self.add_constraint([w, xc[i], d], [1, -1, -M], rhi=0)
+            self.add_constraint([w, xc[i], d], [1, -1, M], rlo=0)
+            self.add_constraint([w, yc[i], d], [1, -1, M], rhi=M)
+            self.add_constraint([w, yc[i], d], [1, -1, -M], rlo=-M)
+
+            wc[i] = w
+
+        return wc
+
+    def _encode_reduction(self, node, is_max):
+        xc = self.var_of(node.x)
+        lb, ub = self._node_bounds(node)
+
+        # drop the inputs that can never attain the extremum
+        cands = amnet.bounds.reduction_candidates(node, self.bounds)
+        xlo, xhi = self._node_bounds(node.x)
+
+        if len(cands) == 1:
+            return xc[cands]
+
+        w = self._new_cols(lb, ub)[0]
+        for j in range(len(xc)):
+            if is_max:
+                self.add_constraint([w, xc[j]], [1, -1], rlo=0)
+            else:
+                self.add_constraint([w, xc[j]], [1, -1], rhi=0)
+
+        # exactly one candidate attains the extremum
+        ds = self._new_cols(np.zeros(len(cands)), np.ones(len(cands)), binary=True)
+        self.add_constraint(ds, np.ones(len(cands)), 1, 1)
+        for j, d in zip(cands, ds):
+            if is_max:
+                # d = 1 -> w <= x_j
+                M = np.max(xhi) - xlo[j]
+                self.add_constraint([w, xc[j], d], [1, -1, M], rhi=M)
+            else:
+                # d = 1 -> w >= x_j
+                M = xhi[j] - np.min(xlo)
+                self.add_constraint([w, xc[j], d], [1, -1, -M], rlo=-M)
+
+        return np.array([w])
+
+    def constraint_matrix(self):
+        """
+        Returns (A, rlo, rhi), where A is a scipy.sparse CSR matrix
+        (repeated columns of a row are summed) and rlo, rhi are numpy arrays
+        """
+        ks, cols, coeffs = [], [], []
+        for k, (rcols, rcoeffs, _, _) in enumerate(self.rows):
+            ks.extend([k] * len(rcols))
+            cols.extend(rcols)
+            coeffs.extend(rcoeffs)
+
+        A = scipy.sparse.coo_matrix((np.array(coeffs, dtype=float), (ks, cols)),
+                                    shape=(len(self.rows), self.ncols)).tocsr()
+        A.eliminate_zeros()
+        rlo = np.array([row[2] for row in self.rows], dtype=float)
+        rhi = np.array([row[3] for row in self.rows], dtype=float)
+        return A, rlo, rhi
+
+    def solve(self, c, max_nodes=100000):
+        """
+        Minimizes c * v over the program, and returns (value, v),
+        or (None, None) if the program is infeasible.
+        """
+        c = np.asarray(c, dtype=float)
+        assert len(c) == self.ncols
+
+        A, rlo, rhi = self.constraint_matrix()
+        lb = np.array(self.collbs, dtype=float)
+        ub = np.array(self.colubs, dtype=float)
+        integrality = np.zeros(self.ncols)
+        integrality[self.binaries] = 1
+
+        if _scipy_milp is not None:
+            constraints = [LinearConstraint(A, rlo, rhi)] if len(self.rows) > 0 else []
+            res = _scipy_milp(c, constraints=constraints,
+                              integrality=integrality, bounds=Bounds(lb, ub))
+            if res.status == 2:
+                return None, None
+            if res.status != 0:
+                # a limit or numerical trouble proves nothing
+                raise RuntimeError('MILP solver failed: %s' % res.message)
+            return res.fun, res.x
+        else:
+            return _branch_and_bound(c, A, rlo, rhi, lb, ub,
+                                     np.array(self.binaries, dtype=int), max_nodes)
+
+    def maximize(self, c):
+        """
+        Maximizes c * phi(x) over the program, and returns (value, x),
+        where x is the maximizing input as a numpy array.
+        The encoding can be reused for several objectives c.
+        """
+        c = np.asarray(c, dtype=float)
+        assert len(c) == self.phi.outdim
+
+        obj = np.zeros(self.ncols)
+        for col, ci in zip(self.var_of(self.phi), c):
+            obj[col] -= ci
+
+        val, v = self.solve(obj)
+        assert val is not None, 'infeasible box'
+        return -val, v[self.var_of_input()]
+
+
+def _lp(c, A, rlo, rhi, lb, ub):
+    """
+    Solves min c * v subject to rlo <= A * v <= rhi, lb <= v <= ub,
+    where A is a scipy.sparse CSR matrix, and returns (value, v),
+    or (None, None) if infeasible
+    """
+    # eliminate the fixed columns (constants, and binaries fixed by branching)
+    fixed = (lb == ub)
+    v = np.copy(lb)
+    shift = A[:, fixed].dot(lb[fixed])
+    A, rlo, rhi = A[:, ~fixed], rlo - shift, rhi - shift
+
+    # rows without free columns only need to be checked
+    empty = (A.getnnz(axis=1) == 0)
+    if np.any(rlo[empty] > LP_TOL) or np.any(rhi[empty] < -LP_TOL):
+        return None, None
+    A, rlo, rhi = A[~empty], rlo[~empty], rhi[~empty]
+
+    if not np.any(~fixed):
+        return np.dot(c, v), v
+
+    # the linprog methods of older scipy versions need dense matrices
+    # (this fallback is only meant for small programs)
+    A = A.toarray()
+    eq = (rlo == rhi)
+    up = ~eq & np.isfinite(rhi)
+    dn = ~eq & np.isfinite(rlo)
+    A_ub = np.concatenate((A[up], -A[dn]), axis=0)
+    b_ub = np.concatenate((rhi[up], -rlo[dn]), axis=0)
+
+    # the simplex method of older scipy versions can report false
+    # infeasibility on badly scaled big-M rows, so the program is only
+    # infeasible if every method says so; any other failure would prune
+    # a subtree that may hold the optimum (or a counterexample), so it raises
+    res, failures = None, []
+    for method, options in LP_METHODS:
+        try:
+            res = linprog(c[~fixed],
+                          A_ub=A_ub if len(b_ub) > 0 else None,
+                          b_ub=b_ub if len(b_ub) > 0 else None,
+                          A_eq=A[eq] if np.any(eq) else None,
+                          b_eq=rlo[eq] if np.any(eq) else None,
+                          bounds=list(zip(lb[~fixed], ub[~fixed])),
+                          method=method,
+                          options=options)
+        except ValueError as e:
+            failures.append('%s: %s' % (method, e))
+            continue
+        if res.status == 0:
+            break
+        if res.status != 2:
+            failures.append('%s: %s' % (method, res.message))
+
+    if res is None or res.status != 0:
+        if failures:
+            raise RuntimeError('LP solver failed: %s' % '; '.join(failures))
+        return None, None
+
+    v[~fixed] = res.x
+    return np.dot(c, v), v
+
+
+def _branch_and_bound(c, A, rlo, rhi, lb, ub, binaries, max_nodes):
+    """
+    Depth-first branch-and-bound on the binary columns,
+    for scipy versions without scipy.optimize.milp
+    """
+    best_val, best_v = None, None
+    pending = [(lb, ub)]
+    nodes = 0
+
+    while pending:
+        nodes += 1
+        assert nodes <= max_nodes, 'branch-and-bound node limit reached'
+
+        blb, bub = pending.pop()
+        val, v = _lp(c, A, rlo, rhi, blb, bub)
+        if val is None:
+            continue
+        if best_val is not None and val >= best_val - INT_TOL:
+            continue
+
+        # branch on the most fractional binary
+        frac = np.abs(v[binaries] - np.round(v[binaries]))
+        if len(frac) == 0 or np.max(frac) <= INT_TOL:
+            # polish the solution with the binaries fixed at their values
+            blb, bub = np.copy(blb), np.copy(bub)
+            blb[binaries] = bub[binaries] = np.round(v[binaries])
+            pval, pv = _lp(c, A, rlo, rhi, blb, bub)
+            if pval is not None:
+                val, v = pval, pv
+            best_val, best_v = val, v
+            continue
+
+        k = binaries[np.argmax(frac)]
+        for bit in ([0, 1] if v[k] > 0.5 else [1, 0]):
+            clb, cub = np.copy(blb), np.copy(bub)
+            clb[k] = cub[k] = bit
+            pending.append((clb, cub))
+
+    return best_val, best_v
+
+
+################################################################################
+# queries
+################################################################################
+
+def maximize(phi, lo, hi, c=None, bounds=None):
+    """
+    Maximizes c * phi(x) over the box lo <= x <= hi,
+    where c defaults to selecting the first output.
+
+    Returns (value, x), where x is the maximizing input as a numpy array.
+    """
+    if c is None:
+        c = np.eye(1, phi.outdim, 0).flatten()
+    c = np.asarray(c, dtype=float)
+    assert len(c) == phi.outdim
+
+    return MilpEncoder(phi, lo, hi, bounds=bounds).maximize(c)
+
+
+def find_counterexample(phi, lo, hi, A, b, bounds=None):
+    """
+    Checks the property A * phi(x) <= b for all x in the box lo <= x <= hi.
+
+    Returns None if the property holds, and otherwise returns
+    a counterexample x (as a numpy array) at which some row
+    of the property is violated.
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    assert A.shape == (len(b), phi.outdim)
+
+    enc = MilpEncoder(phi, lo, hi, bounds=bounds)
+    for k in range(len(b)):
+        val, x = enc.maximize(A[k])
+        if val > b[k] + INT_TOL:
+            return x
+
+    return None
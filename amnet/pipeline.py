@@ -0,0 +1,190 @@
+import numpy as np
+import amnet
+
+import os
+import sys
+import tempfile
+import time
+import multiprocessing
+
+"""
+Certifies the robustness of a network on every input of a dataset
+(with amnet.verify.verify_robust), using a pool of processes, and
+appends the verdicts to a results file so that runs can be resumed
+"""
+
+FIELDS = ['index', 'label', 'predicted', 'robust', 'tier', 'seconds']
+
+# state of each worker process, set by _init_worker
+_state = dict()
+
+
+def load_inputs(path, key='x', mmap=True):
+    """
+    Returns the array stored in a .npy file (memory-mapped if mmap),
+    or under key in a .npz archive (which is read into memory)
+    """
+    if path.endswith('.npz'):
+        return np.load(path)[key]
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def _extract_npz(path, key, results_path):
+    """
+    Saves the array key of the .npz archive at path as a .npy file next
+    to results_path (unless it is up to date), so that it can be
+    memory-mapped, and returns the name of the .npy file
+    """
+    npy = '%s.%s.npy' % (results_path, key)
+    if not os.path.exists(npy) or os.path.getmtime(npy) < os.path.getmtime(path):
+        # write to a private temporary file, then atomically move it in place
+        fd, tmp = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(os.path.abspath(npy)))
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.load(path)[key])
+        os.rename(tmp, npy)
+    return npy
+
+
+def load_results(path):
+    """
+    Returns the complete lines of a results file
+    as a dictionary field -> numpy array
+    """
+    rows = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                # a crash can leave the last line incomplete
+                if not line.endswith('\n'):
+                    break
+                parts = line.split()
+                if len(parts) != len(FIELDS) or parts[0] == FIELDS[0]:
+                    continue
+                rows.append(parts)
+
+    columns = zip(*rows) if rows else [[]] * len(FIELDS)
+    types = [int, int, int, int, str, float]
+    return dict((field, np.array([t(v) for v in col], dtype=t if t is not str else object))
+                for field, t, col in zip(FIELDS, types, columns))
+
+
+def _init_worker(network, inputs_path, eps, clip, seed):
+    # every worker builds its network and maps the inputs once
+    _state['phi'] = network() if callable(network) else network
+    _state['inputs'] = load_inputs(inputs_path)
+    _state['eps'] = eps
+    _state['clip'] = clip
+    _state['seed'] = seed
+
+    # forked workers inherit the random state of the parent,
+    # and would otherwise all draw the same samples
+    if seed is None:
+        np.random.seed()
+
+
+def _certify(task):
+    i, label = task
+    phi = _state['phi']
+    if _state['seed'] is not None:
+        # the samples of each input do not depend on the worker
+        np.random.seed([_state['seed'], i])
+    x0 = np.array(_state['inputs'][i], dtype=float).flatten()
+
+    t0 = time.time()
+    predicted = int(np.argmax(phi.eval(x0)))
+    if label < 0:
+        label = predicted
+    res = amnet.verify.verify_robust(phi, x0, _state['eps'], label, clip=_state['clip'])
+    return i, label, predicted, int(res.robust), res.tier, time.time() - t0
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+def run(network, inputs_path, results_path, eps, labels=None, key='x', clip=None,
+        nprocs=None, report_every=10.0, out=sys.stdout, seed=None):
+    """
+    Runs verify_robust(phi, x, eps, label, clip) on every input x of the
+    dataset at inputs_path (see load_inputs), where inputs are flattened.
+    Workers memory-map the inputs: the array of a .npz archive is first
+    saved as the .npy file results_path + '.' + key + '.npy'.
+
+    network is either an Amn or a function without arguments that returns
+    one (called once in every worker, e.g., to load weights). labels is
+    an array with one label per input, or the key of the labels in the
+    .npz archive; by default, the label of each input is the one predicted
+    by the network.
+
+    Each verdict is appended to results_path as a line with the fields
+    FIELDS, as soon as it is available. Inputs that already have a line
+    in results_path are skipped, so an interrupted run resumes where it
+    stopped. Throughput and ETA are written to out every report_every
+    seconds (out=None disables them).
+
+    With a seed, the samples of the sampling tier only depend on the
+    seed and the index of the input; otherwise, every worker draws
+    from a fresh random state.
+
+    Returns the number of inputs verified by this run.
+    """
+    if isinstance(labels, str):
+        labels = np.load(inputs_path)[labels]
+    if inputs_path.endswith('.npz'):
+        inputs_path = _extract_npz(inputs_path, key, results_path)
+
+    inputs = load_inputs(inputs_path)
+    n = len(inputs)
+
+    if labels is None:
+        labels = -np.ones(n, dtype=int)
+    labels = np.asarray(labels, dtype=int).flatten()
+    assert len(labels) == n
+
+    # resume: skip the inputs with a complete line, and drop a partial line
+    done = set(load_results(results_path)['index'].tolist())
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            text = f.read()
+        if text and not text.endswith('\n'):
+            with open(results_path, 'w') as f:
+                f.write(text[:text.rfind('\n') + 1])
+    else:
+        with open(results_path, 'w') as f:
+            f.write(' '.join(FIELDS) + '\n')
+
+    tasks = [(i, labels[i]) for i in range(n) if i not in done]
+    total = len(tasks)
+    if total == 0:
+        return 0
+
+    if nprocs is None:
+        nprocs = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(nprocs, initializer=_init_worker,
+                                initargs=(network, inputs_path, eps, clip, seed))
+
+    t0 = time.time()
+    last_report = t0
+    count = 0
+    try:
+        with open(results_path, 'a') as f:
+            for row in pool.imap_unordered(_certify, tasks):
+                f.write('%d %d %d %d %s %.6f\n' % row)
+                f.flush()
+                count += 1
+
+                now = time.time()
+                if out is not None and (now - last_report >= report_every or count == total):
+                    rate = count / max(now - t0, 1e-9)
+                    out.write('%d/%d (%d/%d total) %.2f inputs/s ETA %s\n' %
+                              (count, total, count + len(done), n, rate,
+                               _format_eta((total - count) / rate)))
+                    out.flush()
+                    last_report = now
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return count
@@ -0,0 +1,221 @@
+import numpy as np
+import amnet
+from amnet.util import model_values
+
+import z3
+import multiprocessing
+import time
+
+try:
+    from Queue import Empty  # python 2
+except ImportError:
+    from queue import Empty
+
+"""
+Runs one SMT query under several z3 configurations in parallel
+processes, and keeps the first definitive (sat or unsat) answer
+"""
+
+# (name, z3 global parameters) of each configuration.
+# z3's own defaults, the settings from fast_params.txt,
+# and the settings used by tests/test_lyap.py
+DEFAULT_CONFIGS = [
+    ('default', {}),
+    ('case_split4', {'auto_config': False,
+                     'smt.auto_config': False,
+                     'smt.case_split': 4}),
+    ('case_split5_relevancy2', {'auto_config': False,
+                                'smt.case_split': 5,
+                                'smt.relevancy': 2}),
+    ('case_split3_seed1', {'auto_config': False,
+                           'smt.case_split': 3,
+                           'smt.random_seed': 1}),
+]
+
+# seconds between checks that the workers are still running
+POLL_SECONDS = 0.1
+
+
+def _model_values(model):
+    """ returns the arithmetic constants of a z3 model as a dict name -> float """
+    consts = [d() for d in model.decls() if d.arity() == 0 and z3.is_arith(d())]
+    return dict(zip([str(c) for c in consts], model_values(model, consts).tolist()))
+
+
+def _constants(term):
+    """ returns the uninterpreted constants of a z3 term """
+    consts = dict()
+    stack = [term]
+    while stack:
+        t = stack.pop()
+        if z3.is_const(t) and t.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            consts[str(t)] = t
+        else:
+            stack.extend(t.children())
+    return consts.values()
+
+
+def _worker(name, params, smt2, queue):
+    """ solves smt2 under the z3 parameters params, and reports to queue """
+    t0 = time.time()
+    try:
+        for key, value in params.items():
+            z3.set_param(key, value)
+
+        solver = z3.Solver()
+        solver.from_string(smt2)
+        result = solver.check()
+
+        values = _model_values(solver.model()) if result == z3.sat else None
+        queue.put((name, str(result), values, time.time() - t0))
+    except Exception as e:
+        queue.put((name, 'error: %s' % e, None, time.time() - t0))
+
+
+class PortfolioResult(object):
+    """
+    Outcome of a portfolio query:
+    result   'sat', 'unsat', or 'unknown' (no configuration answered in time)
+    winner   name of the configuration that answered first (or None)
+    values   dict (constant name -> float) of the model, if sat
+    times    dict (configuration name -> seconds) of the configurations
+             that finished, including the ones without a definitive answer
+    elapsed  wall-clock seconds of the whole query
+    """
+    def __init__(self, result, winner, values, times, elapsed):
+        self.result = result
+        self.winner = winner
+        self.values = values
+        self.times = times
+        self.elapsed = elapsed
+
+    def value_of(self, zvars):
+        """
+        Returns the model values of a list of z3 terms over the constants
+        of the query (e.g., SmtEncoder.var_of(phi), which are terms rather
+        than constants for inlined nodes) as a numpy array.
+        Every constant of the terms must be in the model.
+        """
+        assert self.values is not None, 'no model (result is %s)' % self.result
+
+        values = []
+        for v in zvars:
+            subs = []
+            for c in _constants(v):
+                assert str(c) in self.values, '%s is not in the model' % c
+                subs.append((c, z3.RealVal(self.values[str(c)])))
+            r = z3.simplify(z3.substitute(v, *subs) if subs else v)
+            assert z3.is_rational_value(r), 'cannot evaluate %s' % v
+            values.append(float(r.as_fraction()))
+        return np.array(values)
+
+    def __str__(self):
+        return '%s (%s, %.3fs)' % (self.result, self.winner, self.elapsed)
+
+
+class Portfolio(object):
+    """
+    A Portfolio solves each query under all of its configurations
+    (a list of (name, z3 parameters) pairs, DEFAULT_CONFIGS by default),
+    one process per configuration. The first sat or unsat answer is
+    returned and the remaining processes are terminated.
+
+    wins counts how often each configuration answered first, and history
+    keeps the PortfolioResult of every query, so that the defaults can
+    be tuned on a batch of queries.
+
+    Example:
+        pf = amnet.portfolio.Portfolio(timeout=60)
+        res = pf.check_encoder(enc, [enc.var_of(phi)[0] >= 1])
+        if res.result == 'sat':
+            xc = res.value_of(enc.var_of_input())
+    """
+    def __init__(self, configs=None, timeout=None):
+        self.configs = list(DEFAULT_CONFIGS if configs is None else configs)
+        assert len(self.configs) >= 1
+        assert len(set(name for name, _ in self.configs)) == len(self.configs), \
+            'configuration names must be unique'
+
+        self.timeout = timeout
+        self.wins = dict((name, 0) for name, _ in self.configs)
+        self.history = []
+
+    def check_smt2(self, smt2):
+        """
+        Solves the SMT-LIB2 benchmark smt2 (a string),
+        and returns a PortfolioResult
+        """
+        t0 = time.time()
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_worker,
+                                         args=(name, params, smt2, queue))
+                 for name, params in self.configs]
+        for p in procs:
+            p.daemon = True
+            p.start()
+
+        result, winner, values = 'unknown', None, None
+        times = dict()
+        exited = False
+        try:
+            while len(times) < len(procs):
+                wait = POLL_SECONDS
+                if self.timeout is not None:
+                    left = self.timeout - (time.time() - t0)
+                    if left <= 0:
+                        break
+                    wait = min(wait, left)
+                try:
+                    name, answer, vals, t = queue.get(timeout=wait)
+                except Empty:
+                    # give up once every worker has exited (one more poll
+                    # drains answers posted just before exiting), so that
+                    # a worker that dies without answering cannot block us
+                    if exited:
+                        break
+                    exited = not any(p.is_alive() for p in procs)
+                    continue
+
+                times[name] = t
+                if answer in ['sat', 'unsat']:
+                    result, winner, values = answer, name, vals
+                    break
+        finally:
+            # cancel the configurations that are still running
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+
+        res = PortfolioResult(result, winner, values, times, time.time() - t0)
+        if winner is not None:
+            self.wins[winner] += 1
+        self.history.append(res)
+        return res
+
+    def check_solver(self, solver, constraints=()):
+        """
+        Solves the assertions of a z3 solver, together with
+        the extra z3 constraints (the solver itself is not modified)
+        """
+        solver.push()
+        try:
+            solver.add(list(constraints))
+            smt2 = solver.to_smt2()
+        finally:
+            solver.pop()
+        return self.check_smt2(smt2)
+
+    def check_encoder(self, enc, constraints=()):
+        """
+        Solves the encoding of an amnet.smt.SmtEncoder,
+        together with the extra z3 constraints
+        """
+        return self.check_solver(enc.solver, constraints)
+
+    def report(self):
+        """ returns the win counts of the configurations as a printable table """
+        lines = ['%-24s %6s' % ('configuration', 'wins')]
+        for name, _ in self.configs:
+            lines.append('%-24s %6d' % (name, self.wins[name]))
+        return '\n'.join(lines)
@@ -1,3 +1,4 @@
+import numpy as np
 import amnet
 import z3
 from itertools import izip, chain
@@ -27,6 +28,10 @@ class NamingContext(object):
             return 'mu'
         elif isinstance(phi, amnet.Stack):
             return 'st'
+        elif isinstance(phi, amnet.Max):
+            return 'max'
+        elif isinstance(phi, amnet.Min):
+            return 'min'
         elif isinstance(phi, amnet.Amn):
             return 'amn'
         else:
@@ -36,7 +41,8 @@ class NamingContext(object):
         """
         Checks that the symbol table has a valid inverse
         by verifying that symbols is a bijection
-        (no two names map to the same node, and there are no null pointers)
+        (no two names map to the same node, and there are no null pointers),
+        and that the reverse index agrees with it
         """
 
         # ensure surjectivity
@@ -46,28 +52,74 @@ class NamingContext(object):
 
         # ensure injectivity
         ids = set(id(v) for v in self.symbols.values())
-        return len(ids) == len(self.symbols.values())
+        if len(ids) != len(self.symbols.values()):
+            return False
+
+        # ensure the reverse index is the inverse of symbols
+        if len(self.names) != len(self.symbols):
+            return False
+        return all(self.names.get(id(v)) == k for k, v in self.symbols.items())
 
     def only_one_input(self):
         """
         Checks that the symbol table has only one instance
         of an input variable
         """
-        vars_seen = 0
-        for v in self.symbols.values():
-            if isinstance(v, amnet.Variable):
-                vars_seen += 1
-
-        return vars_seen == 1
+        return len(self.inputs) == 1
 
     def __init__(self, phi=None):
         self.symbols = dict()
 
+        # reverse index: id(node) -> name
+        self.names = dict()
+
+        # names of the Variable nodes
+        self.inputs = set()
+
+        # prefix -> 1 + largest numeric suffix used with that prefix
+        self.counters = dict()
+
         # does not touch the tree, only recursively
         # assigns names to the tree rooted at phi
         if phi is not None:
             self.assign_names(phi)
 
+    @staticmethod
+    def _split_name(name):
+        """
+        Splits a name into (prefix, number) at its trailing digits,
+        or returns (name, None) if it does not end in a digit
+        """
+        i = len(name)
+        while i > 0 and name[i-1].isdigit():
+            i -= 1
+        if i == len(name):
+            return name, None
+        return name[:i], int(name[i:])
+
+    def _bind(self, name, phi):
+        """
+        Adds the symbol name -> phi, keeping the indices up to date
+        """
+        assert name not in self.symbols
+        self.symbols[name] = phi
+        self.names[id(phi)] = name
+        if isinstance(phi, amnet.Variable):
+            self.inputs.add(name)
+
+        prefix, num = NamingContext._split_name(name)
+        if num is not None:
+            self.counters[prefix] = max(self.counters.get(prefix, 0), num + 1)
+
+    def _unbind(self, name):
+        """
+        Removes the symbol name, and returns the node it referred to
+        """
+        phi = self.symbols.pop(name)
+        del self.names[id(phi)]
+        self.inputs.discard(name)
+        return phi
+
     def prefix_names(self, prefix):
         """
         Get all existing names for a given prefix
@@ -81,28 +133,22 @@ class NamingContext(object):
         """
         Generate a unique name for a given prefix 
         """
-        # if there are no existing variables return new varname
-        pnames = self.prefix_names(prefix)
-        if len(pnames) == 0:
-            retval = prefix + '0'
-            assert retval not in self.symbols, 'bad prefix'
-            return retval
-
-        # otherwise, return 1 + largest value in the names
-        #pnums = [int(name[len(prefix):]) for name in pnames]
-        #maxnum = max(pnums)
-        pnums = []
-        for name in pnames:
-            suffix = name[len(prefix):]
-            if suffix.isdigit():
-                pnums.append(int(suffix))
-        if len(pnums) == 0:
-            retval = prefix + '0'
-            assert retval not in self.symbols, 'bad prefix'
-            return retval
-        maxnum = max(pnums)
-
-        retval = prefix + str(1 + maxnum)
+        assert prefix, 'bad prefix'
+
+        if prefix[-1].isdigit():
+            # the counters are keyed on the prefix before the trailing
+            # digits, so fall back to scanning the existing names
+            pnums = [-1]
+            for name in self.prefix_names(prefix):
+                suffix = name[len(prefix):]
+                if suffix.isdigit():
+                    pnums.append(int(suffix))
+            num = 1 + max(pnums)
+        else:
+            # 1 + largest value in the names (0 if there are none)
+            num = self.counters.get(prefix, 0)
+
+        retval = prefix + str(num)
         assert retval not in self.symbols, 'bad prefix'
         return retval
 
@@ -111,23 +157,14 @@ class NamingContext(object):
         Returns the name of Amn phi, or None if it 
         does not exist in the naming context
         """
-        for k, v in self.symbols.items():
-            if v is phi:
-                return k
-
-        return None
+        return self.names.get(id(phi))
 
     def name_of_input(self):
         """
         Returns the name of the single Variable in this context
         """
         assert self.only_one_input()
-
-        for k, v in self.symbols.items():
-            if isinstance(v, amnet.Variable):
-                return k
-
-        return None
+        return next(iter(self.inputs))
 
     def assign_name(self, phi):
         """
@@ -142,30 +179,34 @@ class NamingContext(object):
             name = self.next_unique_name(prefix=NamingContext.default_prefix_for(phi))
 
             # assign the name
-            self.symbols[name] = phi
+            self._bind(name, phi)
 
         return visited
 
     def assign_names(self, phi):
         """
-        Recursively walks the tree for phi,
-        and assigns a name to each node
+        Walks the tree for phi in preorder (a node, then the
+        subtrees of x, y, and z), and assigns a name to each node.
+
+        The walk uses an explicit stack, so it is not limited by
+        the recursion depth of the interpreter.
         """
-        visited = self.assign_name(phi)
+        stack = [phi]
+        while stack:
+            node = stack.pop()
 
-        if visited:
-            #print 'Found a previously visited node (%s)' % self.name_of(phi),
-            return
+            visited = self.assign_name(node)
+            if visited:
+                continue
 
-        if hasattr(phi, 'x'):
-            self.assign_names(phi.x)
-        if hasattr(phi, 'y'):
-            assert isinstance(phi, amnet.Mu) or \
-                   isinstance(phi, amnet.Stack)
-            self.assign_names(phi.y)
-        if hasattr(phi, 'z'):
-            assert isinstance(phi, amnet.Mu)
-            self.assign_names(phi.z)
+            if hasattr(node, 'y'):
+                assert isinstance(node, amnet.Mu) or \
+                       isinstance(node, amnet.Stack)
+            if hasattr(node, 'z'):
+                assert isinstance(node, amnet.Mu)
+
+            # x is popped (and named) first
+            stack.extend(reversed(amnet.tree.children(node)))
 
     def signal_graph(self):
         """
@@ -191,25 +232,21 @@ class NamingContext(object):
         assert oldname is not None, 'nothing to rename'
         assert newname and newname[0].isalpha(), 'invalid new name'
 
-        # maintain invariant
-        assert self.is_valid()
+        if newname == oldname:
+            return
 
         # if newname already exists, rename that variable first
         if newname in self.symbols:
-            phi2 = self.symbols[newname]
+            phi2 = self._unbind(newname)
             name2 = self.next_unique_name(
                 prefix=NamingContext.default_prefix_for(phi2)
             )
             print 'Warning (rename): %s exists within context, moving existing symbol to %s' % \
                   (newname, name2)
-            self.symbols[name2] = phi2
+            self._bind(name2, phi2)
 
         # now simply reattach the object
-        self.symbols[newname] = self.symbols[oldname]
-        del self.symbols[oldname]
-
-        # maintain invariant
-        assert self.is_valid()
+        self._bind(newname, self._unbind(oldname))
 
     def merge_ctx(self, other_ctx):
         """
@@ -217,8 +254,6 @@ class NamingContext(object):
         same names if possible. 
         Renames the symbols from the other context when necessary.
         """
-        assert self.is_valid()
-
         # for asserts
         nodes_premerge = len(self.symbols)
         nodes_added = 0
@@ -229,32 +264,93 @@ class NamingContext(object):
                 # other node is not in current ctx,
                 # try to keep the same name
                 if other_name not in self.symbols:
-                    self.symbols[other_name] = other_phi
+                    self._bind(other_name, other_phi)
                 else:
                     other_name2 = self.next_unique_name(
                         prefix=NamingContext.default_prefix_for(other_phi)
                     )
-                    self.symbols[other_name2] = other_phi
+                    self._bind(other_name2, other_phi)
 
                 nodes_added += 1
             else:
                 # node already in current context, keep it
                 print 'Warning (merge): %s already in destination context as %s' % \
-                      (k, vname)
+                      (other_name, here_name)
 
         # keep invariant
         nodes_postmerge = len(self.symbols)
         assert nodes_postmerge == nodes_premerge + nodes_added
-        assert self.is_valid()
 
 
 class SmtEncoder(object):
-    def __init__(self, phi=None, ctx=None, solver=None):
+    """
+    SmtEncoder encodes the relationship between the nodes
+    of an AMN as z3 constraints on a z3 solver.
+
+    If a domain (lo, hi) for the input variable is provided, the input
+    is constrained to the box lo <= x <= hi, and bounds are computed
+    for every node using amnet.bounds.symbolic_bounds. Alternatively, precomputed node bounds
+    (a dictionary node -> (lo, hi), such as the output of
+    amnet.bounds.interval_bounds) can be provided directly, in which case
+    the caller is responsible for constraining the input accordingly.
+
+    With bounds available, every Mu component whose enable input has a
+    fixed sign is encoded as an equality to its selected branch, rather than as
+    a z3.If, Max and Min nodes only consider the inputs that can attain
+    the extremum, and disjunctions_removed counts the z3.If and z3.Or
+    terms avoided.
+
+    Each node type has an encoding strategy, given by the dictionary
+    strategies (class -> strategy), which overrides DEFAULT_STRATEGIES and
+    is looked up along the class hierarchy of each node:
+    'fresh'   the output of the node is a new z3 RealVector, linked to the
+              outputs of its children by equality constraints
+    'inline'  the output of the node is a list of z3 terms over the outputs
+              of its children, with no new variables or constraints
+              (e.g., a Stack is the concatenation of the terms of its children)
+    'auto'    (Affine only) inline if the rows of the node are cheap to
+              duplicate into its parents: if each row has at most one
+              nonzero, or if (largest number of nonzeros in a row) *
+              (number of parents) <= AUTO_INLINE_COST; fresh otherwise
+    Stack, Affine, and Mu nodes can be inlined. Variable, Max, and Min
+    nodes are always fresh, and Constants are always inlined as z3 RealVals.
+    By default every other node is fresh, so var_of returns z3 constants.
+    var_of works for every node, whatever its strategy, but for inlined
+    nodes it returns z3 terms, which should be read from a model with
+    model.eval (or values_of), rather than by constant name.
+    """
+    DEFAULT_STRATEGIES = {
+        amnet.Stack: 'fresh',
+        amnet.Affine: 'fresh',
+        amnet.Mu: 'fresh',
+    }
+    AUTO_INLINE_COST = 4
+
+    def __init__(self, phi=None, ctx=None, solver=None, domain=None, bounds=None,
+                 strategies=None):
         # initialize new SMT solver if needed
         if solver is None:
             solver = z3.Solver()
         self.solver = solver
 
+        # encoding strategy of each node type
+        self.strategies = dict(SmtEncoder.DEFAULT_STRATEGIES)
+        if strategies is not None:
+            self.strategies.update(strategies)
+        for cls, strategy in self.strategies.items():
+            assert strategy in ['fresh', 'inline', 'auto'], \
+                'unknown strategy %s' % strategy
+            assert strategy == 'fresh' or \
+                   issubclass(cls, (amnet.Affine, amnet.Mu, amnet.Stack)), \
+                'nodes of type %s can only be fresh' % cls.__name__
+            assert strategy != 'auto' or issubclass(cls, amnet.Affine), \
+                'nodes of type %s cannot be auto' % cls.__name__
+
+        # node bounds, used to eliminate stable Mu nodes
+        self.domain = domain
+        self.bounds = bounds
+        self.disjunctions_removed = 0
+
         # init from context
         if ctx is not None:
             self.encode_from_ctx(ctx)  # use existing context
@@ -269,11 +365,15 @@ class SmtEncoder(object):
         This is the preferred way to init, although a bit verbose
         """
         self.ctx = ctx
-        self.vars = dict()  # name -> RealVector
+        self.vars = dict()  # name -> RealVector (or list of z3 terms)
+        self._init_strategies()
         self._init_vars()   # initialize z3 vars
         assert self.ctx.is_valid()
         assert self.ctx.only_one_input()
 
+        if self.domain is not None:
+            self._init_domain()
+
         self._encode()      # do the encoding work
 
     def encode_from_amn(self, phi):
@@ -298,105 +398,267 @@ class SmtEncoder(object):
         name = self.ctx.name_of_input()
         return self.vars[name]
 
+    def values_of(self, model, phis, exact=False):
+        """
+        Returns the output of node phi in model as a numpy array
+        (see amnet.util.model_values), or, if phis is a list of nodes,
+        a list with the outputs of each node, extracted in one pass
+        """
+        if not isinstance(phis, (list, tuple)):
+            return self.values_of(model, [phis], exact=exact)[0]
+
+        zvars = [self.var_of(phi) for phi in phis]
+        flat = amnet.util.model_values(model, [v for vs in zvars for v in vs], exact=exact)
+
+        values = []
+        start = 0
+        for vs in zvars:
+            values.append(flat[start:start + len(vs)])
+            start += len(vs)
+        return values
+
+    def strategy_of(self, phi):
+        """
+        Returns the encoding strategy ('fresh' or 'inline') of node phi
+        """
+        if isinstance(phi, amnet.Constant):
+            return 'inline'
+
+        strategy = 'fresh'
+        for cls in type(phi).__mro__:
+            if cls in self.strategies:
+                strategy = self.strategies[cls]
+                break
+
+        if strategy == 'auto':
+            assert isinstance(phi, amnet.Affine)
+            nnz = np.max(np.sum(phi.w != 0, axis=1))
+            cost = nnz * self.fanout.get(id(phi), 0)
+            if nnz <= 1 or cost <= SmtEncoder.AUTO_INLINE_COST:
+                strategy = 'inline'
+            else:
+                strategy = 'fresh'
+
+        return strategy
+
+    def _init_strategies(self):
+        # number of parents of each node in the context
+        self.fanout = dict()
+        for phi in self.ctx.symbols.values():
+            for child in amnet.tree.children(phi):
+                self.fanout[id(child)] = self.fanout.get(id(child), 0) + 1
+
+        self.inlined = set(name for name, phi in self.ctx.symbols.items()
+                           if self.strategy_of(phi) == 'inline')
+
+    def _is_inlined(self, phi):
+        return self.ctx.name_of(phi) in self.inlined
+
     def _init_vars(self):
         assert self.ctx.is_valid()
         assert self.ctx.only_one_input()
 
         for name, phi in self.ctx.symbols.items():
+            if name in self.inlined:
+                continue  # terms are built in _encode
             self.vars[name] = z3.RealVector(
                 prefix=name,
                 sz=phi.outdim
             )
 
-    def _link_affine(self, phi, include_bterm=True):
-        assert isinstance(phi, amnet.Affine) or \
-               isinstance(phi, amnet.Linear)
+    def _init_domain(self):
+        """
+        Constrains the input to the box self.domain, and
+        computes bounds for every node if none were provided
+        """
+        lo, hi = self.domain
+        invar = self.var_of_input()
+        assert len(lo) == len(invar) and len(hi) == len(invar)
+
+        for xi, loi, hii in izip(invar, lo, hi):
+            self.solver.add(xi >= loi)
+            self.solver.add(xi <= hii)
+
+        if self.bounds is None:
+            # bound from every root of the context
+            # (shared nodes receive identical bounds)
+            children = set()
+            for phi in self.ctx.symbols.values():
+                children.update(id(c) for c in amnet.tree.children(phi))
+
+            self.bounds = dict()
+            for phi in self.ctx.symbols.values():
+                if id(phi) not in children:
+                    self.bounds.update(
+                        amnet.bounds.symbolic_bounds(phi, lo, hi)
+                    )
+
+    def _affine_terms(self, phi):
+        assert isinstance(phi, amnet.Affine)
 
         m, n = phi.w.shape
         assert m >= 1 and n >= 1
 
         # extract children
-        yvar = self.var_of(phi)
         xvar = self.var_of(phi.x)
-        assert (len(yvar) == m) and (len(xvar) == n)
+        assert len(xvar) == n
 
         # go row-by-row of w
+        terms = []
         for i in range(m):
             rowi = phi.w[i, :]
             assert len(rowi) == n
 
-            rowsum = z3.Sum([wij * xj
-                             for wij, xj in izip(rowi, xvar)
-                             if wij != 0])
+            row = [xj if wij == 1 else wij * xj
+                   for wij, xj in izip(rowi, xvar)
+                   if wij != 0]
 
-            if include_bterm:
-                assert isinstance(phi, amnet.Affine), \
-                    'Warning: tried to encode bterm in non-Affine'
-                self.solver.add(yvar[i] == (rowsum + phi.b[i]))
-            else:
-                self.solver.add(yvar[i] == rowsum)
+            if len(row) == 0:
+                terms.append(z3.RealVal(phi.b[i]))
+                continue
+
+            rowsum = row[0] if len(row) == 1 else z3.Sum(row)
+            if phi.b[i] != 0:
+                rowsum = rowsum + phi.b[i]
+            terms.append(rowsum)
 
-    def _link_mu(self, phi):
+        return terms
+
+    def _mu_terms(self, phi):
         assert isinstance(phi, amnet.Mu)
 
         # check dimensions
-        wvar = self.var_of(phi)
         xvar = self.var_of(phi.x)
         yvar = self.var_of(phi.y)
         zvar = self.var_of(phi.z)
         assert len(xvar) == len(yvar) and \
-               len(zvar) == 1
-        assert len(wvar) == len(xvar)
+               (len(zvar) == 1 or len(zvar) == len(xvar))
+
+        # a scalar enable input selects every component
+        n = len(xvar)
+        zi = range(n) if len(zvar) == n else [0] * n
+
+        # eliminate the disjunction of each component whose z-sign is known
+        signs = [0] * n
+        if self.bounds is not None and phi.z in self.bounds:
+            signs = amnet.bounds.selector_signs(phi, self.bounds)
 
         # go by-element of w
-        for i in range(len(wvar)):
-            self.solver.add(
-                wvar[i] == z3.If(zvar[0] <= 0, xvar[i], yvar[i])
-            )
+        terms = []
+        for i in range(n):
+            if signs[i] < 0:
+                terms.append(xvar[i])
+                self.disjunctions_removed += 1
+            elif signs[i] > 0:
+                terms.append(yvar[i])
+                self.disjunctions_removed += 1
+            else:
+                terms.append(z3.If(zvar[zi[i]] <= 0, xvar[i], yvar[i]))
 
-    def _link_stack(self, phi):
-        assert isinstance(phi, amnet.Stack)
+        return terms
 
-        # check dimensions
+    def _terms_of(self, phi):
+        """
+        Returns the output of phi as a list of z3 terms
+        over the outputs of its children
+        """
+        # the checking order should go *up* the class hierarchy
+        if isinstance(phi, amnet.Constant):
+            return [z3.RealVal(bi) for bi in phi.b]
+        elif isinstance(phi, amnet.Affine):
+            return self._affine_terms(phi)
+        elif isinstance(phi, amnet.Mu):
+            return self._mu_terms(phi)
+        elif isinstance(phi, amnet.Stack):
+            return list(self.var_of(phi.x)) + list(self.var_of(phi.y))
+        else:
+            assert False, 'Failure: cannot build terms for %s' % str(phi)
+
+    def _link_terms(self, phi):
+        """
+        Links the fresh output variables of phi to its terms
+        """
         wvar = self.var_of(phi)
-        xvar = self.var_of(phi.x)
-        yvar = self.var_of(phi.y)
-        assert len(wvar) == len(xvar) + len(yvar)
+        terms = self._terms_of(phi)
+        assert len(wvar) == len(terms)
 
-        # go by-element of w
-        for left, right in izip(wvar, chain(xvar, yvar)):
+        for left, right in izip(wvar, terms):
             self.solver.add(left == right)
 
-    def _link_constant(self, phi):
-        assert isinstance(phi, amnet.Constant)
+    def _inline(self, phi):
+        """
+        Sets the output of inlined node phi to its terms, inlining any
+        inlined nodes below phi first (with an explicit stack,
+        in topological order)
+        """
+        pending = [phi]
+        while pending:
+            node = pending[-1]
+            name = self.ctx.name_of(node)
+            if name in self.vars:
+                pending.pop()
+                continue
 
-        # *overwrite* the output variable of phi to be a z3 RealVal
-        assert self.ctx.is_valid()
-        name = self.ctx.name_of(phi)
+            missing = [c for c in amnet.tree.children(node)
+                       if self._is_inlined(c) and self.ctx.name_of(c) not in self.vars]
+            if missing:
+                pending.extend(missing)
+                continue
+
+            self.vars[name] = self._terms_of(node)
+            pending.pop()
 
-        assert len(phi.b) == len(self.vars[name])  # pre-overwrite
-        self.vars[name] = [z3.RealVal(bi) for bi in phi.b]
-        assert self.ctx.is_valid()  # post-overwrite
+    def _link_reduction(self, phi, is_max):
+        """
+        Encodes a Max (or Min) node w as one output variable with
+        w >= x_i (or w <= x_i) for every i, and w == x_i for some i
+        """
+        wvar = self.var_of(phi)
+        xvar = self.var_of(phi.x)
+        assert len(wvar) == 1 and len(xvar) >= 1
+        w = wvar[0]
+
+        for xi in xvar:
+            self.solver.add(w >= xi if is_max else w <= xi)
+
+        # with bounds, drop the inputs that can never attain the extremum
+        cands = amnet.bounds.reduction_candidates(phi, self.bounds)
+
+        if len(cands) == 1:
+            self.solver.add(w == xvar[cands[0]])
+            if len(xvar) > 1:
+                self.disjunctions_removed += 1
+        else:
+            self.solver.add(z3.Or([w == xvar[i] for i in cands]))
 
     def _encode(self):
         """
         encodes the relationship between the nodes
         by iterating through the context
         """
+        # inlined nodes (including all Constants) have no variables,
+        # so their terms must be built before any node refers to them
         for name, phi in self.ctx.symbols.items():
+            if name in self.inlined:
+                self._inline(phi)
+
+        for name, phi in self.ctx.symbols.items():
+            if name in self.inlined:
+                continue # already encoded
+
             # the checking order should go *up* the class hierarchy
             if isinstance(phi, amnet.Variable):
                 pass # nothing to do
-            elif isinstance(phi, amnet.Linear):
-                self._link_affine(phi, include_bterm=False)
-            elif isinstance(phi, amnet.Constant):
-                self._link_constant(phi)
             elif isinstance(phi, amnet.Affine):
-                self._link_affine(phi, include_bterm=True)
+                self._link_terms(phi)
             elif isinstance(phi, amnet.Mu):
-                self._link_mu(phi)
+                self._link_terms(phi)
             elif isinstance(phi, amnet.Stack):
-                self._link_stack(phi)
+                self._link_terms(phi)
+            elif isinstance(phi, amnet.Max):
+                self._link_reduction(phi, is_max=True)
+            elif isinstance(phi, amnet.Min):
+                self._link_reduction(phi, is_max=False)
             elif isinstance(phi, amnet.Amn):
                 assert False, 'Failure: do not know how to encode an Amn'
             else:
@@ -0,0 +1,206 @@
+import numpy as np
+import amnet
+from amnet.tree import postorder
+
+from fractions import Fraction
+from StringIO import StringIO
+
+"""
+Writes the encoding of an Amn as QF_LRA SMT-LIB2 text,
+directly from the numpy weights of its nodes (without building z3 terms)
+"""
+
+
+def _num(v):
+    """
+    Returns the SMT-LIB2 numeral of a float. The value is that of its
+    shortest decimal representation, as for z3.RealVal(float(v)).
+    """
+    r = Fraction(repr(float(v)))
+    p = abs(r.numerator)
+    q = r.denominator
+    s = '%d.0' % p if q == 1 else '(/ %d.0 %d.0)' % (p, q)
+    return '(- %s)' % s if r < 0 else s
+
+
+def _linear(coeffs, names, b=0):
+    """ returns the SMT-LIB2 term of coeffs * names + b """
+    terms = [x if c == 1 else '(* %s %s)' % (_num(c), x)
+             for c, x in zip(coeffs, names) if c != 0]
+    if b != 0 or len(terms) == 0:
+        terms.append(_num(b))
+    return terms[0] if len(terms) == 1 else '(+ %s)' % ' '.join(terms)
+
+
+def halfspaces_assertion(A, b, ynames):
+    """
+    Returns an SMT-LIB2 assertion that A * y > b in some row,
+    where y are the variables named ynames
+    """
+    A = np.atleast_2d(A)
+    assert A.shape == (len(b), len(ynames))
+    rows = ['(> %s %s)' % (_linear(ak, ynames), _num(bk)) for ak, bk in zip(A, b)]
+    return '(assert (or %s))\n' % ' '.join(rows)
+
+
+def var_names(ctx, phi):
+    """
+    Returns the SMT-LIB2 names of the output of phi, which are the
+    same as those of the z3 variables of amnet.smt.SmtEncoder
+    """
+    name = ctx.name_of(phi)
+    return ['%s__%d' % (name, i) for i in range(phi.outdim)]
+
+
+class _Writer(object):
+    def __init__(self, f, ctx, bounds, root):
+        self.f = f
+        self.ctx = ctx
+        self.bounds = bounds
+        self.root = root
+
+    def names(self, phi):
+        return var_names(self.ctx, phi)
+
+    def declare(self, phi):
+        for v in self.names(phi):
+            self.f.write('(declare-fun %s () Real)\n' % v)
+
+    def alias(self, phi, terms):
+        # the output of the root is declared, so that it appears in models
+        if phi is self.root:
+            self.declare(phi)
+            for v, t in zip(self.names(phi), terms):
+                self.assert_eq(v, t)
+            return
+
+        for v, t in zip(self.names(phi), terms):
+            self.f.write('(define-fun %s () Real %s)\n' % (v, t))
+
+    def assert_eq(self, v, t):
+        self.f.write('(assert (= %s %s))\n' % (v, t))
+
+    def affine(self, phi):
+        xs = self.names(phi.x)
+        for i, v in enumerate(self.names(phi)):
+            self.assert_eq(v, _linear(phi.w[i, :], xs, phi.b[i]))
+
+    def mu(self, phi):
+        xs, ys, zs = self.names(phi.x), self.names(phi.y), self.names(phi.z)
+        n = len(xs)
+        zi = range(n) if len(zs) == n else [0] * n
+
+        signs = [0] * n
+        if self.bounds is not None and phi.z in self.bounds:
+            signs = amnet.bounds.selector_signs(phi, self.bounds)
+
+        for i, v in enumerate(self.names(phi)):
+            if signs[i] < 0:
+                self.assert_eq(v, xs[i])
+            elif signs[i] > 0:
+                self.assert_eq(v, ys[i])
+            else:
+                self.assert_eq(v, '(ite (<= %s 0.0) %s %s)' % (zs[zi[i]], xs[i], ys[i]))
+
+    def reduction(self, phi, is_max):
+        w = self.names(phi)[0]
+        xs = self.names(phi.x)
+        for x in xs:
+            self.f.write('(assert (%s %s %s))\n' % ('>=' if is_max else '<=', w, x))
+
+        # with bounds, drop the inputs that can never attain the extremum
+        cands = amnet.bounds.reduction_candidates(phi, self.bounds)
+
+        if len(cands) == 1:
+            self.assert_eq(w, xs[cands[0]])
+        else:
+            self.f.write('(assert (or %s))\n' %
+                         ' '.join('(= %s %s)' % (w, xs[i]) for i in cands))
+
+    def node(self, phi):
+        # the checking order should go *up* the class hierarchy
+        if isinstance(phi, amnet.Variable):
+            self.declare(phi)
+        elif isinstance(phi, amnet.Constant):
+            self.alias(phi, [_num(bi) for bi in phi.b])
+        elif isinstance(phi, amnet.Affine):
+            self.declare(phi)
+            self.affine(phi)
+        elif isinstance(phi, amnet.Mu):
+            self.declare(phi)
+            self.mu(phi)
+        elif isinstance(phi, amnet.Stack):
+            self.alias(phi, self.names(phi.x) + self.names(phi.y))
+        elif isinstance(phi, amnet.Max):
+            self.declare(phi)
+            self.reduction(phi, is_max=True)
+        elif isinstance(phi, amnet.Min):
+            self.declare(phi)
+            self.reduction(phi, is_max=False)
+        else:
+            assert False, 'Failure: do not know how to write %s' % str(phi)
+
+
+def write_smt2(phi, f, domain=None, bounds=None, ctx=None, halfspaces=None,
+               assertions=None, check_sat=True, get_model=False):
+    """
+    Writes the encoding of phi as QF_LRA SMT-LIB2 to the file object f,
+    one node at a time (in topological order), and returns the
+    NamingContext used to name the nodes. The output of node psi is
+    named var_names(ctx, psi), as in amnet.smt.SmtEncoder.
+
+    Every node gets fresh variables, except Stack and Constant nodes
+    below the root, which are written as define-fun aliases of their
+    components (so they do not appear in models).
+    The options mirror those of SmtEncoder:
+    domain      (lo, hi) box of the input, from which bounds are
+                computed with amnet.bounds.symbolic_bounds
+    bounds      precomputed node bounds, used to drop stable Mu
+                disjunctions and the Max/Min inputs that cannot attain
+                the extremum
+    halfspaces  (A, b): asserts A * phi(x) > b in some row, so that
+                the benchmark is sat iff A * phi(x) <= b has a counterexample
+    assertions  a list of extra SMT-LIB2 terms to assert
+    check_sat, get_model  append (check-sat) and (get-model)
+    """
+    if ctx is None:
+        ctx = amnet.smt.NamingContext(phi)
+    assert ctx.is_valid() and ctx.only_one_input()
+
+    if domain is not None:
+        lo, hi = domain
+        if bounds is None:
+            bounds = amnet.bounds.symbolic_bounds(phi, lo, hi)
+
+    f.write('(set-logic QF_LRA)\n')
+
+    w = _Writer(f, ctx, bounds, phi)
+    for node in postorder(phi):
+        w.node(node)
+
+    if domain is not None:
+        for x, loi, hii in zip(w.names(ctx.symbols[ctx.name_of_input()]), lo, hi):
+            f.write('(assert (<= %s %s %s))\n' % (_num(loi), x, _num(hii)))
+
+    if halfspaces is not None:
+        A, b = halfspaces
+        f.write(halfspaces_assertion(A, b, w.names(phi)))
+
+    for a in (assertions or []):
+        f.write('(assert %s)\n' % a)
+
+    if check_sat:
+        f.write('(check-sat)\n')
+    if get_model:
+        f.write('(get-model)\n')
+
+    return ctx
+
+
+def to_smt2(phi, **kwargs):
+    """
+    Returns the SMT-LIB2 text written by write_smt2(phi, f, **kwargs)
+    """
+    f = StringIO()
+    write_smt2(phi, f, **kwargs)
+    return f.getvalue()
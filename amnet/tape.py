@@ -0,0 +1,210 @@
+import numpy as np
+import amnet
+from amnet.tree import children, postorder
+
+"""
+Compiles an Amn DAG into a flat, topologically ordered instruction
+tape that evaluates a whole batch of inputs in one pass
+"""
+
+
+def compile(phi):
+    """
+    Returns a Tape that evaluates phi on a batch of inputs
+
+    Example:
+        tape = amnet.tape.compile(phi)
+        Y = tape.eval(X)  # X is N-by-indim, Y is N-by-outdim
+    """
+    return Tape(phi)
+
+
+def _selector_indices(w):
+    """
+    If every row of w picks exactly one column with weight 1,
+    returns the picked column indices, otherwise returns None
+    """
+    nz = (w != 0)
+    if not np.all(np.sum(nz, axis=1) == 1):
+        return None
+
+    idx = np.argmax(nz, axis=1)
+    if not np.all(w[np.arange(w.shape[0]), idx] == 1):
+        return None
+
+    return idx
+
+
+class Tape(object):
+    """
+    A Tape is a list of instructions, one per (non-elided) node of phi,
+    ordered so that every instruction only reads the outputs of
+    earlier instructions. Each instruction writes a register that
+    holds an N-by-outdim array, and registers are released after
+    their last use.
+
+    Instructions:
+        ('var', out)                   out = X
+        ('const', out, b)              out = b (broadcast over the batch)
+        ('select', out, x, idx)        out = x[:, idx]
+        ('affine', out, x, wt, b)      out = x * w^T + b
+        ('mu', out, x, y, z)           out = where(z <= 0, x, y)
+        ('max', out, x)                out = max of the columns of x
+        ('min', out, x)                out = min of the columns of x
+        ('stack', out, parts, width)   out[:, start:stop] = part, for each part
+
+    Nested Stack nodes that are only used by their parent Stack are
+    elided, so the tree of Stacks built by atoms.from_list is
+    evaluated as a single concatenation into one preallocated buffer.
+    """
+    def __init__(self, phi):
+        self.indim = phi.indim
+        self.outdim = phi.outdim
+
+        order = postorder(phi)
+
+        # count parents of each node, and note which nodes feed a Stack
+        nparents = dict()
+        stacked = set()
+        for node in order:
+            for child in children(node):
+                nparents[id(child)] = nparents.get(id(child), 0) + 1
+                if isinstance(node, amnet.Stack):
+                    stacked.add(id(child))
+
+        def elided(node):
+            return isinstance(node, amnet.Stack) and \
+                   (node is not phi) and \
+                   (nparents[id(node)] == 1) and \
+                   (id(node) in stacked)
+
+        # assign a register to each non-elided node
+        reg = dict()
+        for node in order:
+            if not elided(node):
+                reg[id(node)] = len(reg)
+
+        self.instructions = []
+        for node in order:
+            if id(node) not in reg:
+                continue
+            self.instructions.append(self._instruction_for(node, reg))
+
+        self.nregs = len(reg)
+        self.out = reg[id(phi)]
+
+        # register -> index of the last instruction that reads it
+        last_use = dict()
+        for i, ins in enumerate(self.instructions):
+            for r in Tape._operands(ins):
+                last_use[r] = i
+        self.frees = [[] for _ in self.instructions]
+        for r, i in last_use.items():
+            if r != self.out:
+                self.frees[i].append(r)
+
+    @staticmethod
+    def _operands(ins):
+        op = ins[0]
+        if op in ['select', 'affine', 'max', 'min']:
+            return [ins[2]]
+        elif op == 'mu':
+            return [ins[2], ins[3], ins[4]]
+        elif op == 'stack':
+            return [part[0] for part in ins[2]]
+        else:
+            return []
+
+    def _stack_parts(self, node, reg):
+        """
+        Flattens the elided Stack nodes below node into a list of
+        (register, start, stop) column ranges
+        """
+        parts = []
+        start = 0
+        pending = [node.y, node.x]
+        while pending:
+            child = pending.pop()
+            if id(child) in reg:
+                parts.append((reg[id(child)], start, start + child.outdim))
+                start += child.outdim
+            else:
+                assert isinstance(child, amnet.Stack)
+                pending.append(child.y)
+                pending.append(child.x)
+
+        assert start == node.outdim
+        return parts
+
+    def _instruction_for(self, node, reg):
+        out = reg[id(node)]
+
+        # the checking order should go *up* the class hierarchy
+        if isinstance(node, amnet.Variable):
+            return ('var', out)
+        elif isinstance(node, amnet.Constant):
+            return ('const', out, node.b.reshape((1, node.outdim)))
+        elif isinstance(node, amnet.Affine):
+            x = reg[id(node.x)]
+            if not np.any(node.b):
+                idx = _selector_indices(node.w)
+                if idx is not None:
+                    return ('select', out, x, idx)
+            return ('affine', out, x, np.transpose(node.w), node.b)
+        elif isinstance(node, amnet.Mu):
+            return ('mu', out, reg[id(node.x)], reg[id(node.y)], reg[id(node.z)])
+        elif isinstance(node, amnet.Max):
+            return ('max', out, reg[id(node.x)])
+        elif isinstance(node, amnet.Min):
+            return ('min', out, reg[id(node.x)])
+        elif isinstance(node, amnet.Stack):
+            return ('stack', out, self._stack_parts(node, reg), node.outdim)
+        else:
+            assert False, 'Failure: do not know how to compile %s' % str(node)
+
+    def eval(self, inp):
+        """
+        Evaluates the tape on an N-by-indim batch of inputs,
+        and returns an N-by-outdim array whose ith row equals phi.eval(inp[i]).
+
+        A single input vector returns a single output vector.
+        """
+        X = np.asarray(inp, dtype=float)
+        single = (X.ndim == 1)
+        if single:
+            X = X.reshape((1, len(X)))
+        assert X.ndim == 2 and X.shape[1] == self.indim
+        N = X.shape[0]
+
+        vals = [None] * self.nregs
+        for ins, frees in zip(self.instructions, self.frees):
+            op, out = ins[0], ins[1]
+
+            if op == 'var':
+                vals[out] = X
+            elif op == 'const':
+                vals[out] = ins[2]
+            elif op == 'select':
+                vals[out] = vals[ins[2]][:, ins[3]]
+            elif op == 'affine':
+                vals[out] = np.dot(vals[ins[2]], ins[3]) + ins[4]
+            elif op == 'mu':
+                vals[out] = np.where(vals[ins[4]] <= 0, vals[ins[2]], vals[ins[3]])
+            elif op == 'max':
+                vals[out] = np.max(vals[ins[2]], axis=1, keepdims=True)
+            elif op == 'min':
+                vals[out] = np.min(vals[ins[2]], axis=1, keepdims=True)
+            elif op == 'stack':
+                buf = np.empty((N, ins[3]))
+                for r, start, stop in ins[2]:
+                    buf[:, start:stop] = vals[r]
+                vals[out] = buf
+            else:
+                assert False
+
+            for r in frees:
+                vals[r] = None
+
+        # constant-only subgraphs have a single broadcast row
+        Y = np.array(np.broadcast_to(vals[self.out], (N, self.outdim)))
+        return Y[0] if single else Y
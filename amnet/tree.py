@@ -1,8 +1,8 @@
 import numpy as np
-from scipy.linalg import norm
 import amnet
 
 import copy
+import hashlib
 
 """
 Contains routines for manipulating and simplifying Amn trees
@@ -10,20 +10,68 @@ Contains routines for manipulating and simplifying Amn trees
 
 FPTOL=1e-8
 
-def simplify(phi):
+def children(phi):
     """
-    Returns a new Amn that is equivalent to phi from the
-    perspective of phi.eval(..), but potentially has
-    * fewer nodes (e.g., fewer Mu's)
-    * affine simplifications
+    Returns the immediate children of phi as a list,
+    in (x, y, z) order
+    """
+    return [getattr(phi, c) for c in ('x', 'y', 'z') if hasattr(phi, c)]
+
+
+def postorder(phi):
+    """
+    Returns the unique nodes of the DAG rooted at phi as a list,
+    ordered so that every node appears after all of its children
+    (i.e., a topological order ending in phi).
+    Shared nodes appear exactly once.
+
+    The walk uses an explicit stack, so it is not limited by
+    the recursion depth of the interpreter.
+    """
+    order = []
+    visited = set()
+    stack = [(phi, False)]
 
-    The affine simplifications are greedy, and may not be performed
-    if the result is a higher-dimensional
+    while stack:
+        node, expanded = stack.pop()
+
+        if expanded:
+            # all children of node have already been emitted
+            order.append(node)
+            continue
+
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+
+        # revisit node after its children (x is popped first)
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            if id(child) not in visited:
+                stack.append((child, False))
+
+    return order
+
+
+def fingerprint(phi):
     """
+    Returns a structural hash (a hex string) of the DAG rooted at phi,
+    computed from the type, dimensions, and weights of every node,
+    and from the way nodes are shared. Node names are ignored, so
+    two Amns with equal fingerprints evaluate identically.
+    """
+    h = hashlib.sha1()
+    index = dict()  # id(node) -> position in postorder
+    for k, node in enumerate(postorder(phi)):
+        index[id(node)] = k
+        h.update(type(node).__name__.encode())
+        h.update(str((node.indim, node.outdim)).encode())
+        h.update(str([index[id(c)] for c in children(node)]).encode())
+        if isinstance(node, amnet.Affine):
+            h.update(np.ascontiguousarray(node.w, dtype=float).tobytes())
+            h.update(np.ascontiguousarray(node.b, dtype=float).tobytes())
+    return h.hexdigest()
 
-    # 1. only manipulate the copy
-    phic = copy.deepcopy(phi)
-    return phic
 
 def eval_ones(phi):
     """
@@ -32,55 +80,292 @@ def eval_ones(phi):
     """
     return phi.eval(np.ones(phi.indim))
 
-def _simp_aff_aff(aff, force=False):
+
+################################################################################
+# simplification
+################################################################################
+
+def _is_identity(w):
+    m, n = w.shape
+    return (m == n) and np.array_equal(w, np.eye(n))
+
+
+class _Simplifier(object):
+    """
+    Rebuilds an Amn bottom-up, applying local rewrites to every node.
+    Each node of the original DAG is rewritten once, so shared
+    subgraphs remain shared.
+    """
+    def __init__(self, phi):
+        self.order = postorder(phi)
+        self.var = [node for node in self.order
+                    if isinstance(node, amnet.Variable)][0]
+
+        # number of parents of each original node
+        self.nparents = dict()
+        for node in self.order:
+            for child in children(node):
+                self.nparents[id(child)] = self.nparents.get(id(child), 0) + 1
+
+        # number of parents of each rewritten node
+        self.fanout = dict()
+
+    def run(self):
+        new = dict()  # id(original node) -> rewritten node
+
+        for node in self.order:
+            kids = [new[id(c)] for c in children(node)]
+            simp = self.rewrite(node, kids)
+
+            new[id(node)] = simp
+            self.fanout[id(simp)] = self.fanout.get(id(simp), 0) + \
+                                    self.nparents.get(id(node), 0)
+
+        return new[id(self.order[-1])]
+
+    def rewrite(self, node, kids):
+        # the checking order should go *up* the class hierarchy
+        if isinstance(node, amnet.Variable):
+            return node
+        elif isinstance(node, amnet.Constant):
+            return self.constant(node.b)
+        elif isinstance(node, amnet.Affine):
+            return self.affine(node.w, kids[0], node.b)
+        elif isinstance(node, amnet.Mu):
+            return self.mu(*kids)
+        elif isinstance(node, amnet.Stack):
+            return self.stack(*kids)
+        elif isinstance(node, amnet.Max):
+            return self.reduction(amnet.Max, kids[0])
+        elif isinstance(node, amnet.Min):
+            return self.reduction(amnet.Min, kids[0])
+        else:
+            assert False, 'Failure: do not know how to simplify %s' % str(node)
+
+    def constant(self, b):
+        # constants hang directly off the input variable
+        return amnet.Constant(self.var, b)
+
+    def affine(self, w, x, b):
+        """ returns a simplified node that evaluates to w * x + b """
+        while True:
+            if not np.any(w):
+                return self.constant(b)
+
+            if isinstance(x, amnet.Constant):
+                return self.constant(np.dot(w, x.b) + b)
+
+            if isinstance(x, amnet.Affine):
+                # fuse Affine(Affine), unless x is shared and
+                # the fused weights would be wider than w
+                if self.fanout.get(id(x), 1) <= 1 or x.w.shape[1] <= w.shape[1]:
+                    w, x, b = np.dot(w, x.w), x.x, np.dot(w, x.b) + b
+                    continue
+
+            if isinstance(x, amnet.Stack):
+                # push the affine map into the only side of x that it reads
+                m = x.x.outdim
+                if not np.any(w[:, m:]):
+                    w, x = w[:, :m], x.x
+                    continue
+                if not np.any(w[:, :m]):
+                    w, x = w[:, m:], x.y
+                    continue
+
+            break
+
+        if _is_identity(w) and not np.any(b):
+            return x
+        elif not np.any(b):
+            return amnet.Linear(w, x)
+        else:
+            return amnet.Affine(w, x, b)
+
+    def mu(self, x, y, z):
+        """ returns a simplified node that evaluates to Mu(x, y, z) """
+        if x is y:
+            return x
+
+        # a constant selector always chooses the same branch
+        if isinstance(z, amnet.Constant):
+            if np.all(z.b <= 0):
+                return x
+            elif np.all(z.b > 0):
+                return y
+
+            # elementwise selector of mixed sign: pick the rows of (x, y)
+            sx = np.diag((z.b <= 0).astype(float))
+            sy = np.diag((z.b > 0).astype(float))
+            return self.affine(np.concatenate((sx, sy), axis=1),
+                               self.stack(x, y),
+                               np.zeros(x.outdim))
+
+        return amnet.Mu(x, y, z)
+
+    def reduction(self, cls, x):
+        """ returns a simplified node that evaluates to cls(x) """
+        if x.outdim == 1:
+            return x
+
+        if isinstance(x, amnet.Constant):
+            return self.constant(cls(x).eval(np.zeros(x.indim)))
+
+        return cls(x)
+
+    def _as_affine(self, phi):
+        """
+        Returns (w, x, b) with phi = w * x + b, where
+        x is None if phi is a Constant, and x is phi itself
+        if phi is not an Affine
+        """
+        if isinstance(phi, amnet.Constant):
+            return None, None, phi.b
+        elif isinstance(phi, amnet.Affine):
+            return phi.w, phi.x, phi.b
+        else:
+            return np.eye(phi.outdim), phi, np.zeros(phi.outdim)
+
+    def stack(self, x, y):
+        """ returns a simplified node that evaluates to Stack(x, y) """
+        ax = self._as_affine(x)
+        ay = self._as_affine(y)
+
+        # stacking two affine functions of the same node (or constants)
+        # gives a single affine function of that node
+        if (ax[1] is ay[1]) or (ax[1] is None) or (ay[1] is None):
+            child = ax[1] if ax[1] is not None else ay[1]
+            b = np.concatenate((ax[2], ay[2]), axis=0)
+            if child is None:
+                return self.constant(b)
+
+            wx = ax[0] if ax[0] is not None else np.zeros((x.outdim, child.outdim))
+            wy = ay[0] if ay[0] is not None else np.zeros((y.outdim, child.outdim))
+            return self.affine(np.concatenate((wx, wy), axis=0), child, b)
+
+        return amnet.Stack(x, y)
+
+
+def simplify(phi):
+    """
+    Returns a new Amn that is equivalent to phi from the
+    perspective of phi.eval(..), but potentially has fewer nodes.
+
+    The rewrites are applied bottom-up:
+    * Affine(Affine(x)) is fused into a single Affine of x, unless
+      the inner Affine is shared and fusing would widen the weights
+    * an Affine that only reads one side of a Stack skips the Stack,
+      and Stacks of affine functions of the same node become one Affine
+    * identity Linear nodes (e.g., from atoms.identity) are removed
+    * constants are folded, Mu nodes with a Constant selector
+      are replaced by the selected branch (or by a selection of the
+      rows of both branches, if the selector is elementwise),
+      and Max/Min nodes over a single value are removed
+
+    The input Variable of phi is reused, and phi itself is not modified.
+    Nodes shared in phi remain shared in the result.
+    """
+    return _Simplifier(phi).run()
+
+
+################################################################################
+# hash-consing
+################################################################################
+
+class Interner(object):
     """
-    TODO: this does not work if the child of aff
-    is the child of someone else
+    An Interner hash-conses Amn nodes: it keeps a table of canonical
+    nodes keyed by a hash of their content (node type, children, and
+    weights), and returns the existing canonical node whenever a
+    structurally identical node is interned again.
+
+    Children are compared by identity, so they must already be canonical
+    (interning bottom-up, as make and intern_all do, guarantees this).
+    Variables are never merged with each other.
+
+    Example:
+        itn = amnet.tree.Interner()
+        x = amnet.Variable(3, name='x')
+        x0 = itn.make(amnet.Linear, np.eye(1, 3, 0), x)
+        assert itn.make(amnet.Linear, np.eye(1, 3, 0), x) is x0
     """
-    assert isinstance(aff, amnet.Affine)
+    def __init__(self):
+        self.table = dict()  # content hash -> list of canonical nodes
 
-    # whether an operation was performed
-    simp = False
+    @staticmethod
+    def _content_hash(phi):
+        h = hashlib.sha1()
+        h.update(type(phi).__name__.encode())
+        h.update(str([id(c) for c in children(phi)]).encode())
+        if isinstance(phi, amnet.Affine):
+            h.update(str(phi.w.shape).encode())
+            h.update(np.ascontiguousarray(phi.w, dtype=float).tobytes())
+            h.update(np.ascontiguousarray(phi.b, dtype=float).tobytes())
+        return h.hexdigest()
 
-    # ensure we can do a simplification
-    if not(isinstance(aff.x, amnet.Affine)):
-        return simp
-    assert isinstance(aff.x, amnet.Affine)
+    @staticmethod
+    def _same_content(phi1, phi2):
+        if type(phi1) is not type(phi2):
+            return False
+        if any(c1 is not c2 for c1, c2 in zip(children(phi1), children(phi2))):
+            return False
+        if isinstance(phi1, amnet.Affine):
+            return np.array_equal(phi1.w, phi2.w) and np.array_equal(phi1.b, phi2.b)
+        return True
 
-    # simplify if dimensions are reduced, or if forced to
-    m1, n1 = aff.w.shape
-    m2, n2 = aff.x.w.shape
-    assert n1 == m2
+    def intern(self, phi):
+        """
+        Returns the canonical node with the same content as phi,
+        registering phi as canonical if there is none
+        """
+        if isinstance(phi, amnet.Variable):
+            return phi
 
-    if force:
-        simp = True
-    elif m1*n2 <= ((m1 + n1) + (m2 + n2)):
-        simp = True
+        key = Interner._content_hash(phi)
+        bucket = self.table.setdefault(key, [])
+        for other in bucket:
+            if Interner._same_content(phi, other):
+                return other
 
-    # before manipulation
-    val_a = eval_ones(aff)
+        bucket.append(phi)
+        return phi
 
-    if simp:
-        w1 = aff.w
-        b1 = aff.b
-        w2 = aff.x.w
-        b2 = aff.x.b2
+    def make(self, cls, *args, **kwargs):
+        """
+        Constructs cls(*args, **kwargs), and returns
+        the canonical node with the same content
+        """
+        return self.intern(cls(*args, **kwargs))
 
-        # compute new affine
-        w3 = np.dot(w1, w2)
-        b3 = np.dot(w1, b2) + b1
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.table.values())
 
-        # save grandchild
-        assert isinstance(aff.x, amnet.Affine)
-        x2 = aff.x.x
+    def intern_all(self, phi):
+        """
+        Interns every node of the DAG rooted at phi, bottom-up,
+        and returns the canonical node for phi. Nodes of phi are reused
+        as canonical nodes where possible (and are never modified);
+        nodes whose children were merged are shallow-copied.
+        """
+        canon = dict()  # id(node) -> canonical node
+        for node in postorder(phi):
+            kids = children(node)
+            ckids = [canon[id(c)] for c in kids]
 
-        # rewrite node
-        aff.w = w3
-        aff.b = b3
-        aff.x = x2
+            cand = node
+            if any(c is not ck for c, ck in zip(kids, ckids)):
+                cand = copy.copy(node)
+                for attr, ck in zip(('x', 'y', 'z'), ckids):
+                    setattr(cand, attr, ck)
 
-    # after manipulation
-    val_b = eval_ones(aff)
-    assert norm(val_a - val_b) <= FPTOL
+            canon[id(node)] = self.intern(cand)
 
-    return simp
+        return canon[id(phi)]
+
+
+def hashcons(phi):
+    """
+    Returns an equivalent Amn in which structurally identical nodes of phi
+    (e.g., repeated atoms.select calls on the same parent)
+    are merged into a single shared node
+    """
+    return Interner().intern_all(phi)
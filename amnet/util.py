@@ -1,4 +1,5 @@
 from __future__ import division
+import numpy as np
 import z3
 from fractions import Fraction
 
@@ -24,6 +25,54 @@ def mfp(model, var):
     return r2f(model.eval(var, model_completion=True))
 
 
+def _numeral(ref, v, exact):
+    """ returns the z3 numeral v as a float, or as a Fraction if exact """
+    try:
+        if exact:
+            return Fraction(z3.Z3_get_numeral_string(ref, v.as_ast()))
+        return z3.Z3_get_numeral_double(ref, v.as_ast())
+    except z3.Z3Exception:
+        # irrational (algebraic) values are approximated within 1e-20
+        assert z3.is_algebraic_value(v), 'not a numeral: %s' % v
+        return _numeral(ref, v.approx(20), exact)
+
+
+def model_values(model, zvars, exact=False):
+    """
+    Returns the values in model of the z3 terms zvars, which is a list
+    (e.g., a z3.RealVector or SmtEncoder.var_of(phi)) or a list of
+    equal-length lists, as a numpy array of the same shape.
+    Constants that are not in model are 0, as in mfp.
+
+    The values are rounded to the nearest float (unlike mfp, which
+    rounds to a nearby fraction with a small denominator first), or,
+    if exact, returned as Fractions in an array of dtype object.
+
+    Example:
+        Avar = [z3.RealVector('A%d' % i, n) for i in range(m)]
+        ...
+        A = model_values(solver.model(), Avar)  # an m x n array
+    """
+    nested = len(zvars) > 0 and isinstance(zvars[0], (list, tuple))
+    if nested:
+        ncols = len(zvars[0])
+        assert all(len(row) == ncols for row in zvars)
+        flat = [v for row in zvars for v in row]
+    else:
+        flat = list(zvars)
+
+    ref = model.ctx.ref()
+    values = [_numeral(ref, model.eval(v, model_completion=True), exact) for v in flat]
+
+    if exact:
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+    else:
+        arr = np.array(values, dtype=float)
+
+    return arr.reshape((len(zvars), ncols)) if nested else arr
+
+
 def foldl(f, z, xs):
     """
     Left fold (not lazy), similar to to Haskell's
@@ -33,8 +82,13 @@ def foldl(f, z, xs):
     Example:
         if arr == [1,2,3], then 
         foldl(add2, arr[0], arr[1:]) == add2(add2(1, 2), 3)
+
+    Runs in a loop, so long lists do not hit the recursion limit.
     """
-    return z if len(xs) == 0 else foldl(f, f(z, xs[0]), xs[1:])
+    acc = z
+    for x in xs:
+        acc = f(acc, x)
+    return acc
 
 
 def foldr(f, z, xs):
@@ -46,8 +100,36 @@ def foldr(f, z, xs):
     Example:
         if arr == [1,2,3], then 
         foldr(add2, arr[-1], arr[:-1]) == add2(1, add2(2, 3))
+
+    Runs in a loop, so long lists do not hit the recursion limit.
+    """
+    acc = z
+    for x in reversed(xs):
+        acc = f(x, acc)
+    return acc
+
+
+def foldt(f, xs):
     """
-    return z if len(xs) == 0 else f(xs[0], foldr(f, z, xs[1:]))
+    Tree fold: reduces the nonempty list xs by applying f to adjacent
+    pairs, level by level, so the result has depth ceil(log2(len(xs)))
+    rather than the linear depth of foldl/foldr.
+    The order of xs is preserved, so for associative f the result
+    equals that of foldl(f, xs[0], xs[1:]).
+
+    Example:
+        if arr == [1,2,3,4,5], then
+        foldt(add2, arr) == add2(add2(add2(1, 2), add2(3, 4)), 5)
+    """
+    assert len(xs) >= 1
+    level = list(xs)
+    while len(level) > 1:
+        pairs = [f(level[i], level[i+1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            pairs.append(level[-1])
+        level = pairs
+
+    return level[0]
 
 
 def allsame(xs):
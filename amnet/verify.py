@@ -0,0 +1,416 @@
+import numpy as np
+import amnet
+from amnet.util import foldt, model_values
+
+import z3
+import time
+
+"""
+Verification sessions: an Amn is encoded once on a z3 solver,
+and many property queries are answered against the same encoding
+"""
+
+
+def _max2_z3(x, y):
+    return z3.If(x <= y, y, x)
+
+
+def _rows_z3(A, xs):
+    """ returns the rows of A * xs as a list of z3 terms """
+    A = np.atleast_2d(A)
+    assert A.shape[1] == len(xs)
+    rows = []
+    for row in A:
+        terms = [aij * xj for aij, xj in zip(row, xs) if aij != 0]
+        rows.append(z3.Sum(terms) if len(terms) > 0 else z3.RealVal(0))
+    return rows
+
+
+def _max_affine_z3(A, b, xs):
+    """ returns max(A * xs + b) as a z3 term """
+    assert len(A) == len(b) and len(b) >= 1
+    return foldt(_max2_z3, [ri + bi for ri, bi in zip(_rows_z3(A, xs), b)])
+
+
+def _normL1_z3(xs):
+    return z3.Sum([_max2_z3(x, -x) for x in xs])
+
+
+class Session(object):
+    """
+    A Session encodes phi once (with amnet.smt.SmtEncoder, whose
+    arguments it accepts) and answers many queries on the same solver.
+    Every query adds its constraints between a solver.push() and a
+    solver.pop(), so the encoding, and anything z3 learns about it,
+    is reused by later queries.
+
+    Queries that check a property return None if it holds, and
+    otherwise a counterexample input as a numpy array.
+
+    The wall-clock time of the encoding and of every query is recorded
+    in timings, a list of (query name, result, seconds) tuples, where
+    result is 'sat' or 'unsat' (None for the encoding).
+
+    Example:
+        sess = amnet.verify.Session(phi, domain=(lo, hi))
+        xc = sess.check_output_bounds(ylo, yhi)
+        xc = sess.check_implication(A_in, b_in, A_out, b_out)
+        print sess.report()
+    """
+    def __init__(self, phi, domain=None, bounds=None, strategies=None, solver=None):
+        t0 = time.time()
+        self.phi = phi
+        self.enc = amnet.smt.SmtEncoder(phi, solver=solver, domain=domain,
+                                        bounds=bounds, strategies=strategies)
+        self.solver = self.enc.solver
+
+        # z3 terms of the input and output of phi
+        self.x = self.enc.var_of_input()
+        self.y = self.enc.var_of(phi)
+
+        self.timings = [('encode', None, time.time() - t0)]
+
+    def find(self, constraints, name='find'):
+        """
+        Looks for an input satisfying the z3 constraints (over the
+        terms self.x and self.y) in addition to the encoding of phi.
+
+        Returns (x, y) as numpy arrays, or None if there is no such input.
+        """
+        t0 = time.time()
+        self.solver.push()
+        try:
+            self.solver.add(constraints)
+            result = self.solver.check()
+            assert result in [z3.sat, z3.unsat], \
+                'query %s returned %s' % (name, result)
+
+            found = None
+            if result == z3.sat:
+                model = self.solver.model()
+                found = (model_values(model, self.x), model_values(model, self.y))
+        finally:
+            self.solver.pop()
+
+        self.timings.append((name, str(result), time.time() - t0))
+        return found
+
+    def _counterexample(self, constraints, name):
+        found = self.find(constraints, name=name)
+        return None if found is None else found[0]
+
+    def check_output_bounds(self, lo, hi):
+        """
+        Checks lo <= phi(x) <= hi for every x (in the domain).
+        Infinite entries of lo and hi are not checked.
+        """
+        assert len(lo) == len(self.y) and len(hi) == len(self.y)
+
+        violations = [yi < loi for yi, loi in zip(self.y, lo) if np.isfinite(loi)] + \
+                     [yi > hii for yi, hii in zip(self.y, hi) if np.isfinite(hii)]
+        if len(violations) == 0:
+            return None
+
+        return self._counterexample([z3.Or(violations)], 'output_bounds')
+
+    def check_output_halfspaces(self, A, b):
+        """
+        Checks A * phi(x) <= b for every x (in the domain)
+        """
+        A = np.atleast_2d(A)
+        assert len(A) == len(b)
+
+        violations = [ri > bi for ri, bi in zip(_rows_z3(A, self.y), b)]
+        return self._counterexample([z3.Or(violations)], 'output_halfspaces')
+
+    def check_implication(self, A_in, b_in, A_out, b_out):
+        """
+        Checks that A_in * x <= b_in implies A_out * phi(x) <= b_out
+        for every x (in the domain)
+        """
+        A_in = np.atleast_2d(A_in)
+        A_out = np.atleast_2d(A_out)
+        assert len(A_in) == len(b_in) and len(A_out) == len(b_out)
+
+        premise = [ri <= bi for ri, bi in zip(_rows_z3(A_in, self.x), b_in)]
+        violations = [ri > bi for ri, bi in zip(_rows_z3(A_out, self.y), b_out)]
+
+        return self._counterexample(premise + [z3.Or(violations)], 'implication')
+
+    def check_lyapunov_positive(self, A, b, radius=1):
+        """
+        Checks V(x) = max(A * x + b) > 0 for every x with
+        ||x||_1 == radius (in the domain).
+        """
+        assert len(self.x) == A.shape[1]
+
+        constraints = [_normL1_z3(self.x) == radius,
+                       z3.Not(_max_affine_z3(A, b, self.x) > 0)]
+        return self._counterexample(constraints, 'lyapunov_positive')
+
+    def check_lyapunov_decrease(self, A, b, rate=0.99, radius=1):
+        """
+        Checks V(phi(x)) <= rate * V(x), where V(x) = max(A * x + b),
+        for every x with ||x||_1 <= radius (in the domain).
+        phi must map its input space to itself.
+        """
+        assert len(self.x) == len(self.y) == A.shape[1]
+
+        v0 = _max_affine_z3(A, b, self.x)
+        v1 = _max_affine_z3(A, b, self.y)
+        constraints = [_normL1_z3(self.x) <= radius,
+                       z3.Not(v1 <= rate * v0)]
+        return self._counterexample(constraints, 'lyapunov_decrease')
+
+    def total_time(self):
+        """ returns the total time spent encoding and answering queries """
+        return sum(t for _, _, t in self.timings)
+
+    def report(self):
+        """ returns the timings as a printable table """
+        lines = ['%-20s %-8s %10s' % ('query', 'result', 'seconds')]
+        for name, result, t in self.timings:
+            lines.append('%-20s %-8s %10.4f' % (name, result or '-', t))
+        lines.append('%-20s %-8s %10.4f' % ('total', '', self.total_time()))
+        return '\n'.join(lines)
+
+
+################################################################################
+# robustness certification
+################################################################################
+
+# input dimension up to which all corners of the box are sampled
+MAX_CORNER_DIM = 10
+
+
+class RobustnessResult(object):
+    """
+    Outcome of verify_robust:
+    robust          True if no input in the ball changes the label
+    counterexample  an input in the ball with a different label (or None)
+    tier            'sampling', 'bounds', or 'smt': the tier that decided
+    times           list of (tier, seconds) of the tiers that ran, in order
+    """
+    def __init__(self, robust, counterexample, tier, times):
+        self.robust = robust
+        self.counterexample = counterexample
+        self.tier = tier
+        self.times = times
+
+    def __str__(self):
+        return '%s (decided by %s, %s)' % \
+               ('robust' if self.robust else 'not robust', self.tier,
+                ', '.join('%s %.4fs' % tt for tt in self.times))
+
+
+def _box_samples(lo, hi, nsamples):
+    """ returns uniform samples and corners of the box lo <= x <= hi, one per row """
+    n = len(lo)
+    X = lo + (hi - lo) * np.random.rand(nsamples, n)
+    if n <= MAX_CORNER_DIM:
+        signs = (np.arange(2 ** n)[:, None] >> np.arange(n)) & 1
+    else:
+        signs = np.random.randint(2, size=(nsamples, n))
+    corners = np.where(signs, hi, lo)
+    return np.concatenate((X, corners), axis=0)
+
+
+def verify_robust(phi, x0, eps, label, clip=None, nsamples=1000):
+    """
+    Checks that phi (e.g., a classifier built by tf_utils.relu_amn) keeps
+    the output label as its arg-max on the L-infinity ball of radius eps
+    around x0, i.e., that phi_j(x) <= phi_label(x) for every j and every
+    x in the ball (intersected with the box clip = (lo, hi), if given).
+
+    Cheaper tiers run first, and the first one that decides stops:
+    'sampling'  nsamples random inputs and the corners of the ball,
+                evaluated as one batch with amnet.tape (finds
+                counterexamples only)
+    'bounds'    bounds.halfspace_bounds on phi_j - phi_label
+                (proves robustness only)
+    'smt'       a Session on the ball, whose encoding drops the Mu
+                nodes that the bounds show to be stable
+
+    Returns a RobustnessResult.
+    """
+    x0 = np.asarray(x0, dtype=float).flatten()
+    assert len(x0) == phi.indim and eps >= 0
+    assert 0 <= label < phi.outdim
+
+    lo, hi = x0 - eps, x0 + eps
+    if clip is not None:
+        lo, hi = np.maximum(lo, clip[0]), np.minimum(hi, clip[1])
+
+    # rows of phi_j - phi_label, for j != label
+    others = [j for j in range(phi.outdim) if j != label]
+    A = np.eye(phi.outdim)[others]
+    A[:, label] = -1
+    b = np.zeros(len(others))
+
+    times = []
+
+    # tier 1: sampling
+    t0 = time.time()
+    X = np.concatenate((x0.reshape((1, phi.indim)), _box_samples(lo, hi, nsamples)), axis=0)
+    X = np.clip(X, lo, hi)
+    viol = np.any(np.dot(amnet.tape.compile(phi).eval(X), np.transpose(A)) > b, axis=1)
+    times.append(('sampling', time.time() - t0))
+    if np.any(viol):
+        return RobustnessResult(False, X[int(np.argmax(viol))], 'sampling', times)
+
+    # tier 2: bound propagation
+    t0 = time.time()
+    linear = amnet.bounds.linear_bounds(phi, lo, hi)
+    ub, _ = amnet.bounds.halfspace_bounds(phi, A, lo, hi, linear=linear)
+    open_rows = (ub > b)
+    times.append(('bounds', time.time() - t0))
+    if not np.any(open_rows):
+        return RobustnessResult(True, None, 'bounds', times)
+
+    # tier 3: smt, on the rows that bounds could not prove
+    # (reusing the node bounds of tier 2)
+    t0 = time.time()
+    sess = Session(phi, domain=(lo, hi), bounds=linear[0])
+    xc = sess.check_output_halfspaces(A[open_rows], b[open_rows])
+    times.append(('smt', time.time() - t0))
+    return RobustnessResult(xc is None, xc, 'smt', times)
+
+
+################################################################################
+# output range
+################################################################################
+
+class OutputRange(object):
+    """
+    Outcome of output_range:
+    ymin, ymax  the smallest and largest value of the output found,
+                each attained at an input (up to the accuracy of the model)
+    xmin, xmax  inputs attaining ymin and ymax
+    tol         the exact extrema lie in [ymin - tol, ymin] and [ymax, ymax + tol]
+    steps       number of solver calls
+    method      'bisect', 'optimize', or 'milp'
+    """
+    def __init__(self, ymin, ymax, xmin, xmax, tol, steps, method):
+        self.ymin = ymin
+        self.ymax = ymax
+        self.xmin = xmin
+        self.xmax = xmax
+        self.tol = tol
+        self.steps = steps
+        self.method = method
+
+    def __str__(self):
+        return '[%s, %s] (%s, %d steps)' % (self.ymin, self.ymax, self.method, self.steps)
+
+
+def _bisect_max(sess, k, sign, lo_val, lo_x, hi_val, tol):
+    """
+    Bisects on the largest value of sign * (output k) over the session,
+    starting from a value lo_val attained at lo_x and an upper bound hi_val.
+    Returns (value, x, steps).
+    """
+    term = sign * sess.y[k]
+    steps = 0
+    while hi_val - lo_val > tol:
+        mid = 0.5 * (lo_val + hi_val)
+        found = sess.find([term > mid], name='bisect')
+        steps += 1
+        if found is None:
+            hi_val = mid
+        else:
+            x, y = found
+            lo_val, lo_x = max(mid, sign * y[k]), x
+    return lo_val, lo_x, steps
+
+
+def _optimize_max(sess, k, sign, tol):
+    """
+    Maximizes sign * (output k) over a session whose solver is a
+    z3.Optimize, and returns (value, x, steps), where value is attained
+    at x (up to the accuracy of the model, as in _bisect_max) and no
+    input attains more than value + tol.
+
+    The optimum reported by z3.Optimize is not used: its model need not
+    attain it, and it can be suboptimal when the supremum is not attained
+    (at the open side of a Mu selector). Instead, the value attained in
+    the model is raised, by more than tol per step, until the solver
+    shows that nothing exceeds it.
+    """
+    opt = sess.solver
+    t = sign * sess.y[k]
+
+    value, x = None, None
+    steps = 0
+    while True:
+        opt.push()
+        if value is not None:
+            opt.add(t > value + tol)
+        opt.maximize(t)
+        result = opt.check()
+        steps += 1
+        if result == z3.sat:
+            model = opt.model()
+            xnew = model_values(model, sess.x)
+            vnew = model_values(model, [t])[0]
+        opt.pop()
+
+        assert result in [z3.sat, z3.unsat], 'optimization returned %s' % result
+        if result == z3.unsat:
+            assert value is not None, 'empty box'
+            return value, x, steps
+
+        x, value = xnew, vnew
+
+
+def output_range(phi, box, k=0, method='bisect', tol=1e-6):
+    """
+    Returns an OutputRange with the minimum and maximum of output k of
+    phi over the input box = (lo, hi), each within tol (absolute).
+    Every method encodes phi once and reuses the encoding for
+    all of its steps:
+    'bisect'    starts from the symbolic bounds of phi and from sampled
+                values, and bisects the gap with an incremental Session
+                until it is below tol
+    'optimize'  maximizes and minimizes with z3.Optimize, and confirms
+                each optimum with the solver (see _optimize_max)
+    'milp'      maximizes and minimizes with amnet.milp (exact up to
+                the tolerances of the MILP solver; the extrema may use
+                either branch of a Mu whose selector is 0, see MilpEncoder)
+    """
+    lo, hi = box
+    lo = np.array(lo, dtype=float).flatten()
+    hi = np.array(hi, dtype=float).flatten()
+    assert len(lo) == phi.indim and len(hi) == phi.indim
+    assert 0 <= k < phi.outdim
+    assert tol > 0
+
+    if method == 'bisect':
+        sess = Session(phi, domain=(lo, hi))
+        blo, bhi = sess.enc.bounds[phi]
+
+        # attained values, from the center and the corners of the box
+        X = np.concatenate(((0.5 * (lo + hi)).reshape((1, phi.indim)),
+                            _box_samples(lo, hi, 0)), axis=0)
+        Y = amnet.tape.compile(phi).eval(X)[:, k]
+        imin, imax = int(np.argmin(Y)), int(np.argmax(Y))
+
+        ymax, xmax, smax = _bisect_max(sess, k, 1, Y[imax], X[imax], bhi[k], tol)
+        ymin, xmin, smin = _bisect_max(sess, k, -1, -Y[imin], X[imin], -blo[k], tol)
+        return OutputRange(-ymin, ymax, xmin, xmax, tol, smax + smin, method)
+
+    elif method == 'optimize':
+        sess = Session(phi, domain=(lo, hi), solver=z3.Optimize())
+        ymax, xmax, smax = _optimize_max(sess, k, 1, tol)
+        ymin, xmin, smin = _optimize_max(sess, k, -1, tol)
+        return OutputRange(-ymin, ymax, xmin, xmax, tol, smax + smin, method)
+
+    elif method == 'milp':
+        from amnet import milp  # needs scipy
+        enc = milp.MilpEncoder(phi, lo, hi)
+        c = np.eye(1, phi.outdim, k).flatten()
+        ymax, xmax = enc.maximize(c)
+        negmin, xmin = enc.maximize(-c)
+        return OutputRange(-negmin, ymax, xmin, xmax, tol, 2, method)
+
+    else:
+        assert False, 'unknown method %s' % method
@@ -32,6 +32,9 @@ def _node_for(ctx, name, dot, append_dims=True):
         fillcolor = 'gray80'
     elif isinstance(phi, amnet.Stack):
         style = 'filled'
+    elif isinstance(phi, amnet.Max) or isinstance(phi, amnet.Min):
+        style = 'filled'
+        fillcolor = 'gray90'
     elif isinstance(phi, amnet.Amn):
         pass
 
@@ -91,9 +94,12 @@ def amn2gv(phi, ctx=None, title=None):
             dot.edge(sg[n1][1],  # y-input
                      n1,
                      arrowhead='odot')
+            # an elementwise selector is drawn with a bold edge
+            elementwise = ctx.symbols[n1].z.outdim > 1
             dot.edge(sg[n1][2],  # z-input
                      n1,
-                     arrowhead='normal')
+                     arrowhead='normal',
+                     style='bold' if elementwise else None)
 
     # return the dot object
     return dot
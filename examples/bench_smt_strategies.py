@@ -0,0 +1,76 @@
+import numpy as np
+import amnet
+from amnet import tf_utils
+
+import time
+
+"""
+Compares the solve time of SmtEncoder strategies on random relu networks,
+at the scale of test_smt.py and at the scale of example_tf.py
+(MNIST reduced to 40 principal components, 20 hidden units, 10 outputs).
+
+Each query asks for an input in a box around a random point
+whose first output reaches the midpoint of its interval bounds.
+
+Run with:
+    PYTHONPATH=.. python bench_smt_strategies.py
+"""
+
+STRATEGIES = [
+    ('fresh', None),
+    ('auto', {amnet.Affine: 'auto', amnet.Stack: 'inline'}),
+    ('inline', {amnet.Affine: 'inline', amnet.Mu: 'inline', amnet.Stack: 'inline'}),
+]
+
+NETWORKS = [
+    ('test_smt', [3, 6, 4, 2], 1.0),
+    ('mnist_pca', [40, 20, 10], 0.05),
+]
+
+TIMEOUT_MS = 60000
+
+
+def random_net(dims, seed):
+    rng = np.random.RandomState(seed)
+    weights = [rng.randn(m, n) / np.sqrt(m) for m, n in zip(dims[:-1], dims[1:])]
+    biases = [0.1 * rng.randn(n) for n in dims[1:]]
+    return tf_utils.relu_amn(weights, biases)
+
+
+def bench(phi, lo, hi, strategies):
+    bounds = amnet.bounds.interval_bounds(phi, lo, hi)
+    ylo, yhi = bounds[phi]
+    target = 0.5 * (ylo[0] + yhi[0])
+
+    t0 = time.time()
+    enc = amnet.smt.SmtEncoder(phi, domain=(lo, hi), strategies=strategies)
+    enc.solver.add(enc.var_of(phi)[0] >= target)
+    enc.solver.set('timeout', TIMEOUT_MS)
+    t1 = time.time()
+    result = enc.solver.check()
+    t2 = time.time()
+
+    # number of z3 variables (inlined nodes have terms, not variables)
+    nvars = sum(len(v) for name, v in enc.vars.items() if name not in enc.inlined)
+    nasserts = len(enc.solver.assertions())
+    return result, t1 - t0, t2 - t1, nvars, nasserts
+
+
+def main():
+    print '%-10s %-8s %-8s %8s %8s %8s %10s' % \
+          ('network', 'strategy', 'result', 'encode', 'solve', 'vars', 'asserts')
+
+    for netname, dims, radius in NETWORKS:
+        for seed in range(3):
+            phi = random_net(dims, seed)
+            center = np.random.RandomState(100 + seed).randn(dims[0])
+            lo, hi = center - radius, center + radius
+
+            for stratname, strategies in STRATEGIES:
+                result, tenc, tsolve, nvars, nasserts = bench(phi, lo, hi, strategies)
+                print '%-10s %-8s %-8s %8.3f %8.3f %8d %10d' % \
+                      (netname, stratname, result, tenc, tsolve, nvars, nasserts)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,18 @@ set -e
 coverage erase
 PYTHONPATH=. coverage run -a --source=. tests/test_atoms.py
 PYTHONPATH=. coverage run -a --source=. tests/test_smt.py
+PYTHONPATH=. coverage run -a --source=. tests/test_tape.py
+PYTHONPATH=. coverage run -a --source=. tests/test_bounds.py
+PYTHONPATH=. coverage run -a --source=. tests/test_tree.py
+PYTHONPATH=. coverage run -a --source=. tests/test_util.py
+PYTHONPATH=. coverage run -a --source=. tests/test_milp.py
+PYTHONPATH=. coverage run -a --source=. tests/test_verify.py
+PYTHONPATH=. coverage run -a --source=. tests/test_portfolio.py
+PYTHONPATH=. coverage run -a --source=. tests/test_bab.py
+PYTHONPATH=. coverage run -a --source=. tests/test_smtlib.py
+PYTHONPATH=. coverage run -a --source=. tests/test_cache.py
+PYTHONPATH=. coverage run -a --source=. tests/test_pipeline.py
+PYTHONPATH=. coverage run -a --source=. tests/test_lyap.py
 PYTHONPATH=. coverage run -a --source=. tests/test_tf.py
 coverage report -m
 coverage html
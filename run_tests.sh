@@ -2,5 +2,16 @@
 set -e
 PYTHONPATH=. python tests/test_atoms.py
 PYTHONPATH=. python tests/test_smt.py
-#PYTHONPATH=. python tests/test_lyap.py
+PYTHONPATH=. python tests/test_tape.py
+PYTHONPATH=. python tests/test_bounds.py
+PYTHONPATH=. python tests/test_tree.py
+PYTHONPATH=. python tests/test_util.py
+PYTHONPATH=. python tests/test_milp.py
+PYTHONPATH=. python tests/test_verify.py
+PYTHONPATH=. python tests/test_portfolio.py
+PYTHONPATH=. python tests/test_bab.py
+PYTHONPATH=. python tests/test_smtlib.py
+PYTHONPATH=. python tests/test_cache.py
+PYTHONPATH=. python tests/test_pipeline.py
+PYTHONPATH=. python tests/test_lyap.py
 #PYTHONPATH=. python tests/test_tf.py
@@ -0,0 +1,22 @@
+import numpy as np
+import amnet
+
+"""
+Fixtures shared by the test modules
+"""
+
+
+def random_relu_net(dims):
+    """
+    Returns a relu network with layer widths dims (input first),
+    whose weights and biases are drawn from np.random
+    """
+    x = amnet.Variable(dims[0], name='x')
+    phi = x
+    for m, n in zip(dims[:-1], dims[1:]):
+        phi = amnet.atoms.relu(amnet.Affine(
+            np.random.randn(n, m),
+            phi,
+            np.random.randn(n)
+        ))
+    return phi
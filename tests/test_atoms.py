@@ -61,6 +61,34 @@ class TestAtoms(unittest.TestCase):
             self.assertAlmostEqual(norm(yv - ylv), 0)
             self.assertAlmostEqual(norm(yv - ytv), 0)
 
+    def test_balanced_reductions(self):
+        x = amnet.Variable(100, name='x')
+        xs = amnet.atoms.to_list(x)
+
+        def depth(phi):
+            d = dict()
+            for node in amnet.tree.postorder(phi):
+                d[id(node)] = 1 + max([d[id(c)] for c in amnet.tree.children(node)] + [0])
+            return d[id(phi)]
+
+        # ceil(log2(100)) = 7 levels of pairwise reduction
+        phi_stack = amnet.atoms.from_list(xs)
+        phi_add = amnet.atoms.add_list(xs)
+        phi_max = amnet.atoms.max_list(xs)
+        self.assertEqual(depth(phi_stack), 7 + 2)
+        self.assertEqual(depth(phi_add), 2 * 7 + 2)
+        self.assertEqual(depth(phi_max), 7 + 3)
+
+        # foldt matches foldl for associative functions
+        self.assertEqual(amnet.util.foldt(lambda a, b: a + b, range(11)), 55)
+        self.assertEqual(amnet.util.foldt(lambda a, b: a + b, ['a', 'b', 'c']), 'abc')
+
+        for _ in range(10):
+            xinp = 2 * np.random.rand(100) - 1
+            self.assertAlmostEqual(norm(phi_stack.eval(xinp) - xinp), 0)
+            self.assertAlmostEqual(norm(phi_add.eval(xinp) - np.sum(xinp)), 0)
+            self.assertAlmostEqual(norm(phi_max.eval(xinp) - np.max(xinp)), 0)
+
     def test_identity(self):
         x = amnet.Variable(2, name='x')
 
@@ -142,6 +170,32 @@ class TestAtoms(unittest.TestCase):
             s = relu(np.array([yv]))
             self.assertEqual(r, s)
 
+    def test_relu_wide(self):
+        x = amnet.Variable(1000, name='x')
+        phi = amnet.atoms.relu(x)
+
+        # a single elementwise Mu, with a Constant and a negation
+        nodes = amnet.tree.postorder(phi)
+        self.assertEqual(len(nodes), 4)
+        self.assertTrue(isinstance(phi, amnet.Mu))
+        self.assertEqual(phi.z.outdim, 1000)
+
+        xinp = 2 * np.random.rand(1000) - 1
+        self.assertAlmostEqual(norm(phi.eval(xinp) - np.maximum(xinp, 0)), 0)
+
+    def test_mu_elementwise(self):
+        xyz = amnet.Variable(6, name='xyz')
+        x = amnet.Linear(np.eye(2, 6, 0), xyz)
+        y = amnet.Linear(np.eye(2, 6, 2), xyz)
+        z = amnet.Linear(np.eye(2, 6, 4), xyz)
+        phi = amnet.Mu(x, y, z)
+        self.assertEqual(phi.outdim, 2)
+
+        for v in itertools.product(self.floatvals2, repeat=6):
+            inp = np.array(v)
+            true_w = np.where(inp[4:6] <= 0, inp[0:2], inp[2:4])
+            self.assertAlmostEqual(norm(phi.eval(inp) - true_w), 0)
+
     def test_max2_min2(self):
         xy = amnet.Variable(6, name='xy')
         x = amnet.Linear(
@@ -207,6 +261,88 @@ class TestAtoms(unittest.TestCase):
             self.assertAlmostEqual(norm(tv - max_y_v), 0)
             self.assertAlmostEqual(norm(tv - maff_v), 0)
 
+    def test_max_all_wide(self):
+        # max2_1 uses each operand twice, so without memoization
+        # this evaluation would visit the leaves 2^n times
+        n = 40
+        x = amnet.Variable(n, name='x')
+        phi_max = amnet.atoms.max_all(x)
+        phi_min = amnet.atoms.min_all(x)
+
+        np.random.seed(1)
+        for _ in range(10):
+            xinp = 10 * (2 * np.random.rand(n) - 1)
+            self.assertEqual(phi_max.eval(xinp), np.max(xinp))
+            self.assertEqual(phi_min.eval(xinp), np.min(xinp))
+
+    def test_max2_fold_wide(self):
+        # each Mu of a fold of max2 reads the previous partial maximum
+        # twice (as a branch and in its selector), so without memoization
+        # this evaluation would visit the leaves 2^n times
+        n = 40
+        x = amnet.Variable(n, name='x')
+        xs = amnet.atoms.to_list(x)
+        phi_max = amnet.util.foldl(amnet.atoms.max2, xs[0], xs[1:])
+        phi_min = amnet.util.foldl(amnet.atoms.min2, xs[0], xs[1:])
+
+        np.random.seed(1)
+        for _ in range(10):
+            xinp = 10 * (2 * np.random.rand(n) - 1)
+            self.assertEqual(phi_max.eval(xinp), np.max(xinp))
+            self.assertEqual(phi_min.eval(xinp), np.min(xinp))
+
+    def test_max_list_wide(self):
+        # max_list reduces each component with one Max (or Min) node
+        # over the stacked components of all the vectors in the list
+        n, m = 40, 3
+        x = amnet.Variable(n * m, name='x')
+        phis = [amnet.Linear(np.eye(m, n * m, i * m), x) for i in range(n)]
+        phi_max = amnet.atoms.max_list(phis)
+        phi_min = amnet.atoms.min_list(phis)
+        self.assertEqual(phi_max.outdim, m)
+
+        nodes = amnet.tree.postorder(phi_max)
+        self.assertEqual(len([node for node in nodes if isinstance(node, amnet.Max)]), m)
+
+        np.random.seed(1)
+        for _ in range(10):
+            xinp = 10 * (2 * np.random.rand(n * m) - 1)
+            self.assertTrue(np.array_equal(phi_max.eval(xinp),
+                                           np.max(xinp.reshape((n, m)), axis=0)))
+            self.assertTrue(np.array_equal(phi_min.eval(xinp),
+                                           np.min(xinp.reshape((n, m)), axis=0)))
+
+    def test_max_min_nodes(self):
+        x = amnet.Variable(4, name='x')
+        w = np.array([[1, -1, 0, 0], [0, 2, 0, 1], [-1, 0, 3, 0]])
+        b = np.array([0.5, -0.5, 0])
+        y = amnet.Affine(w, x, b)
+
+        phi_max = amnet.atoms.max_all(y)
+        phi_min = amnet.atoms.min_all(y)
+        self.assertTrue(isinstance(phi_max, amnet.Max))
+        self.assertTrue(isinstance(phi_min, amnet.Min))
+        self.assertEqual(phi_max.outdim, 1)
+        self.assertEqual(phi_min.outdim, 1)
+
+        # elementwise max/min over a list of vectors
+        z = amnet.atoms.neg(y)
+        phi_maxl = amnet.atoms.max_list([y, z, amnet.Linear(np.eye(3, 4), x)])
+        phi_minl = amnet.atoms.min_list([y, z])
+        self.assertEqual(phi_maxl.outdim, 3)
+        self.assertEqual(phi_minl.outdim, 3)
+
+        for xv in itertools.product(self.floatvals2, repeat=4):
+            xinp = np.array(xv)
+            yv = np.dot(w, xinp) + b
+
+            self.assertAlmostEqual(norm(phi_max.eval(xinp) - np.max(yv)), 0)
+            self.assertAlmostEqual(norm(phi_min.eval(xinp) - np.min(yv)), 0)
+            self.assertAlmostEqual(
+                norm(phi_maxl.eval(xinp) - np.maximum(np.maximum(yv, -yv), xinp[0:3])), 0)
+            self.assertAlmostEqual(
+                norm(phi_minl.eval(xinp) - np.minimum(yv, -yv)), 0)
+
     def test_triplexer(self):
         x = amnet.Variable(1, name='xv')
 
@@ -0,0 +1,95 @@
+import numpy as np
+import amnet
+import amnet.bab
+import amnet.milp
+
+import os
+import sys
+import unittest
+
+
+class TestBab(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-6
+
+        # a small relu network, and the exact maximum of its output
+        np.random.seed(5)
+        x = amnet.Variable(2, name='x')
+        phi = x
+        for m, n in [(2, 6), (6, 4), (4, 1)]:
+            phi = amnet.atoms.relu(amnet.Affine(np.random.randn(n, m), phi, np.random.randn(n)))
+        cls.phi = phi
+        cls.lo, cls.hi = -2 * np.ones(2), 2 * np.ones(2)
+        cls.ymax, _ = amnet.milp.maximize(phi, cls.lo, cls.hi)
+        assert cls.ymax > 0.1
+
+    def test_verify(self):
+        A, b = [[1]], [self.ymax + 0.05]
+        res = amnet.bab.verify(self.phi, self.lo, self.hi, A, b, nprocs=2)
+        self.assertEqual(res.status, amnet.bab.VERIFIED)
+        self.assertTrue(res.counterexample is None)
+        self.assertAlmostEqual(res.coverage, 1)
+        self.assertTrue(res.nboxes >= 1)
+
+    def test_counterexample(self):
+        A, b = [[1]], [self.ymax - 0.05]
+        res = amnet.bab.verify(self.phi, self.lo, self.hi, A, b, nprocs=2)
+        self.assertEqual(res.status, amnet.bab.COUNTEREXAMPLE)
+        xc = res.counterexample
+        self.assertTrue(np.all(xc >= self.lo - self.FPTOL) and np.all(xc <= self.hi + self.FPTOL))
+        self.assertTrue(self.phi.eval(xc)[0] > b[0] - self.FPTOL)
+
+    def test_solver_leaves(self):
+        # without splitting, the solver decides the whole box
+        A, b = [[1], [-1]], [self.ymax + 0.05, 0]
+        res = amnet.bab.verify(self.phi, self.lo, self.hi, A, b, nprocs=1, max_depth=0)
+        self.assertEqual(res.status, amnet.bab.VERIFIED)
+        self.assertEqual((res.nboxes, res.nsolver), (1, 1))
+
+        # progress is reported for every box
+        reports = []
+        res = amnet.bab.verify(self.phi, self.lo, self.hi, A, b, nprocs=2, max_depth=3,
+                               progress=reports.append)
+        self.assertEqual(res.status, amnet.bab.VERIFIED)
+        self.assertEqual(len(reports), res.nboxes)
+        self.assertTrue(all(r.status == amnet.bab.UNKNOWN for r in reports))
+        coverage = [r.coverage for r in reports]
+        self.assertEqual(coverage, sorted(coverage))
+        self.assertAlmostEqual(coverage[-1], 1)
+
+        # no time to finish
+        res = amnet.bab.verify(self.phi, self.lo, self.hi, A, b, nprocs=1, timeout=0)
+        self.assertEqual(res.status, amnet.bab.UNKNOWN)
+
+    def test_split_dim(self):
+        lo, hi = np.zeros(3), np.array([1, 4, 2])
+        row_au = np.array([[1, 0, 0], [0, 0, 3]])
+
+        # the open rows only depend on the dimensions they read
+        self.assertEqual(amnet.bab._split_dim(row_au, np.array([True, True]), lo, hi), 2)
+        self.assertEqual(amnet.bab._split_dim(row_au, np.array([True, False]), lo, hi), 0)
+
+        # the widest dimension, if the bounds do not depend on x
+        self.assertEqual(amnet.bab._split_dim(0 * row_au, np.array([True, True]), lo, hi), 1)
+
+    def test_worker_dies(self):
+        # a worker that exits without answering does not block the run
+        def die(phi, A, b, max_depth, tasks, results):
+            os._exit(1)
+
+        worker = amnet.bab._worker
+        amnet.bab._worker = die
+        try:
+            res = amnet.bab.verify(self.phi, self.lo, self.hi, [[1]], [self.ymax + 0.05],
+                                   nprocs=2, timeout=None)
+        finally:
+            amnet.bab._worker = worker
+        self.assertEqual(res.status, amnet.bab.UNKNOWN)
+        self.assertEqual(res.nboxes, 0)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBab)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
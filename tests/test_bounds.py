@@ -0,0 +1,216 @@
+import numpy as np
+import amnet
+from helpers import random_relu_net
+
+import sys
+import unittest
+
+from amnet.tree import postorder
+
+
+class TestBounds(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-8
+
+    def validate_bounds(self, phi, lo, hi, bounds, samples=50):
+        # every node of phi must have bounds
+        nodes = postorder(phi)
+        for node in nodes:
+            self.assertTrue(node in bounds)
+            nlo, nhi = bounds[node]
+            self.assertEqual(len(nlo), node.outdim)
+            self.assertEqual(len(nhi), node.outdim)
+            self.assertTrue(np.all(nlo <= nhi + self.FPTOL))
+
+        # sampled node outputs (including corners) lie within the bounds
+        inps = [lo, hi] + [lo + (hi - lo) * np.random.rand(len(lo))
+                           for _ in range(samples)]
+        for inp in inps:
+            for node in nodes:
+                nlo, nhi = bounds[node]
+                val = node.eval(inp)
+                self.assertTrue(np.all(nlo - self.FPTOL <= val))
+                self.assertTrue(np.all(val <= nhi + self.FPTOL))
+
+    def test_interval_affine(self):
+        x = amnet.Variable(2, name='x')
+        w = np.array([[1, -2], [3, 4]])
+        b = np.array([1, -1])
+        phi = amnet.Affine(w, x, b)
+
+        bounds = amnet.bounds.interval_bounds(phi, [-1, 0], [1, 2])
+        lo, hi = bounds[phi]
+
+        # affine bounds over a box are exact
+        self.assertTrue(np.allclose(lo, [1 - 1 - 4, -3 + 0 - 1]))
+        self.assertTrue(np.allclose(hi, [1 + 1 - 0, 3 + 8 - 1]))
+
+    def test_interval_relu_stable(self):
+        x = amnet.Variable(3, name='x')
+        phi = amnet.atoms.relu(x)
+
+        # on the positive orthant, the Mu selects its first input
+        bounds = amnet.bounds.interval_bounds(phi, [1, 2, 3], [2, 3, 4])
+        lo, hi = bounds[phi]
+        self.assertTrue(np.allclose(lo, [1, 2, 3]))
+        self.assertTrue(np.allclose(hi, [2, 3, 4]))
+
+        mus = [node for node in postorder(phi) if isinstance(node, amnet.Mu)]
+        self.assertEqual(len(mus), 1)
+        mu = mus[0]
+        self.assertEqual(amnet.bounds.selector_sign(mu, bounds), -1)
+        self.assertEqual(list(amnet.bounds.selector_signs(mu, bounds)), [-1, -1, -1])
+
+        # around the origin, none of the components are stable
+        bounds = amnet.bounds.interval_bounds(phi, -np.ones(3), np.ones(3))
+        self.assertEqual(amnet.bounds.selector_sign(mu, bounds), 0)
+        self.assertEqual(list(amnet.bounds.selector_signs(mu, bounds)), [0, 0, 0])
+
+        # with mixed signs, only the unstable component is a union
+        bounds = amnet.bounds.interval_bounds(phi, [-2, -1, 1], [-1, 1, 2])
+        self.assertEqual(amnet.bounds.selector_sign(mu, bounds), 0)
+        self.assertEqual(list(amnet.bounds.selector_signs(mu, bounds)), [1, 0, -1])
+        lo, hi = bounds[phi]
+        self.assertTrue(np.allclose(lo, [0, -1, 1]))
+        self.assertTrue(np.allclose(hi, [0, 1, 2]))
+
+    def test_interval_relu_net(self):
+        np.random.seed(1)
+        for _ in range(5):
+            phi = random_relu_net([4, 6, 5, 3])
+            lo = np.random.randn(4)
+            hi = lo + np.random.rand(4)
+            bounds = amnet.bounds.interval_bounds(phi, lo, hi)
+            self.validate_bounds(phi, lo, hi, bounds)
+
+    def test_interval_triplexer(self):
+        np.random.seed(1)
+        x = amnet.Variable(1, name='x')
+        a, b, c, d, e, f = [3 * (2 * np.random.rand(4) - 1) for _ in range(6)]
+        phi = amnet.atoms.triplexer(x, a, b, c, d, e, f)
+
+        lo, hi = np.array([-2.]), np.array([3.])
+        bounds = amnet.bounds.interval_bounds(phi, lo, hi)
+        self.validate_bounds(phi, lo, hi, bounds)
+
+    def test_symbolic_relu_net(self):
+        np.random.seed(1)
+        for _ in range(5):
+            phi = random_relu_net([4, 8, 8, 8, 3])
+            lo = np.random.randn(4)
+            hi = lo + 0.5 * np.random.rand(4)
+
+            ibounds = amnet.bounds.interval_bounds(phi, lo, hi)
+            sbounds = amnet.bounds.symbolic_bounds(phi, lo, hi)
+            self.validate_bounds(phi, lo, hi, sbounds)
+
+            # symbolic bounds are never looser than interval bounds
+            for node in postorder(phi):
+                self.assertTrue(np.all(ibounds[node][0] <= sbounds[node][0] + self.FPTOL))
+                self.assertTrue(np.all(sbounds[node][1] <= ibounds[node][1] + self.FPTOL))
+
+    def test_symbolic_tighter(self):
+        # the output of x - relu(x) - relu(-x) is identically zero
+        # on the input box, but interval arithmetic cannot see
+        # the cancellation through the Mu nodes
+        x = amnet.Variable(1, name='x')
+        phi = amnet.atoms.sub2(
+            x,
+            amnet.atoms.sub2(
+                amnet.atoms.relu(x),
+                amnet.atoms.relu(amnet.atoms.neg(x))
+            )
+        )
+
+        ibounds = amnet.bounds.interval_bounds(phi, [1.], [2.])
+        sbounds = amnet.bounds.symbolic_bounds(phi, [1.], [2.])
+        self.assertTrue(np.allclose(sbounds[phi][0], 0))
+        self.assertTrue(np.allclose(sbounds[phi][1], 0))
+        self.assertTrue(ibounds[phi][1][0] - ibounds[phi][0][0] > 1)
+
+        # an unstable relu is relaxed by its triangle
+        y = amnet.atoms.relu(amnet.Affine(np.array([[2.]]), x, np.array([-1.])))
+        sbounds, linear = amnet.bounds.linear_bounds(y, [-1.], [1.])
+        self.validate_bounds(y, np.array([-1.]), np.array([1.]), sbounds)
+        self.assertTrue(np.allclose(sbounds[y][0], 0))
+        self.assertTrue(np.allclose(sbounds[y][1], 1))
+        al, cl, au, cu = linear[y]
+        self.assertTrue(np.allclose(au, [[0.5]]))
+        self.assertTrue(np.allclose(cu, [0.5]))
+
+    def test_symbolic_max_min_gates(self):
+        np.random.seed(1)
+        x = amnet.Variable(4, name='x')
+        y = amnet.Affine(np.random.randn(3, 4), x, np.random.randn(3))
+        z = amnet.atoms.select(y, 2)
+
+        for phi in [amnet.atoms.max_all(y),
+                    amnet.atoms.min_all(y),
+                    amnet.atoms.max2(y, amnet.atoms.neg(y)),
+                    amnet.atoms.gate_xor(y, amnet.atoms.neg(y), z, amnet.atoms.neg(z))]:
+            lo = np.random.randn(4)
+            hi = lo + np.random.rand(4)
+            sbounds = amnet.bounds.symbolic_bounds(phi, lo, hi)
+            self.validate_bounds(phi, lo, hi, sbounds)
+
+    def test_symbolic_triplexer(self):
+        np.random.seed(1)
+        x = amnet.Variable(1, name='x')
+        for _ in range(5):
+            a, b, c, d, e, f = [3 * (2 * np.random.rand(4) - 1) for _ in range(6)]
+            phi = amnet.atoms.triplexer(x, a, b, c, d, e, f)
+
+            lo, hi = np.array([-2.]), np.array([3.])
+            sbounds = amnet.bounds.symbolic_bounds(phi, lo, hi)
+            self.validate_bounds(phi, lo, hi, sbounds)
+
+
+    def test_halfspace_bounds(self):
+        np.random.seed(2)
+        phi = random_relu_net([3, 6, 6, 3])
+        lo, hi = -np.ones(3), np.ones(3)
+        A = np.random.randn(4, 3)
+
+        ub, au = amnet.bounds.halfspace_bounds(phi, A, lo, hi)
+        self.assertEqual(ub.shape, (4,))
+        self.assertEqual(au.shape, (4, 3))
+
+        # sampled rows lie below the bounds
+        X = np.concatenate(([lo, hi], lo + (hi - lo) * np.random.rand(200, 3)), axis=0)
+        Y = amnet.tape.compile(phi).eval(X)
+        self.assertTrue(np.all(np.dot(Y, A.T) <= ub + self.FPTOL))
+
+        # precomputed linear bounds give the same result
+        ub2, au2 = amnet.bounds.halfspace_bounds(phi, A, lo, hi,
+                                                 linear=amnet.bounds.linear_bounds(phi, lo, hi))
+        self.assertTrue(np.array_equal(ub, ub2) and np.array_equal(au, au2))
+
+        # the bound of a single output is that of the node
+        _, yhi = amnet.bounds.symbolic_bounds(phi, lo, hi)[phi]
+        ub, _ = amnet.bounds.halfspace_bounds(phi, np.eye(3), lo, hi)
+        self.assertTrue(np.allclose(ub, yhi))
+
+    def test_reduction_candidates(self):
+        x = amnet.Variable(3, name='x')
+        w = amnet.Linear(np.diag([1., 1., 0.1]), x)
+        phi_max = amnet.Max(w)
+        phi_min = amnet.Min(w)
+
+        # the third input lies in [0.1, 0.2], always below the
+        # first two on [1, 2]^3
+        lo, hi = np.ones(3), 2 * np.ones(3)
+        bounds = amnet.bounds.interval_bounds(phi_max, lo, hi)
+        self.assertEqual(amnet.bounds.reduction_candidates(phi_max, bounds), [0, 1])
+        bounds = amnet.bounds.interval_bounds(phi_min, lo, hi)
+        self.assertEqual(amnet.bounds.reduction_candidates(phi_min, bounds), [2])
+
+        # without bounds nothing is dropped
+        self.assertEqual(amnet.bounds.reduction_candidates(phi_max, None), [0, 1, 2])
+        self.assertEqual(amnet.bounds.reduction_candidates(phi_min, {}), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBounds)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,93 @@
+import numpy as np
+import amnet
+import amnet.cache
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        np.random.seed(6)
+        self.x = amnet.Variable(2, name='x')
+        self.phi = amnet.atoms.relu(amnet.Affine(np.random.randn(3, 2), self.x, np.random.randn(3)))
+        self.lo, self.hi = -np.ones(2), np.ones(2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_check_output_halfspaces(self):
+        cache = amnet.cache.Cache(self.path)
+        ymax = np.max(amnet.bounds.symbolic_bounds(self.phi, self.lo, self.hi)[self.phi][1]) + 1e-6
+        A = np.eye(3)
+
+        # a miss solves and stores the verdict, a hit reads it back
+        for _ in range(2):
+            self.assertTrue(cache.check_output_halfspaces(self.phi, self.lo, self.hi, A, [ymax] * 3) is None)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))  # verdict, encoding, verdict
+
+        # violated at x = (0.5, 0.5)
+        b = self.phi.eval(np.array([0.5, 0.5])) - 0.1
+        xc1 = cache.check_output_halfspaces(self.phi, self.lo, self.hi, A, b)
+        xc2 = cache.check_output_halfspaces(self.phi, self.lo, self.hi, A, b)
+        self.assertTrue(xc1 is not None)
+        self.assertTrue(np.any(np.dot(A, self.phi.eval(xc1)) > b - 1e-6))
+        self.assertTrue(np.array_equal(xc1, xc2))
+
+        # the encoding is shared by the queries on the same box
+        self.assertEqual(len(cache._entries()), 3)
+
+        # a new session on the same directory reuses the entries
+        cache2 = amnet.cache.Cache(self.path)
+        cache2.check_output_halfspaces(self.phi, self.lo, self.hi, A, b)
+        self.assertEqual((cache2.hits, cache2.misses), (1, 0))
+
+        # a different entry format ignores them
+        fmt = amnet.cache.FORMAT_VERSION
+        amnet.cache.FORMAT_VERSION = fmt + 1
+        try:
+            cache2.check_output_halfspaces(self.phi, self.lo, self.hi, A, b)
+            self.assertEqual((cache2.hits, cache2.misses), (1, 2))
+        finally:
+            amnet.cache.FORMAT_VERSION = fmt
+
+        # a different version invalidates them
+        cache3 = amnet.cache.Cache(self.path, version='other')
+        self.assertEqual(len(cache3._entries()), 0)
+
+    def test_lru(self):
+        cache = amnet.cache.Cache(self.path)
+        for k in range(3):
+            cache.put('key%d' % k, {'data': 'x' * 100})
+            time.sleep(0.01)
+        size = cache.size()
+
+        # touch key0, so key1 is the least recently used
+        self.assertEqual(cache.get('key0'), {'data': 'x' * 100})
+        time.sleep(0.01)
+
+        cache.max_bytes = size
+        cache.put('key3', {'data': 'x' * 100})
+        self.assertTrue(cache.get('key1') is None)
+        for k in [0, 2, 3]:
+            self.assertTrue(cache.get('key%d' % k) is not None)
+        self.assertTrue(cache.size() <= size)
+
+        # no temporary files are left behind
+        self.assertEqual(len(os.listdir(self.path)), len(cache._entries()) + 1)
+
+        cache.clear()
+        self.assertEqual(cache.size(), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.path, 'VERSION')))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCache)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,157 @@
+import numpy as np
+import amnet
+import amnet.milp
+import scipy.sparse
+from helpers import random_relu_net
+
+import sys
+import unittest
+import itertools
+
+
+class TestMilp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-5
+
+    def validate_maximize(self, phi, lo, hi, c=None, samples=200, exact=True):
+        val, xstar = amnet.milp.maximize(phi, lo, hi, c=c)
+        if c is None:
+            c = np.eye(1, phi.outdim, 0).flatten()
+
+        # the maximizer is in the box, and attains the maximum
+        self.assertEqual(xstar.shape, (phi.indim,))
+        self.assertTrue(np.all(xstar >= lo - self.FPTOL))
+        self.assertTrue(np.all(xstar <= hi + self.FPTOL))
+        if exact:
+            self.assertAlmostEqual(np.dot(c, phi.eval(xstar)), val, places=4)
+
+        # no sample exceeds the maximum
+        tape = amnet.tape.compile(phi)
+        X = lo + (hi - lo) * np.random.rand(samples, phi.indim)
+        corners = np.array(list(itertools.product(*zip(lo, hi))))
+        Y = tape.eval(np.concatenate((X, corners), axis=0))
+        self.assertTrue(np.max(np.dot(Y, c)) <= val + self.FPTOL)
+
+        return val, xstar
+
+    def test_maximize_atoms(self):
+        x = amnet.Variable(2, name='x')
+        lo, hi = np.array([-1, -2]), np.array([2, 1])
+
+        val, _ = self.validate_maximize(amnet.atoms.max_all(x), lo, hi)
+        self.assertAlmostEqual(val, 2)
+
+        # maximum of the minimum
+        val, _ = self.validate_maximize(amnet.atoms.min_all(x), lo, hi)
+        self.assertAlmostEqual(val, 1)
+
+        # minimum of the relu (as the maximum of its negation)
+        val, _ = self.validate_maximize(amnet.atoms.relu(x), lo, hi, c=[-1, -1])
+        self.assertAlmostEqual(val, 0)
+
+        # triplexer (its Mu branches differ at z = 0, where the
+        # program may pick either branch, so the maximum is only an upper bound)
+        np.random.seed(1)
+        x1 = amnet.Variable(1, name='x1')
+        a, b, c, d, e, f = [3 * (2 * np.random.rand(4) - 1) for _ in range(6)]
+        phi_tri = amnet.atoms.triplexer(x1, a, b, c, d, e, f)
+        self.validate_maximize(phi_tri, np.array([-2.]), np.array([2.]), exact=False)
+        self.validate_maximize(phi_tri, np.array([-2.]), np.array([2.]), c=[-1], exact=False)
+
+    def test_maximize_relu_net(self):
+        np.random.seed(1)
+        for dims in [[2, 5, 3], [3, 4, 3, 2]]:
+            phi = random_relu_net(dims)
+            lo, hi = -np.ones(dims[0]), np.ones(dims[0])
+            for k in range(phi.outdim):
+                c = np.eye(1, phi.outdim, k).flatten()
+                self.validate_maximize(phi, lo, hi, c=c)
+                self.validate_maximize(phi, lo, hi, c=-c)
+
+    def test_find_counterexample(self):
+        np.random.seed(2)
+        phi = random_relu_net([3, 6, 2])
+        lo, hi = -np.ones(3), np.ones(3)
+
+        A = np.array([[1, -1], [-1, 0]])
+        vals = [amnet.milp.maximize(phi, lo, hi, c=A[k])[0] for k in range(2)]
+
+        # the property holds just above the maxima
+        b = np.array(vals) + 0.1
+        self.assertTrue(amnet.milp.find_counterexample(phi, lo, hi, A, b) is None)
+
+        # and fails just below, with a counterexample in the box
+        b = np.array([vals[0] - 0.1, vals[1] + 0.1])
+        xc = amnet.milp.find_counterexample(phi, lo, hi, A, b)
+        self.assertTrue(xc is not None)
+        self.assertTrue(np.all(xc >= lo - self.FPTOL) and np.all(xc <= hi + self.FPTOL))
+        self.assertTrue(np.any(np.dot(A, phi.eval(xc)) > b))
+
+    def test_encoder_stable(self):
+        # on the positive orthant, the relu needs no binaries
+        x = amnet.Variable(3, name='x')
+        phi = amnet.atoms.relu(amnet.Linear(np.eye(3), x))
+        enc = amnet.milp.MilpEncoder(phi, [1, 1, 1], [2, 2, 2])
+        self.assertEqual(len(enc.binaries), 0)
+
+        enc = amnet.milp.MilpEncoder(phi, [-1, 1, 1], [2, 2, 2])
+        self.assertEqual(len(enc.binaries), 1)
+
+    def test_constraint_matrix(self):
+        np.random.seed(3)
+        phi = random_relu_net([3, 4, 2])
+        enc = amnet.milp.MilpEncoder(phi, -np.ones(3), np.ones(3))
+        A, rlo, rhi = enc.constraint_matrix()
+        self.assertTrue(scipy.sparse.isspmatrix_csr(A))
+        self.assertEqual(A.shape, (len(enc.rows), enc.ncols))
+        self.assertEqual(len(rlo), len(enc.rows))
+
+        # repeated columns of a row are summed
+        dense = np.zeros(A.shape)
+        for k, (cols, coeffs, _, _) in enumerate(enc.rows):
+            for col, coeff in zip(cols, coeffs):
+                dense[k, col] += coeff
+        self.assertTrue(np.array_equal(A.toarray(), dense))
+
+    def test_lp_failures(self):
+        # x0 + x1 <= 1, 0 <= x <= 1
+        A = scipy.sparse.csr_matrix(np.array([[1., 1.]]))
+        args = (np.array([-1., -1.]), A, np.array([-np.inf]), np.array([1.]),
+                np.zeros(2), np.ones(2))
+        val, v = amnet.milp._lp(*args)
+        self.assertAlmostEqual(val, -1)
+
+        class Result(object):
+            def __init__(self, status):
+                self.status = status
+                self.message = 'status %d' % status
+
+        def fake(outcomes):
+            outcomes = list(outcomes)
+
+            def linprog(*args, **kwargs):
+                out = outcomes.pop(0)
+                if out is None:
+                    raise ValueError('numerical trouble')
+                return Result(out)
+            return linprog
+
+        linprog = amnet.milp.linprog
+        try:
+            # infeasible only if every method says so
+            amnet.milp.linprog = fake([2, 2])
+            self.assertEqual(amnet.milp._lp(*args), (None, None))
+
+            # any other failure is an error, not a pruned subproblem
+            for outcomes in [[2, None], [2, 4], [None, 2], [1, 2]]:
+                amnet.milp.linprog = fake(outcomes)
+                self.assertRaises(RuntimeError, amnet.milp._lp, *args)
+        finally:
+            amnet.milp.linprog = linprog
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMilp)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
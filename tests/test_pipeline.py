@@ -0,0 +1,124 @@
+import numpy as np
+import amnet
+import amnet.pipeline
+from amnet import tf_utils
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+
+def build_net():
+    rng = np.random.RandomState(8)
+    dims = [4, 6, 3]
+    weights = [rng.randn(m, n) for m, n in zip(dims[:-1], dims[1:])]
+    biases = [rng.randn(n) for n in dims[1:]]
+    return tf_utils.relu_amn(weights, biases)
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.results = os.path.join(self.path, 'results.txt')
+
+        np.random.seed(9)
+        self.X = np.random.randn(12, 2, 2)  # flattened by the pipeline
+        self.npy = os.path.join(self.path, 'inputs.npy')
+        np.save(self.npy, self.X)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def validate_results(self, phi, eps, labels=None):
+        res = amnet.pipeline.load_results(self.results)
+        self.assertEqual(sorted(res['index'].tolist()), range(len(self.X)))
+
+        for k, i in enumerate(res['index']):
+            x0 = self.X[i].flatten()
+            predicted = int(np.argmax(phi.eval(x0)))
+            label = predicted if labels is None else labels[i]
+            self.assertEqual(res['predicted'][k], predicted)
+            self.assertEqual(res['label'][k], label)
+
+            direct = amnet.verify.verify_robust(phi, x0, eps, label)
+            self.assertEqual(res['robust'][k], int(direct.robust))
+            self.assertTrue(res['tier'][k] in ['sampling', 'bounds', 'smt'])
+            self.assertTrue(res['seconds'][k] >= 0)
+        return res
+
+    def test_run(self):
+        out = StringIO()
+        count = amnet.pipeline.run(build_net, self.npy, self.results, 0.05,
+                                   nprocs=2, report_every=0, out=out)
+        self.assertEqual(count, len(self.X))
+        res = self.validate_results(build_net(), 0.05)
+        self.assertTrue(np.any(res['robust'] == 1))
+
+        # progress lines, ending with the full count
+        lines = out.getvalue().strip().split('\n')
+        self.assertEqual(len(lines), len(self.X))
+        self.assertTrue(lines[-1].startswith('12/12 (12/12 total)'))
+        self.assertTrue('ETA 0:00:00' in lines[-1])
+
+        # a finished run has nothing left to do
+        self.assertEqual(amnet.pipeline.run(build_net, self.npy, self.results, 0.05,
+                                            nprocs=2, out=None), 0)
+
+    def test_resume(self):
+        phi = build_net()
+        amnet.pipeline.run(phi, self.npy, self.results, 0.05, nprocs=2, out=None)
+
+        # keep the header and 5 verdicts, and a partial line
+        with open(self.results) as f:
+            lines = f.readlines()
+        with open(self.results, 'w') as f:
+            f.writelines(lines[:6])
+            f.write(lines[6][:5])
+        kept = set(amnet.pipeline.load_results(self.results)['index'].tolist())
+        self.assertEqual(len(kept), 5)
+
+        count = amnet.pipeline.run(phi, self.npy, self.results, 0.05, nprocs=2, out=None)
+        self.assertEqual(count, len(self.X) - 5)
+        self.validate_results(phi, 0.05)
+
+    def test_npz_labels(self):
+        labels = np.arange(len(self.X)) % 3
+        npz = os.path.join(self.path, 'inputs.npz')
+        np.savez(npz, images=self.X, labels=labels)
+
+        # a leftover from an interrupted extraction is never trusted
+        stale = self.results + '.images.npy.tmp.npy'
+        np.save(stale, np.zeros(3))
+
+        amnet.pipeline.run(build_net, npz, self.results, 0.05, labels='labels',
+                           key='images', nprocs=1, out=None)
+        self.validate_results(build_net(), 0.05, labels=labels)
+
+        # the workers memory-map an extracted copy of the inputs
+        npy = self.results + '.images.npy'
+        self.assertTrue(np.array_equal(amnet.pipeline.load_inputs(npy), self.X))
+
+        # and no temporary file is left behind
+        files = set(os.path.join(self.path, f) for f in os.listdir(self.path))
+        self.assertEqual(set(f for f in files if f.endswith('.npy')),
+                         set([self.npy, npy, stale]))
+
+    def test_seed(self):
+        # with a seed, the samples of an input do not depend on the worker
+        def state_after(i, seed):
+            amnet.pipeline._init_worker(build_net, self.npy, 0.05, None, seed)
+            amnet.pipeline._certify((i, -1))
+            return np.random.rand()
+
+        self.assertEqual(state_after(3, 1), state_after(3, 1))
+        self.assertNotEqual(state_after(3, 1), state_after(4, 1))
+        self.assertNotEqual(state_after(3, None), state_after(3, None))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPipeline)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
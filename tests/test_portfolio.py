@@ -0,0 +1,112 @@
+import numpy as np
+import amnet
+import amnet.portfolio
+
+import z3
+
+import os
+import sys
+import unittest
+
+
+class TestPortfolio(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-6
+
+    def setUp(self):
+        self.x = amnet.Variable(2, name='x')
+        self.phi = amnet.atoms.relu(amnet.Linear(np.array([[1, -1], [1, 1]]), self.x))
+        self.lo, self.hi = -np.ones(2), np.ones(2)
+        self.enc = amnet.smt.SmtEncoder(self.phi, domain=(self.lo, self.hi))
+
+    def test_check_encoder(self):
+        pf = amnet.portfolio.Portfolio()
+        y = self.enc.var_of(self.phi)
+        nasserts = len(self.enc.solver.assertions())
+
+        res = pf.check_encoder(self.enc, [y[1] >= 1.5])
+        self.assertEqual(res.result, 'sat')
+        self.assertTrue(res.winner in pf.wins)
+        self.assertTrue(res.winner in res.times)
+
+        xc = res.value_of(self.enc.var_of_input())
+        self.assertTrue(np.all(xc >= self.lo - self.FPTOL) and np.all(xc <= self.hi + self.FPTOL))
+        self.assertTrue(self.phi.eval(xc)[1] >= 1.5 - self.FPTOL)
+        self.assertTrue(np.allclose(res.value_of(y), self.phi.eval(xc)))
+
+        res = pf.check_encoder(self.enc, [y[1] >= 2.5])
+        self.assertEqual(res.result, 'unsat')
+
+        # the encoder is untouched, and every query is recorded
+        self.assertEqual(len(self.enc.solver.assertions()), nasserts)
+        self.assertEqual(len(pf.history), 2)
+        self.assertEqual(sum(pf.wins.values()), 2)
+        self.assertEqual(len(pf.report().split('\n')), len(pf.configs) + 1)
+
+    def test_value_of_terms(self):
+        # the outputs of inlined nodes are terms, not model constants
+        phi = amnet.Affine(np.array([[1, 2], [3, -1]]), self.x, np.array([0, 1]))
+        enc = amnet.smt.SmtEncoder(phi, domain=(self.lo, self.hi),
+                                   strategies={amnet.Affine: 'inline'})
+        y = enc.var_of(phi)
+        self.assertFalse(z3.is_const(y[0]))
+
+        pf = amnet.portfolio.Portfolio()
+        res = pf.check_encoder(enc, [y[0] >= 2, y[1] >= 3])
+        self.assertEqual(res.result, 'sat')
+        xc = res.value_of(enc.var_of_input())
+        self.assertTrue(np.allclose(res.value_of(y), phi.eval(xc)))
+
+        # constants that are not in the model are not taken as 0
+        self.assertRaises(AssertionError, res.value_of, [z3.Real('unknown')])
+
+    def test_check_smt2(self):
+        smt2 = '\n'.join([
+            '(declare-fun a () Real)',
+            '(declare-fun b () Real)',
+            '(assert (and (>= a 1) (<= (+ a b) 0)))',
+            '(check-sat)',
+        ])
+        pf = amnet.portfolio.Portfolio(timeout=60)
+        res = pf.check_smt2(smt2)
+        self.assertEqual(res.result, 'sat')
+        self.assertTrue(res.values['a'] >= 1)
+        self.assertTrue(res.values['a'] + res.values['b'] <= 0)
+
+    def test_configs(self):
+        configs = [('default', {}), ('case_split4', {'auto_config': False, 'smt.case_split': 4})]
+        pf = amnet.portfolio.Portfolio(configs=configs)
+        res = pf.check_encoder(self.enc)
+        self.assertEqual(res.result, 'sat')
+        self.assertTrue(res.winner in ['default', 'case_split4'])
+        self.assertEqual(sorted(pf.wins.keys()), ['case_split4', 'default'])
+        self.assertEqual(pf.wins[res.winner], 1)
+
+        # no time to answer
+        pf = amnet.portfolio.Portfolio(timeout=0)
+        res = pf.check_encoder(self.enc)
+        self.assertEqual(res.result, 'unknown')
+        self.assertTrue(res.winner is None)
+        self.assertEqual(sum(pf.wins.values()), 0)
+
+    def test_worker_dies(self):
+        # workers that exit without answering do not block the query
+        def die(name, params, smt2, queue):
+            os._exit(1)
+
+        worker = amnet.portfolio._worker
+        amnet.portfolio._worker = die
+        try:
+            pf = amnet.portfolio.Portfolio(timeout=None)
+            res = pf.check_encoder(self.enc)
+        finally:
+            amnet.portfolio._worker = worker
+        self.assertEqual(res.result, 'unknown')
+        self.assertEqual(res.times, dict())
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestPortfolio)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
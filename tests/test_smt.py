@@ -3,6 +3,7 @@ import amnet
 import amnet.vis
 
 import z3
+from fractions import Fraction
 
 from numpy.linalg import norm
 
@@ -25,9 +26,9 @@ class TestSmt(unittest.TestCase):
         cls.floatvals3 = np.linspace(-5., 5., 3)
         cls.FPTOL = 1e-8
 
-    def validate_outputs(self, phi, onvals, true_f=None):
+    def validate_outputs(self, phi, onvals, true_f=None, domain=None, **kwargs):
         # encode phi using default context and solver
-        enc = amnet.smt.SmtEncoder(phi=phi, solver=None)
+        enc = amnet.smt.SmtEncoder(phi=phi, solver=None, domain=domain, **kwargs)
 
         # tap the input and output vars
         invar = enc.var_of_input()
@@ -37,7 +38,9 @@ class TestSmt(unittest.TestCase):
         self.assertEqual(phi.indim, len(invar))
         self.assertEqual(phi.outdim, len(outvar))
 
-        # go through inputs
+        # go through inputs (an exhausted iterator would check nothing)
+        onvals = list(onvals)
+        self.assertTrue(len(onvals) > 0)
         for val in onvals:
             # get a new value
             fpval = np.array(val)
@@ -72,6 +75,8 @@ class TestSmt(unittest.TestCase):
 
             enc.solver.pop()
 
+        return enc
+
     def donot_test_SmtEncoder_mu_big(self):
         xyz = amnet.Variable(3, name='xyz')
 
@@ -90,6 +95,150 @@ class TestSmt(unittest.TestCase):
             true_f=true_mu
         )
 
+    def test_NamingContext(self):
+        x = amnet.Variable(2, name='x')
+        y = amnet.Linear(np.eye(2), x)
+        z = amnet.Linear(-np.eye(2), x)
+        phi = amnet.atoms.add2(y, z)
+
+        ctx = amnet.smt.NamingContext(phi)
+        self.assertTrue(ctx.is_valid())
+        self.assertEqual(len(ctx.symbols), 5)
+        self.assertEqual(ctx.name_of(x), 'var0')
+        self.assertEqual(ctx.name_of_input(), 'var0')
+        self.assertEqual(sorted(ctx.prefix_names('lin')), ['lin0', 'lin1', 'lin2'])
+        self.assertEqual(ctx.next_unique_name('lin'), 'lin3')
+        self.assertEqual(ctx.next_unique_name('foo'), 'foo0')
+        self.assertTrue(ctx.name_of(amnet.Linear(np.eye(2), x)) is None)
+
+        # renaming keeps the reverse index in sync
+        ctx.rename(x, 'x')
+        self.assertTrue(ctx.is_valid())
+        self.assertEqual(ctx.name_of(x), 'x')
+        self.assertEqual(ctx.name_of_input(), 'x')
+        self.assertTrue('var0' not in ctx.symbols)
+
+        # renaming onto an existing name moves the existing symbol
+        yname = ctx.name_of(y)
+        ctx.rename(z, yname)
+        self.assertTrue(ctx.is_valid())
+        self.assertEqual(ctx.name_of(z), yname)
+        self.assertEqual(ctx.name_of(y), 'lin3')
+        self.assertEqual(ctx.next_unique_name('lin'), 'lin4')
+
+        # merging keeps names where possible
+        w = amnet.Linear(np.eye(2), phi)
+        ctx2 = amnet.smt.NamingContext(w)
+        ctx.merge_ctx(ctx2)
+        self.assertTrue(ctx.is_valid())
+        self.assertEqual(len(ctx.symbols), 6)
+        self.assertTrue(ctx.name_of(w) is not None)
+        self.assertTrue(ctx.only_one_input())
+
+    def test_NamingContext_wide(self):
+        # a wide network with ~20k nodes
+        n = 5000
+        x = amnet.Variable(n, name='x')
+        phi = amnet.atoms.from_list(
+            [amnet.atoms.relu(xi) for xi in amnet.atoms.to_list(x)]
+        )
+
+        ctx = amnet.smt.NamingContext(phi)
+        self.assertTrue(ctx.is_valid())
+        self.assertEqual(len(ctx.symbols), len(amnet.tree.postorder(phi)))
+        self.assertEqual(ctx.next_unique_name('mu'), 'mu%d' % n)
+
+        sg = ctx.signal_graph()
+        self.assertEqual(len(sg[ctx.name_of(phi)]), 2)
+
+    def test_SmtEncoder_inline_stacks(self):
+        xyz = amnet.Variable(6, name='xyz')
+        x = amnet.Linear(np.eye(2, 6, 0), xyz)
+        y = amnet.Linear(np.eye(2, 6, 2), xyz)
+        z = amnet.Linear(np.eye(2, 6, 4), xyz)
+        phi = amnet.atoms.from_list([
+            amnet.atoms.max_list([x, y, z]),
+            amnet.atoms.relu(x),
+            amnet.Constant(xyz, np.array([1., 2.]))
+        ])
+        nstacks = len([node for node in amnet.tree.postorder(phi)
+                       if isinstance(node, amnet.Stack)])
+        self.assertTrue(nstacks > 2)
+
+        def true_f(fpin):
+            return np.concatenate((
+                np.maximum(np.maximum(fpin[0:2], fpin[2:4]), fpin[4:6]),
+                np.maximum(fpin[0:2], 0),
+                [1, 2]
+            ))
+
+        def onvals():
+            return itertools.product([-1, 2], [0.5], [1], [-1.5, 3], [0], [-2, 2])
+
+        encs = [self.validate_outputs(phi=phi, onvals=onvals(), true_f=true_f,
+                                      strategies={amnet.Stack: strategy})
+                for strategy in ['inline', 'fresh']]
+
+        # inlining removes the Stack variables and their equalities
+        nvars = [len(set(str(t) for v in enc.vars.values() for t in v
+                         if not z3.is_rational_value(t)))
+                 for enc in encs]
+        nasserts = [len(enc.solver.assertions()) for enc in encs]
+        self.assertTrue(nvars[0] < nvars[1])
+        self.assertTrue(nasserts[0] < nasserts[1])
+
+        # inlined Stacks still have output terms
+        for node in amnet.tree.postorder(phi):
+            if isinstance(node, amnet.Stack):
+                self.assertEqual(len(encs[0].var_of(node)), node.outdim)
+
+    def test_SmtEncoder_strategies(self):
+        np.random.seed(1)
+        x = amnet.Variable(3, name='x')
+        y = amnet.Affine(np.random.randn(4, 3), x, np.random.randn(4))
+        phi = amnet.Linear(np.random.randn(2, 4), amnet.atoms.relu(y))
+        phi = amnet.atoms.from_list([phi, amnet.atoms.select(x, 0)])
+
+        def true_f(fpin):
+            return phi.eval(fpin)
+
+        onvals = list(itertools.product(self.floatvals3, repeat=3))
+        all_fresh = {amnet.Affine: 'fresh', amnet.Mu: 'fresh', amnet.Stack: 'fresh'}
+        auto = {amnet.Affine: 'auto', amnet.Stack: 'inline'}
+        all_inline = {amnet.Affine: 'inline', amnet.Mu: 'inline', amnet.Stack: 'inline'}
+        encs = [self.validate_outputs(phi=phi, onvals=onvals, true_f=true_f,
+                                      strategies=strategies)
+                for strategies in [all_fresh, auto, all_inline]]
+
+        # everything is fresh by default
+        enc = amnet.smt.SmtEncoder(phi)
+        self.assertTrue(all(isinstance(enc.ctx.symbols[name], amnet.Constant)
+                            for name in enc.inlined))
+        self.assertTrue(all(z3.is_const(v) for v in enc.var_of(phi)))
+
+        # inlining everything leaves only the input variables
+        self.assertEqual(set(encs[2].inlined), set(encs[2].ctx.symbols) - {'var0'})
+        nasserts = [len(enc.solver.assertions()) for enc in encs]
+        self.assertTrue(nasserts[0] > nasserts[1] > nasserts[2])
+        self.assertEqual(nasserts[2], 0)
+
+        # auto inlines the selectors, but not the dense layer
+        enc = encs[1]
+        self.assertEqual(enc.strategy_of(y), 'fresh')
+        self.assertEqual(enc.strategy_of(phi.y), 'inline')
+        self.assertEqual(enc.strategy_of(phi), 'inline')
+
+        # subclasses can override the strategy of their parents
+        enc = amnet.smt.SmtEncoder(phi, strategies={amnet.Affine: 'auto',
+                                                   amnet.Linear: 'fresh'})
+        self.assertEqual(enc.strategy_of(phi.y), 'fresh')
+        self.assertEqual(enc.strategy_of(y), 'fresh')
+
+        # the strategies work with bounds
+        self.validate_outputs(phi=phi, onvals=onvals, true_f=true_f,
+                              domain=(-5 * np.ones(3), 5 * np.ones(3)),
+                              strategies=all_inline)
+
     def test_SmtEncoder_mu_small(self):
         xyz = amnet.Variable(3, name='xyz')
 
@@ -108,6 +257,34 @@ class TestSmt(unittest.TestCase):
             true_f=true_mu
         )
 
+    def test_SmtEncoder_mu_elementwise(self):
+        xyz = amnet.Variable(6, name='xyz')
+        x = amnet.Linear(np.eye(2, 6, 0), xyz)
+        y = amnet.Linear(np.eye(2, 6, 2), xyz)
+        z = amnet.Linear(np.eye(2, 6, 4), xyz)
+        w = amnet.Mu(x, y, z)
+
+        def true_mu(fpin):
+            return np.where(fpin[4:6] <= 0, fpin[0:2], fpin[2:4])
+
+        self.validate_outputs(
+            phi=w,
+            onvals=itertools.product([-1.1, 0.5], [0, 1.2], [-1, 0.3],
+                                     [2], [-0.5, 0, 0.5], [0, 2]),
+            true_f=true_mu
+        )
+
+        # only the first component of z has a fixed sign on the domain
+        lo = np.array([-1, -1, -1, -1, 1, -1])
+        hi = np.array([1, 1, 1, 1, 2, 1])
+        enc = self.validate_outputs(
+            phi=w,
+            onvals=itertools.product([-1, 0.5], [0], [1], [0.5], [1.5], [-1, 0, 1]),
+            true_f=true_mu,
+            domain=(lo, hi)
+        )
+        self.assertEqual(enc.disjunctions_removed, 1)
+
     def test_SmtEncoder_max_all_2(self):
         xy = amnet.Variable(2, name='xy')
         phi_max2 = amnet.atoms.max_all(xy)
@@ -442,6 +619,141 @@ class TestSmt(unittest.TestCase):
             true_f=true_z
         )
 
+    def test_SmtEncoder_domain_relu(self):
+        x = amnet.Variable(3, name='x')
+        y = amnet.atoms.relu(x)
+
+        def true_relu(fpin):
+            return np.maximum(fpin, 0)
+
+        # every Mu is stable on the positive orthant
+        lo, hi = np.array([0.5, 1, 2]), np.array([5, 5, 5])
+        enc = self.validate_outputs(
+            phi=y,
+            onvals=itertools.product([2, 2.5, 5], repeat=y.indim),
+            true_f=true_relu,
+            domain=(lo, hi)
+        )
+        self.assertEqual(enc.disjunctions_removed, 3)
+
+        # the input is constrained to the domain
+        invar = enc.var_of_input()
+        enc.solver.push()
+        enc.solver.add(invar[0] <= 0)
+        self.assertEqual(enc.solver.check(), z3.unsat)
+        enc.solver.pop()
+
+        # nothing is stable across the origin
+        enc = self.validate_outputs(
+            phi=y,
+            onvals=itertools.product(self.floatvals3, repeat=y.indim),
+            true_f=true_relu,
+            domain=(-5 * np.ones(3), 5 * np.ones(3))
+        )
+        self.assertEqual(enc.disjunctions_removed, 0)
+
+    def test_SmtEncoder_values_of(self):
+        x = amnet.Variable(3, name='x')
+        h = amnet.Affine(np.array([[1, -1, 0], [0, 2, 1]]), x, np.array([0.5, -1]))
+        y = amnet.atoms.relu(h)
+
+        enc = amnet.smt.SmtEncoder(y)
+        xinp = np.array([1.5, -2, 0.25])
+        invar = enc.var_of_input()
+        enc.solver.add([invar[i] == xinp[i] for i in range(3)])
+        self.assertEqual(enc.solver.check(), z3.sat)
+        model = enc.solver.model()
+
+        self.assertTrue(np.allclose(enc.values_of(model, y), y.eval(xinp)))
+
+        xv, hv, yv = enc.values_of(model, [x, h, y])
+        self.assertTrue(np.array_equal(xv, xinp))
+        self.assertTrue(np.allclose(hv, h.eval(xinp)))
+        self.assertTrue(np.allclose(yv, y.eval(xinp)))
+
+        hq = enc.values_of(model, h, exact=True)
+        self.assertEqual(list(hq), [Fraction(4), Fraction(-19, 4)])
+
+    def test_SmtEncoder_domain_relu_net(self):
+        np.random.seed(1)
+
+        # random relu network, as built by tf_utils.relu_amn
+        dims = [3, 6, 4, 2]
+        x = amnet.Variable(dims[0], name='x')
+        phi = x
+        for m, n in zip(dims[:-1], dims[1:]):
+            phi = amnet.atoms.relu(amnet.Affine(
+                np.random.randn(n, m),
+                phi,
+                np.random.randn(n)
+            ))
+
+        # a small box around a point
+        x0 = np.random.randn(dims[0])
+        eps = 0.01
+        lo, hi = x0 - eps, x0 + eps
+        onvals = [lo, hi, x0] + \
+                 [lo + 2 * eps * np.random.rand(dims[0]) for _ in range(10)]
+
+        enc = self.validate_outputs(phi=phi, onvals=onvals, domain=(lo, hi))
+        self.assertTrue(enc.disjunctions_removed > 0)
+
+        # using precomputed bounds gives the same elimination
+        bounds = amnet.bounds.interval_bounds(phi, lo, hi)
+        enc2 = amnet.smt.SmtEncoder(phi, bounds=bounds)
+        self.assertEqual(enc2.disjunctions_removed, enc.disjunctions_removed)
+
+    def test_SmtEncoder_max_aff(self):
+        x = amnet.Variable(2, name='x')
+        A = np.array([[1, 1], [1, -1], [-1, 1], [-1, -1]])
+        b = np.array([0, 0, 0, -1])
+        phi = amnet.atoms.max_aff(A, b, x)
+        self.assertTrue(isinstance(phi, amnet.Max))
+
+        def true_max_aff(fpin):
+            return np.max(np.dot(A, fpin) + b)
+
+        self.validate_outputs(
+            phi=phi,
+            onvals=itertools.product(self.floatvals2, repeat=phi.indim),
+            true_f=true_max_aff
+        )
+
+        # on the positive orthant, the first row attains the maximum
+        enc = self.validate_outputs(
+            phi=phi,
+            onvals=itertools.product([1, 1.5, 2], repeat=phi.indim),
+            true_f=true_max_aff,
+            domain=(np.array([1, 1]), np.array([2, 2]))
+        )
+        self.assertEqual(enc.disjunctions_removed, 1)
+
+    def test_SmtEncoder_max_min_list(self):
+        xyz = amnet.Variable(6, name='xyz')
+        x = amnet.Linear(np.eye(2, 6, 0), xyz)
+        y = amnet.Linear(np.eye(2, 6, 2), xyz)
+        z = amnet.Linear(np.eye(2, 6, 4), xyz)
+        phi_max = amnet.atoms.max_list([x, y, z])
+        phi_min = amnet.atoms.min_list([x, y, z])
+
+        def true_max(fpin):
+            return np.maximum(np.maximum(fpin[0:2], fpin[2:4]), fpin[4:6])
+
+        def true_min(fpin):
+            return np.minimum(np.minimum(fpin[0:2], fpin[2:4]), fpin[4:6])
+
+        self.validate_outputs(
+            phi=phi_max,
+            onvals=itertools.product(self.floatvals3, repeat=phi_max.indim),
+            true_f=true_max
+        )
+        self.validate_outputs(
+            phi=phi_min,
+            onvals=itertools.product(self.floatvals3, repeat=phi_min.indim),
+            true_f=true_min
+        )
+
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestSmt)
     result = unittest.TextTestRunner(verbosity=2).run(suite)
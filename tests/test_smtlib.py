@@ -0,0 +1,114 @@
+import numpy as np
+import amnet
+import amnet.smtlib
+from amnet.smtlib import var_names
+
+import z3
+
+import sys
+import unittest
+from StringIO import StringIO
+
+
+class TestSmtlib(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-6
+
+    def solver_for(self, smt2):
+        solver = z3.Solver()
+        solver.from_string(smt2)
+        return solver
+
+    def model_values(self, solver, names):
+        model = solver.model()
+        return np.array([amnet.util.mfp(model, z3.Real(v)) for v in names])
+
+    def validate_outputs(self, phi, inputs, **kwargs):
+        # fixing the input forces the output to phi.eval(input)
+        f = StringIO()
+        ctx = amnet.smtlib.write_smt2(phi, f, check_sat=False, **kwargs)
+        smt2 = f.getvalue()
+        xnames = var_names(ctx, ctx.symbols[ctx.name_of_input()])
+        ynames = var_names(ctx, phi)
+
+        for inp in inputs:
+            fixed = ''.join('(assert (= %s %s))\n' % (v, amnet.smtlib._num(xi))
+                            for v, xi in zip(xnames, inp))
+            solver = self.solver_for(smt2 + fixed)
+            self.assertEqual(solver.check(), z3.sat)
+            self.assertTrue(np.allclose(self.model_values(solver, ynames), phi.eval(inp)))
+
+    def test_num(self):
+        num = amnet.smtlib._num
+        self.assertEqual(num(3), '3.0')
+        self.assertEqual(num(-2.0), '(- 2.0)')
+        self.assertEqual(num(0.1), '(/ 1.0 10.0)')
+        self.assertEqual(num(-1.5e-5), '(- (/ 3.0 200000.0))')
+        self.assertEqual(num(np.float64(0.25)), '(/ 1.0 4.0)')
+
+    def test_write_atoms(self):
+        x = amnet.Variable(3, name='x')
+        inputs = [np.array(xi) for xi in [[1, -2, 3], [0, 0, 0], [-1.5, 2.5, -0.5]]]
+
+        self.validate_outputs(amnet.atoms.relu(x), inputs)
+        self.validate_outputs(amnet.atoms.max_all(x), inputs)
+        self.validate_outputs(amnet.atoms.min_all(x), inputs)
+        self.validate_outputs(amnet.Stack(amnet.atoms.max_all(x),
+                                          amnet.Constant(x, np.array([1, -0.5]))), inputs)
+
+        # an elementwise selector
+        w = np.array([[1, -1, 0], [0, 1, 1], [1, 0, -1]])
+        phi = amnet.Mu(x, amnet.Linear(w, x), amnet.Affine(w, x, np.array([0.5, 0, -1])))
+        self.validate_outputs(phi, inputs)
+
+    def test_write_relu_net(self):
+        np.random.seed(4)
+        x = amnet.Variable(3, name='x')
+        phi = x
+        for m, n in [(3, 6), (6, 4), (4, 2)]:
+            phi = amnet.atoms.relu(amnet.Affine(np.random.randn(n, m), phi, np.random.randn(n)))
+
+        lo, hi = -np.ones(3), np.ones(3)
+        inputs = [lo + (hi - lo) * np.random.rand(3) for _ in range(5)]
+        self.validate_outputs(phi, inputs)
+        self.validate_outputs(phi, inputs, domain=(lo, hi))
+
+        # the benchmark agrees with SmtEncoder on a property
+        bounds = amnet.bounds.symbolic_bounds(phi, lo, hi)
+        ylo, yhi = bounds[phi]
+        for b0 in [ylo[0] - 1, 0.5 * (ylo[0] + yhi[0]), yhi[0] + 1]:
+            A, b = np.array([[1, 0]]), np.array([b0])
+            ctx = amnet.smt.NamingContext(phi)
+            smt2 = amnet.smtlib.to_smt2(phi, ctx=ctx, domain=(lo, hi), halfspaces=(A, b))
+            solver = self.solver_for(smt2)
+            result = solver.check()
+
+            sess = amnet.verify.Session(phi, domain=(lo, hi))
+            xc = sess.check_output_halfspaces(A, b)
+            self.assertEqual(result == z3.sat, xc is not None)
+
+            if result == z3.sat:
+                xm = self.model_values(solver, var_names(ctx, ctx.symbols[ctx.name_of_input()]))
+                self.assertTrue(np.all(xm >= lo - self.FPTOL) and np.all(xm <= hi + self.FPTOL))
+                self.assertTrue(phi.eval(xm)[0] > b0 - self.FPTOL)
+
+    def test_names(self):
+        # the names agree with those of SmtEncoder
+        x = amnet.Variable(2, name='x')
+        phi = amnet.atoms.relu(amnet.Linear(np.array([[1, -1], [1, 1]]), x))
+        ctx = amnet.smt.NamingContext(phi)
+        enc = amnet.smt.SmtEncoder(ctx=ctx)
+        self.assertEqual(var_names(ctx, phi), [str(v) for v in enc.var_of(phi)])
+        self.assertEqual(var_names(ctx, x), [str(v) for v in enc.var_of_input()])
+
+        smt2 = amnet.smtlib.to_smt2(phi, ctx=ctx, assertions=['(>= %s 1.0)' % var_names(ctx, phi)[0]],
+                                    get_model=True)
+        self.assertTrue(smt2.startswith('(set-logic QF_LRA)\n'))
+        self.assertTrue(smt2.endswith('(check-sat)\n(get-model)\n'))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSmtlib)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
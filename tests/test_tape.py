@@ -0,0 +1,96 @@
+import numpy as np
+import amnet
+
+import sys
+import unittest
+
+from numpy.linalg import norm
+
+
+class TestTape(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        np.random.seed(1)
+        cls.FPTOL = 1e-8
+
+    def validate_batch(self, phi, inps):
+        tape = amnet.tape.compile(phi)
+
+        # batched evaluation
+        outs = tape.eval(inps)
+        self.assertEqual(outs.shape, (len(inps), phi.outdim))
+
+        # compare row-by-row against the tree evaluation
+        for inp, out in zip(inps, outs):
+            self.assertAlmostEqual(norm(phi.eval(inp) - out), 0)
+            self.assertAlmostEqual(norm(tape.eval(inp) - out), 0)
+
+    def test_tape_max_min(self):
+        x = amnet.Variable(4, name='x')
+        inps = 5 * (2 * np.random.rand(200, 4) - 1)
+
+        self.validate_batch(amnet.atoms.max_all(x), inps)
+        self.validate_batch(amnet.atoms.min_all(x), inps)
+        self.validate_batch(amnet.atoms.relu(x), inps)
+
+    def test_tape_mu_elementwise(self):
+        x = amnet.Variable(3, name='x')
+        y = amnet.Affine(np.random.rand(3, 3), x, np.random.rand(3))
+        inps = 2 * np.random.rand(200, 3) - 1
+
+        self.validate_batch(amnet.Mu(x, y, amnet.atoms.sub2(y, x)), inps)
+        self.validate_batch(amnet.atoms.min2(x, y), inps)
+
+    def test_tape_triplexer(self):
+        x = amnet.Variable(1, name='x')
+        a, b, c, d, e, f = [3 * (2 * np.random.rand(4) - 1) for _ in range(6)]
+        phi_tri = amnet.atoms.triplexer(x, a, b, c, d, e, f)
+
+        inps = 50 * (2 * np.random.rand(100, 1) - 1)
+        self.validate_batch(phi_tri, inps)
+
+    def test_tape_dag(self):
+        xyz = amnet.Variable(3, name='xyz')
+        x = amnet.atoms.select(xyz, 0)
+        yz = amnet.Linear(np.array([[0, 1, 0], [0, 0, 1]]), xyz)
+        twox = amnet.atoms.add2(x, x)
+        phi = amnet.atoms.add2(
+            amnet.Affine(np.array([[2]]), twox, np.array([1])),
+            amnet.atoms.max_all(yz)
+        )
+        # shared Stack used twice
+        phi2 = amnet.Stack(phi, amnet.atoms.neg(phi))
+
+        inps = 5 * (2 * np.random.rand(100, 3) - 1)
+        self.validate_batch(phi, inps)
+        self.validate_batch(phi2, inps)
+
+    def test_tape_constant(self):
+        x = amnet.Variable(2, name='x')
+        c = amnet.Constant(x, np.array([1., -2., 3.]))
+        phi = amnet.Stack(c, amnet.atoms.identity(c))
+
+        inps = np.random.rand(10, 2)
+        self.validate_batch(c, inps)
+        self.validate_batch(phi, inps)
+
+    def test_tape_relu_net(self):
+        # random 3-layer relu network, as built by tf_utils.relu_amn
+        dims = [6, 5, 4, 3]
+        x = amnet.Variable(dims[0], name='x')
+        phi = x
+        for m, n in zip(dims[:-1], dims[1:]):
+            phi = amnet.atoms.relu(amnet.Affine(
+                np.random.randn(n, m),
+                phi,
+                np.random.randn(n)
+            ))
+
+        inps = 3 * np.random.randn(300, dims[0])
+        self.validate_batch(phi, inps)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTape)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
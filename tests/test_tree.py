@@ -0,0 +1,251 @@
+import numpy as np
+import amnet
+import amnet.vis
+from helpers import random_relu_net
+
+import sys
+import unittest
+
+from numpy.linalg import norm
+from amnet.tree import postorder
+
+
+class TestTree(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-8
+
+    def validate_equivalent(self, phi, psi, samples=100):
+        self.assertEqual(phi.indim, psi.indim)
+        self.assertEqual(phi.outdim, psi.outdim)
+        for _ in range(samples):
+            inp = 5 * np.random.randn(phi.indim)
+            self.assertAlmostEqual(norm(phi.eval(inp) - psi.eval(inp)), 0)
+
+    def test_postorder(self):
+        x = amnet.Variable(2, name='x')
+        x0 = amnet.atoms.select(x, 0)
+        x1 = amnet.atoms.select(x, 1)
+        phi = amnet.Mu(x0, x1, amnet.atoms.sub2(x1, x0))
+
+        order = postorder(phi)
+        self.assertTrue(order[-1] is phi)
+        self.assertTrue(order[0] is x)
+
+        # every node appears once, after all of its children
+        self.assertEqual(len(set(id(n) for n in order)), len(order))
+        pos = dict((id(n), i) for i, n in enumerate(order))
+        for node in order:
+            for child in amnet.tree.children(node):
+                self.assertTrue(pos[id(child)] < pos[id(node)])
+
+        # deep graphs do not hit the recursion limit
+        psi = x0
+        for _ in range(5000):
+            psi = amnet.atoms.neg(psi)
+        self.assertEqual(len(postorder(psi)), 5002)
+
+    def test_deep_chain(self):
+        # a left-deep chain of sums, well beyond the recursion limit
+        n = 2000
+        x = amnet.Variable(n, name='x')
+        xs = amnet.atoms.to_list(x)
+        phi = amnet.util.foldl(amnet.atoms.add2, xs[0], xs[1:])
+        self.assertTrue(n > sys.getrecursionlimit())
+
+        order = postorder(phi)
+        self.assertEqual(len(order), 1 + n + 2 * (n - 1))
+
+        # eval
+        inp = np.random.randn(n)
+        self.assertAlmostEqual(phi.eval(inp)[0], np.sum(inp))
+
+        # naming and encoding
+        enc = amnet.smt.SmtEncoder(phi)
+        self.assertEqual(len(enc.ctx.symbols), len(order))
+        self.assertEqual(enc.ctx.name_of(phi), 'lin0')
+        self.assertEqual(enc.ctx.name_of(x), 'var0')
+
+        # visualization
+        dot = amnet.vis.amn2gv(phi, ctx=enc.ctx)
+        self.assertTrue('lin0' in dot.source)
+
+    def test_simplify_identity(self):
+        x = amnet.Variable(2, name='x')
+        y = amnet.Affine(np.array([[1, 2], [3, 4]]), x, np.array([1, -1]))
+        z = amnet.atoms.identity(amnet.atoms.identity(y))
+
+        zs = amnet.tree.simplify(z)
+        self.assertTrue(isinstance(zs, amnet.Affine))
+        self.assertTrue(zs.x is x)
+        self.assertEqual(len(postorder(zs)), 2)
+        self.validate_equivalent(z, zs)
+
+        # identity of the variable is the variable
+        self.assertTrue(amnet.tree.simplify(amnet.atoms.identity(x)) is x)
+
+    def test_simplify_affine_chain(self):
+        np.random.seed(1)
+        x = amnet.Variable(3, name='x')
+        phi = x
+        for _ in range(5):
+            phi = amnet.Affine(np.random.randn(3, 3), phi, np.random.randn(3))
+
+        phis = amnet.tree.simplify(phi)
+        self.assertEqual(len(postorder(phis)), 2)
+        self.validate_equivalent(phi, phis)
+
+        # the original is unchanged
+        self.assertEqual(len(postorder(phi)), 6)
+
+    def test_simplify_stack(self):
+        np.random.seed(1)
+        x = amnet.Variable(3, name='x')
+        y = amnet.Affine(np.random.randn(4, 3), x, np.random.randn(4))
+
+        # to_list/from_list round trip collapses to a single Affine
+        ys = amnet.tree.simplify(amnet.atoms.from_list(amnet.atoms.to_list(y)))
+        self.assertTrue(isinstance(ys, amnet.Affine))
+        self.assertTrue(ys.x is x)
+        self.validate_equivalent(y, ys)
+
+        # selecting from a Stack skips the Stack
+        m = amnet.atoms.max_all(x)
+        st = amnet.Stack(m, y)
+        phi = amnet.atoms.select(st, 0)
+        phis = amnet.tree.simplify(phi)
+        self.assertTrue(isinstance(phis, amnet.Max))
+        self.validate_equivalent(phi, phis)
+
+    def test_simplify_constant_selector(self):
+        x = amnet.Variable(2, name='x')
+        x0 = amnet.atoms.select(x, 0)
+        x1 = amnet.atoms.select(x, 1)
+
+        phi_x = amnet.Mu(x0, x1, amnet.Constant(x, np.array([-1.])))
+        phi_y = amnet.Mu(x0, x1, amnet.Constant(x, np.array([1.])))
+        self.validate_equivalent(phi_x, amnet.tree.simplify(phi_x))
+        self.validate_equivalent(phi_y, amnet.tree.simplify(phi_y))
+        self.assertEqual(len(postorder(amnet.tree.simplify(phi_x))), 2)
+        self.assertEqual(len(postorder(amnet.tree.simplify(phi_y))), 2)
+
+        # relu of a constant is a constant
+        c = amnet.Constant(x, np.array([-1., 2.]))
+        phi = amnet.atoms.relu(c)
+        phis = amnet.tree.simplify(phi)
+        self.assertTrue(isinstance(phis, amnet.Constant))
+        self.validate_equivalent(phi, phis)
+
+    def test_simplify_atoms(self):
+        np.random.seed(1)
+        x = amnet.Variable(4, name='x')
+        y = amnet.Affine(np.random.randn(3, 4), x, np.random.randn(3))
+        z = amnet.atoms.select(y, 2)
+
+        a, b, c, d, e, f = [3 * (2 * np.random.rand(4) - 1) for _ in range(6)]
+        phis = [amnet.atoms.max_all(y),
+                amnet.atoms.min_all(y),
+                amnet.atoms.add_all(y),
+                amnet.atoms.max2(y, amnet.atoms.neg(y)),
+                amnet.atoms.gate_xor(y, amnet.atoms.neg(y), z, amnet.atoms.neg(z)),
+                amnet.atoms.cmp_eq(y, amnet.atoms.neg(y), z),
+                amnet.atoms.triplexer(z, a, b, c, d, e, f),
+                random_relu_net([4, 5, 6, 3])]
+
+        for phi in phis:
+            psi = amnet.tree.simplify(phi)
+            self.assertTrue(len(postorder(psi)) <= len(postorder(phi)))
+            self.validate_equivalent(phi, psi)
+
+    def test_simplify_shared(self):
+        x = amnet.Variable(2, name='x')
+        m = amnet.atoms.max_all(x)
+        y = amnet.atoms.identity(m)
+
+        # y is used twice, and must remain shared
+        phi = amnet.atoms.add2(y, amnet.atoms.neg(y))
+        phis = amnet.tree.simplify(phi)
+        self.validate_equivalent(phi, phis)
+
+        # y - y is identically zero
+        self.assertTrue(isinstance(phis, amnet.Constant))
+
+        phi = amnet.Stack(y, amnet.atoms.max2(y, amnet.atoms.neg(y)))
+        phis = amnet.tree.simplify(phi)
+        self.validate_equivalent(phi, phis)
+
+        mus = [n for n in postorder(phis) if isinstance(n, amnet.Mu)]
+        maxs = [n for n in postorder(phis) if isinstance(n, amnet.Max)]
+        self.assertEqual(len(mus), 1)
+        self.assertEqual(len(maxs), 1)
+
+    def test_interner_make(self):
+        itn = amnet.tree.Interner()
+        x = amnet.Variable(3, name='x')
+
+        x0 = itn.make(amnet.Linear, np.eye(1, 3, 0), x)
+        x0b = itn.make(amnet.Linear, np.eye(1, 3, 0), x)
+        x1 = itn.make(amnet.Linear, np.eye(1, 3, 1), x)
+        self.assertTrue(x0 is x0b)
+        self.assertTrue(x0 is not x1)
+
+        # same weights, different type
+        a0 = itn.make(amnet.Affine, np.eye(1, 3, 0), x, np.zeros(1))
+        self.assertTrue(a0 is not x0)
+
+        m = itn.make(amnet.Mu, x0, x1, x0)
+        self.assertTrue(itn.make(amnet.Mu, x0, x1, x0) is m)
+        self.assertTrue(itn.make(amnet.Mu, x1, x0, x0) is not m)
+        self.assertEqual(len(itn), 5)
+
+        # variables are never merged
+        y = amnet.Variable(3, name='x')
+        self.assertTrue(itn.intern(y) is y)
+
+    def test_hashcons(self):
+        np.random.seed(1)
+        x = amnet.Variable(6, name='x')
+        y = amnet.Linear(np.eye(3, 6, 0), x)
+        z = amnet.Linear(np.eye(3, 6, 3), x)
+
+        # max2 and min2 each select every component of y and z
+        phi = amnet.Stack(amnet.atoms.max2(y, z), amnet.atoms.min2(y, z))
+        psi = amnet.tree.hashcons(phi)
+        self.validate_equivalent(phi, psi)
+        self.assertTrue(len(postorder(psi)) < len(postorder(phi)))
+
+        # interning is idempotent
+        self.assertEqual(len(postorder(amnet.tree.hashcons(psi))),
+                         len(postorder(psi)))
+
+        # the encodings agree
+        enc = amnet.smt.SmtEncoder(psi)
+        self.assertEqual(len(enc.ctx.symbols), len(postorder(psi)))
+
+    def test_fingerprint(self):
+        w, b = np.array([[1, -2], [3, 0.5]]), np.array([0.1, -1])
+        x = amnet.Variable(2, name='x')
+        fp = amnet.tree.fingerprint(amnet.atoms.relu(amnet.Affine(w, x, b)))
+
+        # names and node identities do not matter
+        y = amnet.Variable(2, name='y')
+        phi2 = amnet.atoms.relu(amnet.Affine(w, y, b))
+        self.assertEqual(amnet.tree.fingerprint(phi2), fp)
+
+        # weights do
+        phi3 = amnet.atoms.relu(amnet.Affine(w, y, b + 1e-9))
+        self.assertNotEqual(amnet.tree.fingerprint(phi3), fp)
+
+        # and so does sharing
+        a1 = amnet.Linear(np.eye(2), x)
+        a2 = amnet.Linear(np.eye(2), x)
+        shared = amnet.Stack(a1, a1)
+        unshared = amnet.Stack(a1, a2)
+        self.assertTrue(np.allclose(shared.eval([1, 2]), unshared.eval([1, 2])))
+        self.assertNotEqual(amnet.tree.fingerprint(shared), amnet.tree.fingerprint(unshared))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTree)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,101 @@
+import numpy as np
+import amnet
+from amnet.util import foldl, foldr, foldt, mfp, model_values
+
+import z3
+from fractions import Fraction
+
+import sys
+import unittest
+
+
+class TestUtil(unittest.TestCase):
+    def test_folds(self):
+        def cons(x, y):
+            return '(%s %s)' % (x, y)
+
+        xs = ['a', 'b', 'c', 'd', 'e']
+        self.assertEqual(foldl(cons, xs[0], xs[1:]), '((((a b) c) d) e)')
+        self.assertEqual(foldr(cons, xs[-1], xs[:-1]), '(a (b (c (d e))))')
+        self.assertEqual(foldt(cons, xs), '(((a b) (c d)) e)')
+
+        self.assertEqual(foldl(cons, 'z', []), 'z')
+        self.assertEqual(foldr(cons, 'z', []), 'z')
+        self.assertEqual(foldt(cons, ['z']), 'z')
+
+        # folds accept any sequence
+        self.assertEqual(foldl(cons, 'z', ('a', 'b')), '((z a) b)')
+        self.assertEqual(foldr(cons, 'z', ('a', 'b')), '(a (b z))')
+
+    def test_folds_long(self):
+        # well beyond the default recursion limit
+        n = 20000
+        xs = range(n)
+        total = n * (n - 1) // 2
+
+        def add(x, y):
+            return x + y
+
+        self.assertEqual(foldl(add, 0, xs), total)
+        self.assertEqual(foldr(add, 0, xs), total)
+        self.assertEqual(foldt(add, xs), total)
+
+    def test_folds_amn(self):
+        # long chains of Amn nodes can be built without recursion
+        x = amnet.Variable(2000, name='x')
+        xs = amnet.atoms.to_list(x)
+
+        phi = foldl(amnet.atoms.add2, xs[0], xs[1:])
+        self.assertEqual(phi.outdim, 1)
+
+        xinp = np.random.rand(2000)
+        tape = amnet.tape.compile(phi)
+        self.assertAlmostEqual(tape.eval(xinp)[0], np.sum(xinp))
+
+    def test_model_values(self):
+        m, n = 3, 4
+        Avar = [z3.RealVector('A%d' % i, n) for i in range(m)]
+        bvar = z3.RealVector('b', m)
+        unused = z3.Real('unused')
+
+        solver = z3.Solver()
+        for i in range(m):
+            solver.add(bvar[i] == z3.Q(1, 3) * i)
+            for j in range(n):
+                solver.add(Avar[i][j] == -i + 0.25 * j)
+        self.assertEqual(solver.check(), z3.sat)
+        model = solver.model()
+
+        # vectors and lists of vectors
+        b = model_values(model, bvar)
+        self.assertEqual(b.shape, (m,))
+        self.assertTrue(np.allclose(b, [0, 1/3., 2/3.]))
+        self.assertTrue(np.allclose(b, [mfp(model, bi) for bi in bvar]))
+
+        A = model_values(model, Avar)
+        self.assertEqual(A.shape, (m, n))
+        self.assertTrue(np.array_equal(A, -np.arange(m)[:, None] + 0.25 * np.arange(n)))
+
+        # exact rationals
+        bq = model_values(model, bvar, exact=True)
+        self.assertEqual(bq.dtype, object)
+        self.assertEqual(list(bq), [Fraction(0), Fraction(1, 3), Fraction(2, 3)])
+        self.assertEqual(model_values(model, Avar, exact=True)[2, 1], Fraction(-7, 4))
+
+        # terms, and constants that are not in the model
+        self.assertTrue(np.allclose(model_values(model, [bvar[1] + bvar[2], unused]), [1, 0]))
+        self.assertEqual(model_values(model, []).shape, (0,))
+
+        # irrational values are approximated
+        r = z3.Real('r')
+        solver = z3.Solver()
+        solver.add(r * r == 2, r > 0)
+        self.assertEqual(solver.check(), z3.sat)
+        self.assertAlmostEqual(model_values(solver.model(), [r])[0], np.sqrt(2))
+        self.assertAlmostEqual(float(model_values(solver.model(), [r], exact=True)[0]), np.sqrt(2))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestUtil)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,252 @@
+import numpy as np
+import amnet
+from amnet import tf_utils
+
+import sys
+import unittest
+
+
+class TestVerify(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.FPTOL = 1e-6
+
+    def setUp(self):
+        # relu of a 2-by-2 rotation-like map
+        self.x = amnet.Variable(2, name='x')
+        self.w = np.array([[1, -1], [1, 1]])
+        self.phi = amnet.atoms.relu(amnet.Linear(self.w, self.x))
+        self.lo, self.hi = -np.ones(2), np.ones(2)
+
+    def test_output_bounds(self):
+        sess = amnet.verify.Session(self.phi, domain=(self.lo, self.hi))
+
+        # outputs are in [0, 2]
+        self.assertTrue(sess.check_output_bounds([0, 0], [2, 2]) is None)
+        self.assertTrue(sess.check_output_bounds([-np.inf, 0], [2, np.inf]) is None)
+
+        xc = sess.check_output_bounds([0, 0], [2, 1.5])
+        self.assertTrue(xc is not None)
+        self.assertTrue(np.all(xc >= self.lo - self.FPTOL) and np.all(xc <= self.hi + self.FPTOL))
+        self.assertTrue(self.phi.eval(xc)[1] > 1.5 - self.FPTOL)
+
+        # nothing to check
+        self.assertTrue(sess.check_output_bounds([-np.inf] * 2, [np.inf] * 2) is None)
+
+        # y0 + y1 <= 2 * max(|x0|, |x1|) <= 2
+        self.assertTrue(sess.check_output_halfspaces([[1, 1]], [2]) is None)
+        xc = sess.check_output_halfspaces([[1, 1], [1, 0]], [1.5, 2])
+        self.assertTrue(xc is not None)
+        self.assertTrue(np.sum(self.phi.eval(xc)) > 1.5 - self.FPTOL)
+
+    def test_implication(self):
+        sess = amnet.verify.Session(self.phi, domain=(self.lo, self.hi))
+
+        # x0 <= x1 implies y0 == 0
+        A_in, b_in = [[1, -1]], [0]
+        self.assertTrue(sess.check_implication(A_in, b_in, [[1, 0]], [0]) is None)
+
+        # but not y1 == 0
+        xc = sess.check_implication(A_in, b_in, [[0, 1]], [0])
+        self.assertTrue(xc is not None)
+        self.assertTrue(xc[0] <= xc[1] + self.FPTOL)
+        self.assertTrue(self.phi.eval(xc)[1] > 0)
+
+    def test_lyapunov(self):
+        # stable diagonal system, with V(x) = ||x||_inf
+        xsys = amnet.Variable(2, name='xsys')
+        phi = amnet.Linear(np.diag([0.5, 0.8]), xsys)
+        A = np.array([[1, 0], [-1, 0], [0, 1], [0, -1]])
+        b = np.zeros(4)
+
+        sess = amnet.verify.Session(phi)
+        self.assertTrue(sess.check_lyapunov_positive(A, b) is None)
+        self.assertTrue(sess.check_lyapunov_decrease(A, b) is None)
+
+        # V(x) = x0 - x1 is not positive definite
+        xc = sess.check_lyapunov_positive(A[[0, 3]], b[:2])
+        self.assertTrue(xc is not None)
+        self.assertAlmostEqual(np.sum(np.abs(xc)), 1)
+        self.assertTrue(np.max(np.dot(A[[0, 3]], xc)) <= self.FPTOL)
+
+        # the decrease rate of x1 is 0.8
+        xc = sess.check_lyapunov_decrease(A, b, rate=0.7)
+        self.assertTrue(xc is not None)
+        v0 = np.max(np.dot(A, xc))
+        v1 = np.max(np.dot(A, phi.eval(xc)))
+        self.assertTrue(v1 > 0.7 * v0 - self.FPTOL)
+
+        # lyap reuses the session
+        self.assertTrue(amnet.lyap.find_local_counterexample(phi, xsys, A, b, session=sess) is None)
+
+    def test_reuse(self):
+        sess = amnet.verify.Session(self.phi, domain=(self.lo, self.hi))
+        nasserts = len(sess.solver.assertions())
+
+        for k in range(5):
+            ub = 0.5 * k
+            xc = sess.check_output_bounds([0, 0], [ub, np.inf])
+            self.assertEqual(xc is None, ub >= 2)
+
+        # queries leave the encoding untouched
+        self.assertEqual(len(sess.solver.assertions()), nasserts)
+
+        # one timing for the encoding and one per query
+        self.assertEqual(len(sess.timings), 6)
+        self.assertEqual(sess.timings[0][0], 'encode')
+        self.assertEqual([r for _, r, _ in sess.timings[1:]], ['sat'] * 4 + ['unsat'])
+        self.assertTrue(all(t >= 0 for _, _, t in sess.timings))
+        self.assertAlmostEqual(sess.total_time(), sum(t for _, _, t in sess.timings))
+        self.assertEqual(len(sess.report().split('\n')), 8)
+
+        # find returns both the input and the output
+        xc, yc = sess.find([sess.y[0] >= 1])
+        self.assertTrue(np.allclose(self.phi.eval(xc), yc))
+        self.assertTrue(yc[0] >= 1 - self.FPTOL)
+
+
+    def test_verify_robust(self):
+        # a relu classifier, and an input with a clear label
+        np.random.seed(7)
+        dims = [4, 8, 3]
+        weights = [np.random.randn(m, n) for m, n in zip(dims[:-1], dims[1:])]
+        biases = [np.random.randn(n) for n in dims[1:]]
+        phi = tf_utils.relu_amn(weights, biases)
+
+        x0 = np.random.randn(4)
+        y0 = phi.eval(x0)
+        label = int(np.argmax(y0))
+        self.assertTrue(np.sort(y0)[-1] > np.sort(y0)[-2])
+
+        # a single point is decided by the bounds
+        res = amnet.verify.verify_robust(phi, x0, 0, label)
+        self.assertTrue(res.robust)
+        self.assertEqual(res.tier, 'bounds')
+        self.assertEqual([t for t, _ in res.times], ['sampling', 'bounds'])
+
+        # another label is refuted by sampling
+        res = amnet.verify.verify_robust(phi, x0, 0.01, (label + 1) % 3)
+        self.assertFalse(res.robust)
+        self.assertEqual(res.tier, 'sampling')
+        self.assertEqual(len(res.times), 1)
+
+        # a large ball changes the label, and the counterexample is in it
+        res = amnet.verify.verify_robust(phi, x0, 10, label)
+        self.assertFalse(res.robust)
+        xc = res.counterexample
+        self.assertTrue(np.all(np.abs(xc - x0) <= 10 + self.FPTOL))
+        self.assertTrue(np.max(np.delete(phi.eval(xc), label)) > phi.eval(xc)[label] - self.FPTOL)
+
+        # clipping keeps the ball inside the box
+        res = amnet.verify.verify_robust(phi, x0, 10, label, clip=(x0 - 0.01, x0 + 0.01))
+        self.assertTrue(res.robust)
+
+    def test_verify_robust_smt(self):
+        # y1 - y0 = -0.1 everywhere, but the bounds on y0 and y1 are
+        # relaxed independently, so only smt can prove it
+        x = amnet.Variable(1, name='x')
+        r = amnet.atoms.relu(amnet.Linear(np.array([[1], [-1]]), x))
+        phi = amnet.Affine(np.ones((2, 2)), r, np.array([0, -0.1]))
+
+        # the node bounds are computed once, for both the bounds and smt tiers
+        calls = []
+        linear_bounds = amnet.bounds.linear_bounds
+
+        def counted(*args):
+            calls.append(args)
+            return linear_bounds(*args)
+
+        amnet.bounds.linear_bounds = counted
+        try:
+            res = amnet.verify.verify_robust(phi, [0], 1, 0)
+        finally:
+            amnet.bounds.linear_bounds = linear_bounds
+        self.assertEqual(len(calls), 1)
+
+        self.assertTrue(res.robust)
+        self.assertEqual(res.tier, 'smt')
+        self.assertEqual([t for t, _ in res.times], ['sampling', 'bounds', 'smt'])
+        self.assertTrue(str(res).startswith('robust (decided by smt'))
+
+        # y1 = sum(relu(x)) exceeds y0 = 1 only away from x0 = 0,
+        # where no sample (only x0, as there are too many corners) lands
+        n = amnet.verify.MAX_CORNER_DIM + 2
+        x = amnet.Variable(n, name='x')
+        phi = amnet.Stack(amnet.Constant(x, np.ones(1)),
+                          amnet.Linear(np.ones((1, n)), amnet.atoms.relu(x)))
+
+        res = amnet.verify.verify_robust(phi, np.zeros(n), 0.5, 0, nsamples=0)
+        self.assertFalse(res.robust)
+        self.assertEqual(res.tier, 'smt')
+        self.assertTrue(phi.eval(res.counterexample)[1] > 1 - self.FPTOL)
+
+    def validate_output_range(self, phi, lo, hi, k, attained=True):
+        results = [amnet.verify.output_range(phi, (lo, hi), k, method='optimize'),
+                   amnet.verify.output_range(phi, (lo, hi), k, method='bisect', tol=1e-4),
+                   amnet.verify.output_range(phi, (lo, hi), k, method='milp')]
+
+        X = lo + (hi - lo) * np.random.rand(200, len(lo))
+        Y = amnet.tape.compile(phi).eval(X)[:, k]
+
+        for res in results:
+            # no sample is outside the range
+            self.assertTrue(res.ymin <= np.min(Y) + self.FPTOL)
+            self.assertTrue(np.max(Y) <= res.ymax + self.FPTOL)
+            for xr in [res.xmin, res.xmax]:
+                self.assertTrue(np.all(xr >= lo - 1e-6) and np.all(xr <= hi + 1e-6))
+
+            # the extrema are attained, unless they are only suprema
+            if attained:
+                self.assertAlmostEqual(phi.eval(res.xmin)[k], res.ymin, places=4)
+                self.assertAlmostEqual(phi.eval(res.xmax)[k], res.ymax, places=4)
+
+        # the methods agree with each other
+        for res1 in results:
+            for res2 in results:
+                tol = max(res1.tol, res2.tol, 1e-5)
+                self.assertTrue(abs(res1.ymin - res2.ymin) <= tol)
+                self.assertTrue(abs(res1.ymax - res2.ymax) <= tol)
+
+        return results
+
+    def test_output_range(self):
+        np.random.seed(10)
+        x = amnet.Variable(2, name='x')
+        phi = x
+        for m, n in [(2, 5), (5, 3)]:
+            phi = amnet.atoms.relu(amnet.Affine(np.random.randn(n, m), phi, np.random.randn(n)))
+        phi = amnet.Affine(np.random.randn(2, 3), phi, np.zeros(2))
+        lo, hi = -np.ones(2), np.ones(2)
+
+        for k in range(2):
+            _, approx, _ = self.validate_output_range(phi, lo, hi, k)
+            self.assertTrue(approx.steps >= 1)
+
+        # bounds that are already exact need no bisection
+        res = amnet.verify.output_range(amnet.atoms.max_all(x), (lo, hi), method='bisect')
+        self.assertEqual((res.ymin, res.ymax, res.steps), (-1, 1, 0))
+
+    def test_output_range_unstable(self):
+        # an unstable relu, whose maximum is a small positive number
+        # (z3.Optimize reports a model at 0 for it)
+        x = amnet.Variable(2, name='x')
+        lo, hi = np.array([-1, -1.388]), np.array([1, 0.01133964])
+        for res in self.validate_output_range(amnet.atoms.relu(x), lo, hi, 1):
+            self.assertAlmostEqual(res.ymax, 0.01133964, places=6)
+            self.assertAlmostEqual(res.ymin, 0, places=6)
+
+        # the infimum -2 is approached as x0 -> 0 from above,
+        # but Mu selects the constant -1 at x0 = 0
+        phi = amnet.Mu(amnet.Constant(x, np.array([-1.])),
+                       amnet.Affine(np.array([[2., 1.]]), x, np.array([-1.])),
+                       amnet.atoms.select(x, 0))
+        lo, hi = np.array([-0.5, -1]), np.array([0.5, -0.5])
+        for res in self.validate_output_range(phi, lo, hi, 0, attained=False):
+            self.assertTrue(abs(res.ymin + 2) <= 1e-4)
+            self.assertAlmostEqual(res.ymax, -0.5)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestVerify)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(not result.wasSuccessful())